@@ -0,0 +1,91 @@
+"""
+Cost of reading the translations back out of a numbered batch response.
+
+Compares the old parser, one re.findall over the whole response per
+paragraph followed by the loose and fallback passes, with the single pass
+of split_numbered_translations, on synthetic responses that are clean and
+that have two markers mangled by the model:
+
+    python benchmarks/bench_batch_parse.py 200
+"""
+
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from book_maker.translator.batch_strategy import (  # noqa: E402
+    split_numbered_translations,
+)
+
+
+def findall_split_translations(translated_text, plist_len):
+    translated_paragraphs = []
+    for i in range(1, plist_len + 1):
+        pattern = (
+            r"TRANSLATION OF PARAGRAPH "
+            + str(i)
+            + r":(.*?)(?=TRANSLATION OF.*?\d+:|\Z)"
+        )
+        matches = re.findall(pattern, translated_text, re.DOTALL)
+
+        if matches:
+            translated_paragraphs.append(matches[0].strip())
+        else:
+            loose_pattern = (
+                r"(?:TRANSLATION|PARAGRAPH|PARA).*?"
+                + str(i)
+                + r".*?:(.*?)(?=(?:TRANSLATION|PARAGRAPH|PARA).*?\d+.*?:|\Z)"
+            )
+            loose_matches = re.findall(loose_pattern, translated_text, re.DOTALL)
+            if loose_matches:
+                translated_paragraphs.append(loose_matches[0].strip())
+            else:
+                translated_paragraphs.append("")
+
+    if len(translated_paragraphs) != plist_len:
+        all_para_pattern = r"(?:TRANSLATION|PARAGRAPH|PARA).*?(\d+).*?:(.*?)(?=(?:TRANSLATION|PARAGRAPH|PARA).*?\d+.*?:|\Z)"
+        all_matches = re.findall(all_para_pattern, translated_text, re.DOTALL)
+        if all_matches:
+            para_dict = {}
+            for num_str, content in all_matches:
+                num = int(num_str)
+                if 1 <= num <= plist_len:
+                    para_dict[num] = content.strip()
+            translated_paragraphs = [
+                para_dict.get(i, "") for i in range(1, plist_len + 1)
+            ]
+    return translated_paragraphs
+
+
+def response(count, words=60, broken=()):
+    parts = []
+    for i in range(1, count + 1):
+        marker = f"PARAGRAPH {i}:" if i in broken else f"TRANSLATION OF PARAGRAPH {i}:"
+        text = " ".join(f"mot{i}_{n}" for n in range(words))
+        parts.append(f"{marker}\n{text}\n\n")
+    return "".join(parts)
+
+
+def main(count, repeat=5):
+    clean = response(count)
+    broken = response(count, broken=(count // 4, count // 2))
+    expected = split_numbered_translations(clean, count)
+    assert findall_split_translations(clean, count) == expected
+
+    for case, text in (("clean", clean), ("broken", broken)):
+        for name, fn in (
+            ("findall", findall_split_translations),
+            ("one pass", split_numbered_translations),
+        ):
+            best = min(timeit.repeat(lambda: fn(text, count), number=1, repeat=repeat))
+            print(
+                f"{case:>6} {name:>8}: {best * 1e3:9.2f} ms/response "
+                f"({count} paragraphs, best of {repeat})"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
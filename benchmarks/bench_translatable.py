@@ -0,0 +1,74 @@
+"""
+Per-paragraph cost of EPUBBookLoader._is_p_translatable.
+
+Compares the old deepcopy-and-strip extraction with the in-place
+detach/reattach one on every candidate paragraph of a book:
+
+    python benchmarks/bench_translatable.py test_books/animal_farm.epub
+"""
+
+import sys
+import timeit
+from copy import deepcopy
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup as bs  # noqa: E402
+from ebooklib import ITEM_DOCUMENT, epub  # noqa: E402
+
+from book_maker.loader.epub_loader import EPUBBookLoader  # noqa: E402
+from book_maker.loader.helper import not_trans  # noqa: E402
+
+
+def deepcopy_is_p_translatable(loader, p):
+    new_p = deepcopy(p)
+    for p_exclude in loader.exclude_translate_tags.split(","):
+        if p_exclude:
+            for pt in new_p.find_all(p_exclude):
+                pt.extract()
+    if loader.exclude_translate_selectors:
+        for pt in new_p.select(loader.exclude_translate_selectors):
+            pt.extract()
+    p_text = new_p.decode_contents() if new_p.contents else new_p.text
+    if (
+        not new_p.get_text().strip()
+        or loader._is_special_text(p_text)
+        or not_trans(p_text)
+    ):
+        return False, p_text
+    return True, p_text
+
+
+def main(book_name, repeat=5):
+    loader = EPUBBookLoader.__new__(EPUBBookLoader)
+    loader.exclude_translate_tags = "sup"
+    loader.exclude_translate_selectors = ""
+
+    trans_taglist = "p,h1,h2,h3,h4,h5,h6".split(",")
+    paragraphs = []
+    for item in epub.read_epub(book_name).get_items_of_type(ITEM_DOCUMENT):
+        soup = bs(item.content, "html.parser")
+        paragraphs.extend(soup.find_all(trans_taglist))
+
+    assert [loader._is_p_translatable(p) for p in paragraphs] == [
+        deepcopy_is_p_translatable(loader, p) for p in paragraphs
+    ]
+
+    for name, fn in (
+        ("deepcopy", deepcopy_is_p_translatable),
+        ("in-place", EPUBBookLoader._is_p_translatable),
+    ):
+        best = min(
+            timeit.repeat(
+                lambda: [fn(loader, p) for p in paragraphs], number=1, repeat=repeat
+            )
+        )
+        print(
+            f"{name:>9}: {best / len(paragraphs) * 1e6:8.1f} us/paragraph "
+            f"({len(paragraphs)} paragraphs, best of {repeat})"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "test_books/animal_farm.epub")
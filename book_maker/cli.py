@@ -3,8 +3,17 @@ import json
 import os
 from os import environ as env
 
+from book_maker.console import LOG_LEVELS, setup_console
+from book_maker.profiling import start_profiling, stop_profiling
 from book_maker.loader import BOOK_LOADER_DICT
+from book_maker.loader.batch_packer import DEFAULT_BATCH_SIZES_PATH
+from book_maker.loader.helper import HTML_PARSERS
 from book_maker.translator import MODEL_DICT
+from book_maker.translator.translation_cache import (
+    DEFAULT_CACHE_PATH,
+    CachedTranslator,
+    TranslationCache,
+)
 from book_maker.utils import LANGUAGES, TO_LANGUAGE_CODE
 
 
@@ -405,22 +414,202 @@ So you are close to reaching the limit. You have to choose your own value, there
         default=0.01,
         help="Request interval in seconds (e.g., 0.1 for 100ms). Currently only supported for Gemini models. Default: 0.01",
     )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=0,
+        help="at most this many requests per minute with each api key, shared by all workers",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=int,
+        default=0,
+        help="at most about this many tokens (prompt and answer, estimated before sending) per minute with each api key",
+    )
+    parser.add_argument(
+        "--http-timeout",
+        dest="http_timeout",
+        type=float,
+        default=0,
+        help="seconds to wait for an answer of a REST api (google, deepl, caiyun, tencentransmart, customapi) before retrying, default: the translator's own",
+    )
+    parser.add_argument(
+        "--retry-attempts",
+        dest="retry_attempts",
+        type=int,
+        default=5,
+        help="how many times a failed translation request is tried before the run stops, default 5",
+    )
+    parser.add_argument(
+        "--retry-max-delay",
+        dest="retry_max_delay",
+        type=float,
+        default=60,
+        help="longest back off in seconds between two tries of a request, default 60",
+    )
+    parser.add_argument(
+        "--telemetry",
+        dest="telemetry_path",
+        type=str,
+        default="",
+        help="append one JSON line per translation request (provider, model, key, tokens, latency, retries, batch size, cache hit) to this file",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        type=str,
+        default="",
+        help="write the run totals to this file in the Prometheus text format when the run ends",
+    )
+    parser.add_argument(
+        "--token-price",
+        dest="token_price",
+        type=str,
+        default="",
+        help="USD per million input and output tokens, e.g. `0.15,0.6`, for the estimated cost in the summary, default: a built-in table of known models",
+    )
     parser.add_argument(
         "--batch-paragraphs",
         dest="batch_paragraphs",
         action="store_true",
         help="translate paragraphs in batches (whole page/chapter) to reduce API calls and token usage",
     )
+    parser.add_argument(
+        "--batch-max-paragraphs",
+        dest="batch_max_paragraphs",
+        type=int,
+        default=30,
+        help="at most this many paragraphs in one --accumulated_num request. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--batch-across-chapters",
+        dest="batch_across_chapters",
+        action="store_true",
+        help="let --accumulated_num requests go on into the next chapter instead of sending a partly filled one at every chapter end",
+    )
+    parser.add_argument(
+        "--adaptive-batch",
+        dest="adaptive_batch",
+        action="store_true",
+        help="shrink --accumulated_num batches when the model drops paragraphs or answers slowly and grow them back when it does not, the learned sizes are remembered per model in %s"
+        % DEFAULT_BATCH_SIZES_PATH,
+    )
+    parser.add_argument(
+        "--batch-json",
+        dest="batch_json",
+        action="store_true",
+        help="ask for the translations of --batch-paragraphs/--accumulated_num requests as a JSON array with paragraph ids instead of numbered paragraphs",
+    )
+    parser.add_argument(
+        "--no-batch-repair",
+        dest="batch_repair",
+        action="store_false",
+        help="leave paragraphs missing from a --batch-paragraphs/--accumulated_num answer untranslated instead of requesting them again",
+    )
 
     parser.add_argument(
         "--parallel-workers",
         dest="parallel_workers",
         type=int,
         default=1,
-        help="Number of parallel workers for EPUB chapter processing. Use 2-4 for better performance. Default: 1",
+        help="Number of parallel workers for EPUB processing, paragraphs of all chapters are spread over them (whole chapters with --use_context or --accumulated_num). Use 2-4 for better performance. Default: 1",
+    )
+    parser.add_argument(
+        "--async-concurrency",
+        dest="async_concurrency",
+        type=int,
+        default=0,
+        help="keep up to this many paragraph requests in flight at once (OpenAI-compatible models: openai/gpt*, o1/o3, groq, xai, qwen, ollama via --api_base). Ignored with --use_context, --batch and --accumulated_num. Default: 0 (off)",
+    )
+    parser.add_argument(
+        "--html-parser",
+        dest="html_parser",
+        type=str,
+        choices=HTML_PARSERS,
+        help="HTML parser used for epub chapters, available: {%(choices)s}. Default: lxml when installed, otherwise html.parser",
+    )
+    parser.add_argument(
+        "--temp-book-interval",
+        dest="temp_book_interval",
+        type=float,
+        default=0,
+        help="also write the partial <book>_bilingual_temp.epub every this many seconds while translating epub, not only when interrupted. Default: 0 (off)",
+    )
+    parser.add_argument(
+        "--stream-output",
+        dest="stream_output",
+        action="store_true",
+        help="write each translated epub chapter to <book>_bilingual.epub as soon as it is done instead of building the whole book in memory",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache_flag",
+        action="store_true",
+        help="reuse translations from a local on-disk cache and store new ones, so re-running a book does not re-send finished paragraphs",
+    )
+    parser.add_argument(
+        "--cache-path",
+        dest="cache_path",
+        type=str,
+        default=DEFAULT_CACHE_PATH,
+        help="sqlite file used by --cache. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        dest="cache_max_entries",
+        type=int,
+        default=0,
+        help="keep at most this many cached translations, least recently used are evicted first. Default: 0 (unlimited)",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        dest="cache_max_age",
+        type=float,
+        default=0,
+        help="drop cached translations older than this many days. Default: 0 (never)",
+    )
+    parser.add_argument(
+        "--log-level",
+        dest="log_level",
+        choices=LOG_LEVELS,
+        default="info",
+        help="info prints the source and translation of every paragraph, warning only the progress bar, retries and errors. Default: info",
+    )
+    parser.add_argument(
+        "--quiet",
+        dest="log_level",
+        action="store_const",
+        const="warning",
+        help="same as --log-level warning",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile_path",
+        type=str,
+        default="",
+        help="write the wall, cpu and waiting time of every stage (epub read, chapter parse, filtering, token counting, network, insert_trans, serialisation, write_epub) to this file when the run ends",
+    )
+    parser.add_argument(
+        "--profile-cpu",
+        dest="profile_cpu",
+        action="store_true",
+        help="add a cProfile of the main thread to the --profile report, slows the run down",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        dest="profile_memory",
+        action="store_true",
+        help="add the peak memory and largest allocations traced by tracemalloc to the --profile report, slows the run down",
     )
 
     options = parser.parse_args()
+    setup_console(options.log_level)
+    if options.profile_path:
+        start_profiling(
+            options.profile_path,
+            cpu=options.profile_cpu,
+            memory=options.profile_memory,
+        )
 
     if not options.book_name:
         print("Error: please provide the path of your book using --book_name <path>")
@@ -559,6 +748,12 @@ So you are close to reaching the limit. You have to choose your own value, there
         e.exclude_filelist = options.exclude_filelist
     if options.only_filelist:
         e.only_filelist = options.only_filelist
+    if options.html_parser:
+        e.html_parser = options.html_parser
+    if options.temp_book_interval > 0:
+        e.temp_book_interval = options.temp_book_interval
+    if options.stream_output:
+        e.stream_output = True
     
     if options.batch_paragraphs and options.accumulated_num == 1:
         # Default to a moderate number to batch pages but avoid context overflow
@@ -567,6 +762,13 @@ So you are close to reaching the limit. You have to choose your own value, there
 
     if options.accumulated_num > 1:
         e.accumulated_num = options.accumulated_num
+    if options.batch_max_paragraphs:
+        e.batch_max_paragraphs = options.batch_max_paragraphs
+    if options.batch_across_chapters:
+        e.batch_across_chapters = True
+    if options.adaptive_batch:
+        e.adaptive_batch = True
+        e.adaptive_batch_path = DEFAULT_BATCH_SIZES_PATH
     if options.translation_style:
         e.translation_style = options.translation_style
     if options.batch_size:
@@ -628,6 +830,22 @@ So you are close to reaching the limit. You have to choose your own value, there
     if options.batch_use_flag:
         e.batch_use_flag = options.batch_use_flag
 
+    if options.batch_json:
+        if hasattr(e.translate_model, "set_batch_json_output"):
+            e.translate_model.set_batch_json_output(True)
+        else:
+            print(f"--batch-json is not supported by {options.model}, ignoring it")
+    if not options.batch_repair and hasattr(e.translate_model, "set_batch_repair"):
+        e.translate_model.set_batch_repair(False)
+
+    if options.async_concurrency > 0:
+        if hasattr(e.translate_model, "set_async_concurrency"):
+            e.translate_model.set_async_concurrency(options.async_concurrency)
+        else:
+            print(
+                f"--async-concurrency is not supported by {options.model}, translating sequentially"
+            )
+
     if options.model in ("gemini", "geminipro"):
         e.translate_model.set_interval(options.interval)
     if options.model == "gemini":
@@ -637,8 +855,61 @@ So you are close to reaching the limit. You have to choose your own value, there
             e.translate_model.set_geminiflash_models()
     if options.model == "geminipro":
         e.translate_model.set_geminipro_models()
-
-    e.make_bilingual_book()
+    if options.rpm > 0 or options.tpm > 0:
+        e.translate_model.set_rate_limits(
+            rpm=options.rpm or None, tpm=options.tpm or None
+        )
+    if options.http_timeout > 0:
+        e.translate_model.set_http_timeout(options.http_timeout)
+    e.translate_model.set_retry_policy(
+        max_attempts=options.retry_attempts, max_delay=options.retry_max_delay
+    )
+    telemetry = e.translate_model.telemetry
+    if options.telemetry_path:
+        telemetry.open(options.telemetry_path)
+    if options.token_price:
+        prices = tuple(float(p) for p in options.token_price.split(","))
+        if len(prices) != 2:
+            raise ValueError("--token-price must be `input,output`, e.g. 0.15,0.6")
+        # the empty prefix matches every model
+        telemetry.token_prices = {"": prices}
+
+    cache = None
+    if options.cache_flag:
+        cache = TranslationCache(
+            options.cache_path,
+            max_entries=options.cache_max_entries,
+            max_age_days=options.cache_max_age,
+        )
+        cache_model_name = ",".join(
+            filter(
+                None,
+                [
+                    options.model,
+                    options.ollama_model,
+                    options.model_list,
+                    options.deployment_id,
+                    model_api_base,
+                ],
+            )
+        )
+        e.translate_model = CachedTranslator(e.translate_model, cache, cache_model_name)
+
+    try:
+        e.make_bilingual_book()
+    finally:
+        if cache is not None:
+            print(cache.summary())
+            cache.close()
+        if telemetry.records:
+            print(f"📈 {telemetry.summary()}")
+        if options.metrics_file:
+            with open(options.metrics_file, "w", encoding="utf-8") as f:
+                f.write(telemetry.prometheus())
+        telemetry.close()
+        profile_path = stop_profiling()
+        if profile_path:
+            print(f"⏱️ profile written to {profile_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+import atexit
+import logging
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener
+
+from rich import print as rich_print
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+
+# the source and translated text of every paragraph and the per-paragraph
+# progress of the loaders, at INFO
+logger = logging.getLogger("book_maker")
+
+# seconds between two refreshes of the progress bar
+progress_interval = 0.1
+
+_listener = None
+
+
+class RichHandler(logging.Handler):
+    """Prints records with rich, so the markup of the translators stays."""
+
+    def emit(self, record):
+        try:
+            rich_print(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_console(log_level="info"):
+    """
+    Route the paragraph output through a queue written by a background
+    thread, so workers append a record instead of waiting for the terminal.
+    Below INFO (`--quiet` is `warning`) it is dropped before it is formatted
+    and the progress bar, refreshed every second, is the only live output.
+    """
+    global progress_interval, _listener
+    stop_console()
+    logging.basicConfig(level=logging.WARNING)
+    level = getattr(logging, log_level.upper())
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, RichHandler())
+    logger.handlers = [QueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+    _listener.start()
+    atexit.register(stop_console)
+    progress_interval = 1.0 if level > logging.INFO else 0.1
+
+
+def stop_console():
+    """Write out what is still queued and print directly again."""
+    global progress_interval, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    logger.handlers = []
+    progress_interval = 0.1
+
+
+def echo(message=""):
+    """Paragraph output, printed right away unless `setup_console` ran."""
+    if not logger.handlers:
+        rich_print(message)
+    elif logger.isEnabledFor(logging.INFO):
+        logger.info(message)
+
+
+def echo_translation(t_text):
+    echo("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
@@ -0,0 +1,212 @@
+import json
+import os
+from threading import Lock
+
+DEFAULT_BATCH_SIZES_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "bbook_maker", "batch_sizes.json"
+)
+
+
+class BatchPacker:
+    """
+    Groups the paragraphs of `--accumulated_num` into requests.
+
+    Paragraphs are added in document order and come out in batches of
+    consecutive paragraphs holding at most `token_budget` tokens and
+    `max_paragraphs` paragraphs. A batch is only closed when the next
+    paragraph does not fit, which for batches that must stay in order gives
+    the fewest requests. A paragraph larger than the budget is a batch of its
+    own. Whatever is still pending is kept until `flush`, so a batch can go
+    on into the next chapter.
+    """
+
+    def __init__(self, token_budget, max_paragraphs=30):
+        self.token_budget = token_budget
+        self.max_paragraphs = max(1, max_paragraphs)
+        self.pending = []
+        self._pending_tokens = 0
+
+    def add(self, para):
+        """Add the next paragraph, return the batches that are complete now."""
+        length = para.token_count
+        if length > self.token_budget:
+            return self.flush() + [[para]]
+        if (
+            self._pending_tokens + length > self.token_budget
+            or len(self.pending) >= self.max_paragraphs
+        ):
+            ready = self.flush()
+        else:
+            ready = []
+        self.pending.append(para)
+        self._pending_tokens += length
+        return ready
+
+    def flush(self):
+        """Return the pending paragraphs as a last batch (or nothing)."""
+        if not self.pending:
+            return []
+        batch = self.pending
+        self.pending = []
+        self._pending_tokens = 0
+        return [batch]
+
+    def oversized(self, batch):
+        return len(batch) == 1 and batch[0].token_count > self.token_budget
+
+
+class BatchStats:
+    """How full the requests sent with `--accumulated_num` were, thread safe."""
+
+    def __init__(self, token_budget):
+        self.token_budget = token_budget
+        self.requests = 0
+        self.paragraphs = 0
+        self._fill_total = 0.0
+        self._lock = Lock()
+
+    def record(self, batch):
+        tokens = sum(para.token_count for para in batch)
+        with self._lock:
+            self.requests += 1
+            self.paragraphs += len(batch)
+            self._fill_total += min(1.0, tokens / self.token_budget)
+
+    @property
+    def fill_ratio(self):
+        return self._fill_total / self.requests if self.requests else 0.0
+
+    def summary(self):
+        return (
+            f"{self.paragraphs} paragraphs in {self.requests} requests, "
+            f"{self.fill_ratio:.0%} of --accumulated_num used on average"
+        )
+
+
+class AdaptiveBatchSize:
+    """
+    Steers the token budget and paragraph cap of `BatchPacker` during a run.
+
+    A batch that comes back with paragraphs missing (empty or dropped
+    translations) or slower than `max_latency` seconds shrinks both limits,
+    `grow_after` good batches in a row grow them back, never above what was
+    configured. The learned limits, mismatch rate and latency are kept per
+    model in `path`, so the next book starts from them.
+    """
+
+    shrink = 0.7
+    grow_after = 5
+    smoothing = 0.2
+
+    def __init__(
+        self, token_budget, max_paragraphs, model, path=None, max_latency=60.0
+    ):
+        self.ceiling_tokens = token_budget
+        self.ceiling_paragraphs = max(1, max_paragraphs)
+        self.min_tokens = max(1, token_budget // 8)
+        self.token_budget = token_budget
+        self.max_paragraphs = self.ceiling_paragraphs
+        self.model = model
+        self.path = path
+        self.max_latency = max_latency
+        self.mismatch_rate = 0.0
+        self.latency = None
+        self._good_batches = 0
+        self._lock = Lock()
+        if path:
+            self._load()
+
+    def apply(self, packer):
+        packer.token_budget = self.token_budget
+        packer.max_paragraphs = self.max_paragraphs
+
+    def observe(self, batch, results, seconds, repaired=0):
+        """
+        Learn from one batch of paragraphs, its translations and how long it
+        took. `repaired` paragraphs were missing from the answer but filled in
+        with more requests, they count as missing.
+        """
+        missing = (
+            repaired
+            + max(0, len(batch) - len(results))
+            + sum(1 for t_text in results[: len(batch)] if not (t_text or "").strip())
+        )
+        with self._lock:
+            self.mismatch_rate += self.smoothing * (
+                missing / len(batch) - self.mismatch_rate
+            )
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += self.smoothing * (seconds - self.latency)
+
+            if missing or seconds > self.max_latency:
+                self._good_batches = 0
+                self.token_budget = max(
+                    self.min_tokens, int(self.token_budget * self.shrink)
+                )
+                self.max_paragraphs = max(
+                    1, min(self.max_paragraphs, int(len(batch) * self.shrink))
+                )
+                return
+            self._good_batches += 1
+            if self._good_batches >= self.grow_after:
+                self._good_batches = 0
+                self.token_budget = min(
+                    self.ceiling_tokens,
+                    self.token_budget + max(1, self.ceiling_tokens // 10),
+                )
+                self.max_paragraphs = min(
+                    self.ceiling_paragraphs, self.max_paragraphs + 1
+                )
+
+    def summary(self):
+        latency = "n/a" if self.latency is None else f"{self.latency:.1f}s"
+        return (
+            f"batch size for {self.model}: {self.token_budget} tokens, "
+            f"{self.max_paragraphs} paragraphs "
+            f"(mismatch rate {self.mismatch_rate:.0%}, latency {latency})"
+        )
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                learned = json.load(f).get(self.model)
+        except (OSError, ValueError, AttributeError):
+            return
+        if not isinstance(learned, dict):
+            return
+        try:
+            self.token_budget = min(
+                self.ceiling_tokens,
+                max(self.min_tokens, int(learned["token_budget"])),
+            )
+            self.max_paragraphs = min(
+                self.ceiling_paragraphs, max(1, int(learned["max_paragraphs"]))
+            )
+            self.mismatch_rate = float(learned.get("mismatch_rate", 0.0))
+            self.latency = learned.get("latency")
+        except (KeyError, TypeError, ValueError):
+            return
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                learned = json.load(f)
+            if not isinstance(learned, dict):
+                learned = {}
+        except (OSError, ValueError):
+            learned = {}
+        learned[self.model] = {
+            "token_budget": self.token_budget,
+            "max_paragraphs": self.max_paragraphs,
+            "mismatch_rate": round(self.mismatch_rate, 4),
+            "latency": self.latency,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(learned, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
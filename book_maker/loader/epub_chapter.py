@@ -0,0 +1,88 @@
+import hashlib
+
+from book_maker.profiling import span
+from book_maker.utils import count_tokens, num_tokens_from_text
+
+
+def paragraph_key(file_name, ordinal, text):
+    """Identity of a paragraph for resume: where it is and what it said."""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    return (file_name, ordinal, digest)
+
+
+class ChapterParagraph:
+    """One candidate node of a chapter together with its translatability verdict."""
+
+    __slots__ = ("node", "translatable", "text", "key", "_token_count")
+
+    def __init__(self, node, translatable, text):
+        self.node = node
+        self.translatable = translatable
+        # html of the node with excluded tags/selectors stripped, what gets sent
+        self.text = text
+        # (file name, ordinal, source hash), set by ParsedChapter
+        self.key = None
+        self._token_count = None
+
+    @property
+    def token_count(self):
+        if self._token_count is None:
+            with span("token counting"):
+                self._token_count = num_tokens_from_text(self.text)
+        return self._token_count
+
+
+class ParsedChapter:
+    """
+    A spine document parsed once and shared by counting, translation,
+    temp-book snapshots and retranslation.
+    """
+
+    def __init__(self, item, soup, paragraphs):
+        self.item = item
+        self.soup = soup
+        # the untranslated document, `release` replaces item.content
+        self.source = item.content
+        self.paragraphs = paragraphs
+        for ordinal, para in enumerate(paragraphs):
+            if para.translatable:
+                para.key = paragraph_key(item.file_name, ordinal, para.text)
+        # kept after `release` so progress accounting still works
+        self.translatable_total = sum(1 for p in paragraphs if p.translatable)
+        # set once translations start being inserted into `soup`
+        self.touched = False
+
+    @property
+    def file_name(self):
+        return self.item.file_name
+
+    @property
+    def translatable(self):
+        return [p for p in self.paragraphs if p.translatable]
+
+    def count_tokens(self, model):
+        """Count the tokens of all translatable paragraphs in one batch for `model`."""
+        pending = [
+            p for p in self.paragraphs if p.translatable and p._token_count is None
+        ]
+        with span("token counting"):
+            counts = count_tokens([p.text for p in pending], model)
+        for para, count in zip(pending, counts):
+            para._token_count = count
+
+    @property
+    def released(self):
+        return self.soup is None
+
+    def encode(self):
+        if self.soup is None:
+            return self.item.content
+        with span("serialisation"):
+            return self.soup.encode(encoding="utf-8")
+
+    def release(self):
+        """Write the soup back to the item and drop the parse tree to free memory."""
+        if self.soup is not None:
+            self.item.content = self.encode()
+        self.soup = None
+        self.paragraphs = []
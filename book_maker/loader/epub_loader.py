@@ -1,25 +1,39 @@
+import copy
 import os
-import pickle
 import string
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from copy import copy, deepcopy
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
 import traceback
+import threading
 from threading import Lock
 
-from bs4 import BeautifulSoup as bs
 from bs4 import Tag
 from bs4.element import NavigableString
 from ebooklib import ITEM_DOCUMENT, epub
 from rich import print
 from tqdm import tqdm
 
-from book_maker.utils import num_tokens_from_text, prompt_config_to_kwargs
+from book_maker import console
+from book_maker.console import echo
+from book_maker.profiling import span
+from book_maker.translator.key_pool import NoUsableKeyError
+from book_maker.translator.retry_policy import RetriesExhausted
+from book_maker.utils import DEFAULT_TOKENIZER_MODEL, prompt_config_to_kwargs
 
 from .base_loader import BaseBookLoader
-from .helper import EPUBBookLoaderHelper, is_text_link, not_trans
+from .batch_packer import AdaptiveBatchSize, BatchPacker, BatchStats
+from .epub_chapter import ChapterParagraph, ParsedChapter
+from .epub_stream import EpubStreamWriter, read_epub_deferring_media
+from .helper import (
+    EPUBBookLoaderHelper,
+    default_html_parser,
+    is_text_link,
+    not_trans,
+    parse_html,
+)
+from .resume_journal import ResumeJournal
 
 
 class EPUBBookLoader(BaseBookLoader):
@@ -60,8 +74,17 @@ class EPUBBookLoader(BaseBookLoader):
         self.exclude_translate_selectors = ""
         self.allow_navigable_strings = False
         self.accumulated_num = 1
+        # at most this many paragraphs in one accumulated request
+        self.batch_max_paragraphs = 30
+        # let an accumulated request go on into the next chapter
+        self.batch_across_chapters = False
+        # shrink/grow accumulated batches as the model drops paragraphs or
+        # slows down, learned sizes are kept in adaptive_batch_path
+        self.adaptive_batch = False
+        self.adaptive_batch_path = None
         self.translation_style = ""
         self.context_flag = context_flag
+        self.html_parser = default_html_parser()
         self.helper = EPUBBookLoaderHelper(
             self.translate_model,
             self.accumulated_num,
@@ -77,9 +100,20 @@ class EPUBBookLoader(BaseBookLoader):
         self.batch_flag = False
         self.parallel_workers = 1
         self.enable_parallel = False
+        # append chapters to the output epub as soon as they are done
+        self.stream_output = False
         self._progress_lock = Lock()
         self._translation_index = 0
+        # paragraph index -> pending translation (Future) of the paragraph scheduler
+        self._scheduled_translations = {}
+        self._worker_local = threading.local()
         self.set_parallel_workers(parallel_workers)
+        # seconds between `_bilingual_temp.epub` snapshots while translating,
+        # 0 writes it only when interrupted
+        self.temp_book_interval = 0
+        self._last_temp_book = time.monotonic()
+        # file name -> serialised chapter with only its resumed translations
+        self._resumed_chapter_bytes = {}
 
         # monkey patch for # 173
         def _write_items_patch(obj):
@@ -107,7 +141,9 @@ class EPUBBookLoader(BaseBookLoader):
         epub.EpubReader._check_deprecated = _check_deprecated
 
         try:
-            self.origin_book = epub.read_epub(self.epub_name)
+            self.origin_book, self._media_dir = read_epub_deferring_media(
+                self.epub_name
+            )
         except Exception:
             # tricky monkey patch for #71 if you don't know why please check the issue and ignore this
             # when upstream change will TODO fix this
@@ -120,11 +156,22 @@ class EPUBBookLoader(BaseBookLoader):
                 obj.book.set_direction(spine.get("page-progression-direction", None))
 
             epub.EpubReader._load_spine = _load_spine
-            self.origin_book = epub.read_epub(self.epub_name)
+            self.origin_book, self._media_dir = read_epub_deferring_media(
+                self.epub_name
+            )
 
+        # file_name -> ParsedChapter, every spine document is parsed only once
+        self._chapters = {}
         self.p_to_save = []
+        # paragraph key (see epub_chapter.paragraph_key) of every p_to_save entry
+        self._p_keys = []
+        # paragraph key -> translation, what resume looks translations up in
+        self._saved = {}
         self.resume = resume
         self.bin_path = f"{Path(epub_name).parent}/.{Path(epub_name).stem}.temp.bin"
+        self.journal = ResumeJournal(self.bin_path)
+        # how much of p_to_save is already in the journal
+        self._journaled_len = 0
         if self.resume:
             self.load_state()
 
@@ -186,74 +233,117 @@ class EPUBBookLoader(BaseBookLoader):
 
     def _is_p_translatable(self, p):
         if not p:
-            return False, "", None
-            
-        new_p = self._extract_paragraph(deepcopy(p))
-        p_text = (
-            new_p.decode_contents() if hasattr(new_p, "contents") and new_p.contents else new_p.text
-        )
-        
+            return False, ""
+
+        # excluded tags are pulled out of the live tree for the duration of
+        # the read and put back afterwards, which is much cheaper than
+        # deep-copying every paragraph with its whole subtree
+        detached = self._detach_excluded(p)
+        try:
+            p_text = (
+                p.decode_contents() if hasattr(p, "contents") and p.contents else p.text
+            )
+            visible_text = p.get_text()
+        finally:
+            self._reattach(detached)
+
         if any(
             [
-                not new_p.get_text().strip(),
+                not visible_text.strip(),
                 self._is_special_text(p_text),
                 not_trans(p_text),
             ]
         ):
-            return False, p_text, new_p
-            
-        if p.get("class"):
-            for cls in p.get("class"):
-                if cls.startswith("toc-heading-"):
-                    return True, p_text, new_p
+            return False, p_text
 
-        return True, p_text, new_p
+        return True, p_text
 
-    def _extract_paragraph(self, p):
+    def _detach_excluded(self, p):
+        """Extract the excluded tags/selectors of `p`, returning what `_reattach` needs."""
         if type(p) is NavigableString:
-            return p
+            return []
+        excluded = []
         for p_exclude in self.exclude_translate_tags.split(","):
             if p_exclude:
-                for pt in p.find_all(p_exclude):
-                    pt.extract()
+                excluded.extend(p.find_all(p_exclude))
         if self.exclude_translate_selectors:
-            for pt in p.select(self.exclude_translate_selectors):
-                pt.extract()
-        return p
+            excluded.extend(p.select(self.exclude_translate_selectors))
+
+        detached = []
+        for pt in excluded:
+            parent = pt.parent
+            if parent is None:
+                # matched twice (by tag and by selector), already detached
+                continue
+            detached.append((parent, parent.index(pt), pt))
+            pt.extract()
+        return detached
+
+    @staticmethod
+    def _reattach(detached):
+        # reverse order so nested exclusions go back into their own parents first
+        for parent, position, pt in reversed(detached):
+            parent.insert(position, pt)
+
+    def _parse_chapter(self, item, trans_taglist, soup=None):
+        with span("chapter parse"):
+            if soup is None:
+                soup = parse_html(item.content, self.html_parser)
+            p_list = soup.findAll(trans_taglist)
+            if self.exclude_translate_selectors:
+                # Filter p_list by CSS selectors
+                excluded_ids = {
+                    id(e) for e in soup.select(self.exclude_translate_selectors)
+                }
+                p_list = [p for p in p_list if id(p) not in excluded_ids]
+            p_list = self.filter_nest_list(p_list, trans_taglist)
+            if self.allow_navigable_strings:
+                p_list.extend(soup.findAll(text=True))
 
-    def _process_paragraph(self, p, new_p, index, p_to_save_len, thread_safe=False):
-        if self.resume and index < p_to_save_len:
-            t_text = self.p_to_save[index]
+        paragraphs = []
+        with span("filtering"):
+            for p in p_list:
+                is_trans, p_text = self._is_p_translatable(p)
+                paragraphs.append(ChapterParagraph(p, is_trans, p_text))
+        return ParsedChapter(item, soup, paragraphs)
+
+    def get_chapter(self, item, trans_taglist):
+        """Return the parsed chapter of `item`, parsing it on first use."""
+        chapter = self._chapters.get(item.file_name)
+        if chapter is None:
+            chapter = self._parse_chapter(item, trans_taglist)
+            self._chapters[item.file_name] = chapter
+        return chapter
+
+    def _process_paragraph(self, para, index, thread_safe=False, prefetched=None):
+        p, p_text = para.node, para.text
+        # Special handling for toc-heading-*
+        is_toc_heading = False
+        if hasattr(p, "get") and p.get("class"):
+            for cls in p.get("class"):
+                if cls.startswith("toc-heading-"):
+                    is_toc_heading = True
+                    break
+
+        resumed = self._resumed_translation(para)
+        if resumed is not None:
+            t_text = resumed
             # Removed p.string = t_text to avoid skipping insert_trans
         else:
-            p_text = (
-                new_p.decode_contents() if new_p.contents else new_p.text
-            )
             if self.batch_flag:
                 self.translate_model.add_to_batch_translate_queue(index, p_text)
             elif self.batch_use_flag:
                 t_text = self.translate_model.batch_translate(index)
+            elif prefetched is not None:
+                t_text = prefetched
             else:
                 t_text = self.translate_model.translate(p_text)
             if t_text is None:
                 raise RuntimeError(
                     "`t_text` is None: your translation model is not working as expected. Please check your translation model configuration."
                 )
-            
-            # Special handling for toc-heading-*
-            is_toc_heading = False
-            if hasattr(p, "get") and p.get("class"):
-                for cls in p.get("class"):
-                    if cls.startswith("toc-heading-"):
-                        is_toc_heading = True
-                        break
-            
 
-            if isinstance(p, NavigableString):
-                # For NavigableString, we can't clear/append, so we handle it here or in insert_trans
-                self.p_to_save.append(t_text)
-            else:
-                self.p_to_save.append(t_text)
+            self._record_translation(para.key, t_text)
 
         if is_toc_heading:
             a_tag = p.find("a")
@@ -276,6 +366,152 @@ class EPUBBookLoader(BaseBookLoader):
                 self._save_progress()
         return index
 
+    def _record_translation(self, key, t_text):
+        self.p_to_save.append(t_text)
+        self._p_keys.append(key)
+        if key is not None:
+            self._saved[key] = t_text
+
+    def _record_translations(self, keys, t_texts):
+        for key, t_text in zip(keys, t_texts):
+            self._record_translation(key, t_text)
+
+    def _resumed_translation(self, para):
+        """The saved translation of `para` when resuming, else None."""
+        if not self.resume:
+            return None
+        return self._saved.get(para.key)
+
+    def _adopt_positional_resume(self, document_items, trans_taglist):
+        """
+        Resume files from older versions only have translations in document
+        order, give them the keys of the paragraphs they were made for.
+        """
+        positional = [i for i, key in enumerate(self._p_keys) if key is None]
+        if not positional:
+            return
+        paragraphs = (
+            para
+            for item in document_items
+            if self._translates_item(item)
+            for para in self.get_chapter(item, trans_taglist).translatable
+        )
+        for i, para in zip(positional, paragraphs):
+            self._p_keys[i] = para.key
+            self._saved.setdefault(para.key, self.p_to_save[i])
+
+    def _paragraphs_are_independent(self):
+        """Out-of-order requests only fit plain per-paragraph translation without rolling context."""
+        return (
+            self.accumulated_num == 1
+            and not (self.batch_flag or self.batch_use_flag)
+            and not self.context_flag
+            and not (self.single_translate and self.block_size > 0)
+        )
+
+    def _use_async_translation(self):
+        return (
+            getattr(self.translate_model, "async_concurrency", 0) > 0
+            and self._paragraphs_are_independent()
+        )
+
+    def _use_native_batching(self):
+        """The translator's api takes many paragraphs in one request, see `Base.translate_list`."""
+        return (
+            getattr(self.translate_model, "max_batch_segments", 1) > 1
+            and not self._use_async_translation()
+            and self._paragraphs_are_independent()
+        )
+
+    def _prefetches_chapters(self):
+        """`process_item` translates a chapter's paragraphs up front, all at once."""
+        return self._use_async_translation() or (
+            self._use_native_batching() and not self._use_paragraph_scheduler()
+        )
+
+    def _use_paragraph_scheduler(self):
+        return (
+            self.enable_parallel
+            and not self._use_async_translation()
+            and self._paragraphs_are_independent()
+        )
+
+    def _translates_item(self, item):
+        # mirrors the file list checks at the top of `process_item`
+        if self.only_filelist != "":
+            return item.file_name in self.only_filelist.split(",")
+        return item.file_name not in self.exclude_filelist.split(",")
+
+    def _pending_paragraphs(self, paragraphs, index):
+        """
+        The (index, text) of the paragraphs `process_item` will send to the
+        model, index being its running paragraph number; also returns the
+        index after the last paragraph.
+        """
+        pending = []
+        for para in paragraphs:
+            if not para.translatable:
+                continue
+            if self.is_test and index >= self.test_num:
+                break
+            if self._resumed_translation(para) is None:
+                pending.append((index, para.text))
+            index += 1
+        return pending, index
+
+    def _prefetch_translations(self, paragraphs, index):
+        """
+        Translate every paragraph of the chapter that still needs it in one
+        concurrent round, or in as few requests as the api takes, keyed by the
+        running paragraph index.
+        """
+        pending, _ = self._pending_paragraphs(paragraphs, index)
+        if self._use_async_translation():
+            translate = self.translate_model.translate_concurrently
+        else:
+            translate = self.translate_model.translate_list
+        results = translate([text for _, text in pending])
+        return {i: t_text for (i, _), t_text in zip(pending, results)}
+
+    def _schedule_paragraphs(self, executor, document_items, trans_taglist):
+        """
+        Submit the paragraphs of every chapter to the worker pool up front.
+        `process_item` collects the futures in document order, so a book that
+        is one big xhtml file keeps all workers busy as well. When the api takes
+        many paragraphs in one request, each task is such a request and the
+        paragraphs get (future, position in its answer).
+        """
+        scheduled = {}
+        index = 0
+        native_batching = self._use_native_batching()
+        for item in document_items:
+            if not self._translates_item(item):
+                continue
+            chapter = self.get_chapter(item, trans_taglist)
+            pending, index = self._pending_paragraphs(chapter.paragraphs, index)
+            if not native_batching:
+                for i, text in pending:
+                    scheduled[i] = executor.submit(self._translate_in_worker, text)
+                continue
+            texts = [text for _, text in pending]
+            for start, stop in self.translate_model.segment_batches(texts):
+                future = executor.submit(
+                    self._translate_list_in_worker, texts[start:stop]
+                )
+                for position, (i, _) in enumerate(pending[start:stop]):
+                    scheduled[i] = (future, position)
+        return scheduled
+
+    @staticmethod
+    def _take_prefetched(prefetched, index):
+        t_text = prefetched.pop(index, None)
+        if isinstance(t_text, Future):
+            t_text = t_text.result()
+        elif isinstance(t_text, tuple):
+            future, position = t_text
+            t_text = future.result()[position]
+        return t_text
+
     def _process_combined_paragraph(
         self, p_block, index, p_to_save_len, thread_safe=False
     ):
@@ -325,70 +561,56 @@ class EPUBBookLoader(BaseBookLoader):
             self._save_progress()
         return index
 
-    def translate_paragraphs_acc(self, p_list, send_num, start_index, p_to_save_len, pbar):
-        count = 0
-        wait_p_list = []
-        for i in range(len(p_list)):
-            p = p_list[i]
-            is_trans, p_text, temp_p = self._is_p_translatable(p)
-            if not is_trans:
-                pbar.update(1)
-                if i == len(p_list) - 1:
-                    results = self.helper.deal_old(wait_p_list, self.single_translate)
-                    if results:
-                        self.p_to_save.extend(results)
+    def translate_paragraphs_acc(self, paragraphs, send_num, start_index, pbar):
+        for i, para in enumerate(paragraphs):
+            pbar.update(1)
+            if not para.translatable:
                 continue
 
             # Resume logic: skip if already translated
-            if self.resume and start_index < p_to_save_len:
-                t_text = self.p_to_save[start_index]
-                self.helper.insert_trans(p, t_text, self.translation_style, self.single_translate)
+            t_text = self._resumed_translation(para)
+            if t_text is not None:
+                self.helper.insert_trans(
+                    para.node, t_text, self.translation_style, self.single_translate
+                )
                 start_index += 1
-                pbar.update(1)
                 continue
 
-            print(f"translating {i}/{len(p_list)}")
-
+            echo(f"translating {i}/{len(paragraphs)}")
             start_index += 1
-            length = num_tokens_from_text(p_text)
-            # Limit batch by number of paragraphs as well (e.g. max 30) to prevent LLM confusion
-            MAX_PARAGRAPHS_PER_BATCH = 30
-            
-            pbar.update(1)
-            
-            if length > send_num:
-                results = self.helper.deal_new(p, wait_p_list, self.single_translate)
-                if results:
-                    self.p_to_save.extend(results)
-                continue
-            
-            if i == len(p_list) - 1:
-                if count + length < send_num and len(wait_p_list) < MAX_PARAGRAPHS_PER_BATCH:
-                    wait_p_list.append(p)
-                    results = self.helper.deal_old(wait_p_list, self.single_translate)
-                    if results:
-                        self.p_to_save.extend(results)
-                else:
-                    results = self.helper.deal_old(wait_p_list, self.single_translate)
-                    if results:
-                        self.p_to_save.extend(results)
-                    results = self.helper.deal_new(p, wait_p_list, self.single_translate)
-                    if results:
-                        self.p_to_save.extend(results)
-                break
-            
-            if count + length < send_num and len(wait_p_list) < MAX_PARAGRAPHS_PER_BATCH:
-                count += length
-                wait_p_list.append(p)
-            else:
-                results = self.helper.deal_old(wait_p_list, self.single_translate)
-                if results:
-                    self.p_to_save.extend(results)
-                wait_p_list.append(p)
-                count = length
-        
+            for batch in self._batch_packer.add(para):
+                self._translate_batch(batch)
+
+        if not self.batch_across_chapters:
+            for batch in self._batch_packer.flush():
+                self._translate_batch(batch)
         return start_index
 
+    def _translate_batch(self, batch):
+        """Send one batch of the packer, insert and record its translations."""
+        self._batch_stats.record(batch)
+        if self._batch_packer.oversized(batch):
+            # too long to share a request
+            results = self.helper.deal_new(batch[0].node, [], self.single_translate)
+        else:
+            started = time.monotonic()
+            results = self.helper.deal_old(
+                [para.node for para in batch], self.single_translate
+            )
+            self._observe_batch(self._batch_packer, batch, results, started)
+        self._record_translations([para.key for para in batch], results)
+
+    def _observe_batch(self, packer, batch, results, started):
+        if self._batch_sizer is not None:
+            take_repairs = getattr(self.translate_model, "take_batch_repairs", None)
+            self._batch_sizer.observe(
+                batch,
+                results,
+                time.monotonic() - started,
+                take_repairs() if take_repairs is not None else 0,
+            )
+            self._batch_sizer.apply(packer)
+
     def get_item(self, book, name):
         for item in book.get_items():
             if item.file_name == name:
@@ -399,7 +621,7 @@ class EPUBBookLoader(BaseBookLoader):
 
         for item in book.get_items_of_type(ITEM_DOCUMENT):
             content = item.get_content()
-            soup = bs(content, "html.parser")
+            soup = parse_html(content, self.html_parser)
             if search_string in soup.get_text():
                 matching_items.append(item)
 
@@ -416,7 +638,8 @@ class EPUBBookLoader(BaseBookLoader):
 
         name_fix = complete_book_name
 
-        complete_book = epub.read_epub(complete_book_name)
+        with span("epub read"):
+            complete_book = epub.read_epub(complete_book_name)
 
         if fixname == "":
             fixname = self.find_items_containing_string(complete_book, fixstart)[
@@ -435,9 +658,8 @@ class EPUBBookLoader(BaseBookLoader):
             return
 
         content_complete = complete_item.content
-        content_ori = ori_item.content
-        soup_complete = bs(content_complete, "html.parser")
-        soup_ori = bs(content_ori, "html.parser")
+        soup_complete = parse_html(content_complete, self.html_parser)
+        soup_ori = self.get_chapter(ori_item, trans_taglist).soup
 
         p_list_complete = soup_complete.findAll(trans_taglist)
         p_list_ori = soup_ori.findAll(trans_taglist)
@@ -484,8 +706,10 @@ class EPUBBookLoader(BaseBookLoader):
         for item in complete_book.get_items():
             if item.file_name != fixname:
                 new_book.add_item(item)
-        if soup_complete:
-            complete_item.content = soup_complete.encode()
+        # hand the already edited tree to process_item instead of re-parsing it
+        self._chapters[fixname] = self._parse_chapter(
+            complete_item, trans_taglist, soup=soup_complete
+        )
 
         index = self.process_item(
             complete_item,
@@ -497,7 +721,13 @@ class EPUBBookLoader(BaseBookLoader):
             fixstart,
             fixend,
         )
-        epub.write_epub(f"{name_fix}", new_book, {})
+        with span("write_epub"):
+            epub.write_epub(f"{name_fix}", new_book, {})
+
+    def _is_excluded_item(self, item):
+        return (item.file_name in self.exclude_filelist.split(",")) or (
+            self.only_filelist and item.file_name not in self.only_filelist.split(",")
+        )
 
     def has_nest_child(self, element, trans_taglist):
         if isinstance(element, Tag):
@@ -536,36 +766,29 @@ class EPUBBookLoader(BaseBookLoader):
         if not os.path.exists("log"):
             os.makedirs("log")
 
-        content = item.content
-        soup = bs(content, "html.parser")
-        p_list = soup.findAll(trans_taglist)
-        if self.exclude_translate_selectors:
-            # Filter p_list by CSS selectors
-            excluded_elements = soup.select(self.exclude_translate_selectors)
-            p_list = [p for p in p_list if p not in excluded_elements]
-
-        p_list = self.filter_nest_list(p_list, trans_taglist)
+        chapter = self.get_chapter(item, trans_taglist)
+        chapter.touched = True
+        paragraphs = chapter.paragraphs
 
         if self.retranslate:
-            new_p_list = []
+            new_paragraphs = []
 
             if fixstart is None or fixend is None:
                 return
 
             start_append = False
-            for p in p_list:
-                text = p.get_text()
+            for para in paragraphs:
+                text = para.node.get_text()
                 if fixstart in text or fixend in text or start_append:
                     start_append = True
-                    new_p_list.append(p)
+                    new_paragraphs.append(para)
                 if fixend in text:
-                    p_list = new_p_list
+                    paragraphs = new_paragraphs
                     break
 
-        if self.allow_navigable_strings:
-            p_list.extend(soup.findAll(text=True))
-
         send_num = self.accumulated_num
+        if send_num > 1 or (self.single_translate and self.block_size > 0):
+            chapter.count_tokens(self._token_model())
         try:
             if send_num > 1:
                 with open("log/buglog.txt", "a") as f:
@@ -577,25 +800,30 @@ class EPUBBookLoader(BaseBookLoader):
                 with self._progress_lock:
                     start_index = self._translation_index
                 
-                new_index = self.translate_paragraphs_acc(p_list, send_num, start_index, p_to_save_len, pbar)
+                new_index = self.translate_paragraphs_acc(
+                    paragraphs, send_num, start_index, pbar
+                )
                 
                 with self._progress_lock:
                     self._translation_index = new_index
             else:
                 is_test_done = self.is_test and index > self.test_num
+                prefetched = self._scheduled_translations
+                if not is_test_done and self._prefetches_chapters():
+                    prefetched = self._prefetch_translations(paragraphs, index)
                 p_block = []
                 block_len = 0
-                for p in p_list:
+                for para in paragraphs:
                     if is_test_done:
                         break
-                    
-                    is_trans, p_text, new_p = self._is_p_translatable(p)
-                    if not is_trans:
+
+                    p = para.node
+                    if not para.translatable:
                         pbar.update(1)
                         continue
 
                     if self.single_translate and self.block_size > 0:
-                        p_len = num_tokens_from_text(new_p.text)
+                        p_len = para.token_count
                         block_len += p_len
                         if block_len > self.block_size:
                             index = self._process_combined_paragraph(
@@ -603,17 +831,21 @@ class EPUBBookLoader(BaseBookLoader):
                             )
                             p_block = [p]
                             block_len = p_len
-                            print()
+                            echo()
                         else:
                             p_block.append(p)
                     else:
                         index = self._process_paragraph(
-                            p, new_p, index, p_to_save_len, thread_safe=False
+                            para,
+                            index,
+                            thread_safe=False,
+                            prefetched=self._take_prefetched(prefetched, index),
                         )
-                        print()
+                        echo()
 
                     # pbar.update(delta) not pbar.update(index)?
                     pbar.update(1)
+                    self._maybe_save_temp_book()
 
                     if self.is_test and index >= self.test_num:
                         break
@@ -624,17 +856,39 @@ class EPUBBookLoader(BaseBookLoader):
 
         except KeyboardInterrupt:
             # If interrupted, strictly save current progress
-            if soup:
-                item.content = soup.encode(encoding="utf-8")
-            new_book.add_item(item)
+            self._finish_chapter(chapter, item, new_book, force=True)
             raise
 
-        if soup:
-            item.content = soup.encode(encoding="utf-8")
-        new_book.add_item(item)
+        self._finish_chapter(chapter, item, new_book)
 
         return index
 
+    def _finish_chapter(self, chapter, item, new_book, force=False):
+        """
+        Release `chapter` and add it to `new_book`, in document order.
+
+        With `batch_across_chapters` a chapter whose last paragraphs are still
+        waiting in the packer is held back until they are translated.
+        """
+        self._held_chapters.append((chapter, item))
+        waiting = {para.key[0] for para in self._batch_packer.pending}
+        while self._held_chapters:
+            chapter, item = self._held_chapters[0]
+            if not force and chapter.file_name in waiting:
+                break
+            self._held_chapters.pop(0)
+            chapter.release()
+            new_book.add_item(item)
+
+    def _flush_batches(self, new_book):
+        """Translate what is left in the packer and finish the held chapters."""
+        for batch in self._batch_packer.flush():
+            self._translate_batch(batch)
+        while self._held_chapters:
+            chapter, item = self._held_chapters.pop(0)
+            chapter.release()
+            new_book.add_item(item)
+
     def set_parallel_workers(self, workers):
         """Set number of parallel workers for chapter processing.
 
@@ -644,6 +898,9 @@ class EPUBBookLoader(BaseBookLoader):
         """
         self.parallel_workers = max(1, workers)
         self.enable_parallel = workers > 1
+        # one pooled connection for each worker
+        if hasattr(self.translate_model, "set_http_pool_size"):
+            self.translate_model.set_http_pool_size(self.parallel_workers)
 
         if workers > 8:
             print(
@@ -659,7 +916,7 @@ class EPUBBookLoader(BaseBookLoader):
 
     def _process_chapter_parallel(self, chapter_data):
         """Process a single chapter in parallel mode with proper accumulated_num handling."""
-        item, trans_taglist, p_to_save_len = chapter_data
+        item, trans_taglist = chapter_data
         chapter_result = {
             "item": item,
             "processed_content": None,
@@ -672,54 +929,30 @@ class EPUBBookLoader(BaseBookLoader):
             # This ensures each chapter has its own independent context
             thread_translator = self._create_chapter_translator()
 
-            content = item.content
-            soup = bs(content, "html.parser")
-            p_list = soup.findAll(trans_taglist)
-            if self.exclude_translate_selectors:
-                excluded_elements = soup.select(self.exclude_translate_selectors)
-                p_list = [p for p in p_list if p not in excluded_elements]
-            p_list = self.filter_nest_list(p_list, trans_taglist)
-
-            if self.allow_navigable_strings:
-                p_list.extend(soup.findAll(text=True))
-
-            # Initialize chapter-specific context lists
-            chapter_context_list = []
-            chapter_translated_list = []
+            chapter = self.get_chapter(item, trans_taglist)
+            chapter.touched = True
 
             # Apply accumulated_num logic for this chapter independently
             send_num = self.accumulated_num
             if send_num > 1:
+                chapter.count_tokens(self._token_model())
                 # Use accumulated translation logic for this chapter
                 self._translate_paragraphs_acc_parallel(
-                    p_list,
-                    send_num,
-                    thread_translator,
-                    chapter_context_list,
-                    chapter_translated_list,
+                    chapter.paragraphs, send_num, thread_translator
                 )
             else:
                 # Process paragraphs individually for this chapter
-                for p in p_list:
-                    is_trans, p_text, new_p = self._is_p_translatable(p)
-                    if not is_trans:
-                        continue
-                        
+                for para in chapter.translatable:
+                    p, p_text = para.node, para.text
                     index = self._get_next_translation_index()
 
-                    if self.resume and index < p_to_save_len:
-                        t_text = self.p_to_save[index]
-                    else:
+                    t_text = self._resumed_translation(para)
+                    if t_text is None:
                         # Use chapter-specific context for translation
-                        t_text = self._translate_with_chapter_context(
-                            thread_translator,
-                            p_text,
-                            chapter_context_list,
-                            chapter_translated_list,
-                        )
+                        t_text = thread_translator.translate(p_text)
                         t_text = "" if t_text is None else t_text
                         with self._progress_lock:
-                            self.p_to_save.append(t_text)
+                            self._record_translation(para.key, t_text)
 
                     if isinstance(p, NavigableString):
                         translated_node = NavigableString(t_text)
@@ -735,8 +968,8 @@ class EPUBBookLoader(BaseBookLoader):
                         if index % 20 == 0:
                             self._save_progress()
 
-            if soup:
-                chapter_result["processed_content"] = soup.encode(encoding="utf-8")
+            chapter.release()
+            chapter_result["processed_content"] = item.content
             chapter_result["success"] = True
 
         except Exception as e:
@@ -745,160 +978,74 @@ class EPUBBookLoader(BaseBookLoader):
 
         return chapter_result
 
+    def _token_model(self):
+        """Model whose tokenizer sizes batches, see utils.TOKENIZER_REGISTRY."""
+        model = getattr(self.translate_model, "model", None)
+        return model if isinstance(model, str) else DEFAULT_TOKENIZER_MODEL
+
     def _create_chapter_translator(self):
         """Create a translator instance for a specific chapter with independent context."""
-        # Return the main translator - we'll handle context at the chapter level
-        return self.translate_model
-
-    def _translate_with_chapter_context(
-        self, translator, text, chapter_context_list, chapter_translated_list
-    ):
-        """Translate text with chapter-specific context management."""
-        if not translator.context_flag:
-            return translator.translate(text)
+        return self.translate_model.clone_for_worker()
 
-        # Temporarily replace global context with chapter context
-        original_context = getattr(translator, "context_list", [])
-        original_translated = getattr(translator, "context_translated_list", [])
+    def _worker_translator(self):
+        """The translator owned by the calling worker thread of the paragraph scheduler."""
+        translator = getattr(self._worker_local, "translator", None)
+        if translator is None:
+            translator = self.translate_model.clone_for_worker()
+            self._worker_local.translator = translator
+        return translator
 
-        try:
-            # Use chapter-specific context
-            translator.context_list = chapter_context_list.copy()
-            translator.context_translated_list = chapter_translated_list.copy()
-
-            # Perform translation
-            result = translator.translate(text)
+    def _translate_in_worker(self, text):
+        return self._worker_translator().translate(text)
 
-            # Update chapter context
-            chapter_context_list[:] = translator.context_list
-            chapter_translated_list[:] = translator.context_translated_list
+    def _translate_list_in_worker(self, texts):
+        return self._worker_translator().translate_list(texts)
 
-            return result
-
-        finally:
-            # Restore original context
-            translator.context_list = original_context
-            translator.context_translated_list = original_translated
-
-    def _translate_paragraphs_acc_parallel(
-        self,
-        p_list,
-        send_num,
-        translator,
-        chapter_context_list,
-        chapter_translated_list,
-    ):
+    def _translate_paragraphs_acc_parallel(self, paragraphs, send_num, translator):
         """Apply accumulated_num logic for a single chapter in parallel mode with independent context."""
-        from book_maker.utils import num_tokens_from_text
-        from .helper import not_trans
-
-        count = 0
-        wait_p_list = []
-
-        # Create chapter-specific helper instance with context-aware translation
-        class ChapterHelper:
-            def __init__(
-                self, parent_loader, translator, context_list, translated_list
-            ):
-                self.parent_loader = parent_loader
-                self.translator = translator
-                self.context_list = context_list
-                self.translated_list = translated_list
-
-            def translate_with_context(self, text):
-                return self.parent_loader._translate_with_chapter_context(
-                    self.translator, text, self.context_list, self.translated_list
-                )
-
-            def deal_old(self, wait_p_list, single_translate):
-                if not wait_p_list:
-                    return
-
-                # Use the same translate_list logic as sequential processing
-                # Create a temporary translator with chapter context
-                original_context = getattr(self.translator, "context_list", [])
-                original_translated = getattr(
-                    self.translator, "context_translated_list", []
+        # the translator is private to this chapter, so a helper bound to it
+        # keeps the chapter's context and prompt state away from other workers
+        chapter_helper = EPUBBookLoaderHelper(
+            translator,
+            self.accumulated_num,
+            self.translation_style,
+            self.context_flag,
+        )
+        # chapters are translated side by side, batches stay within one
+        packer = BatchPacker(send_num, self.batch_max_paragraphs)
+        if self._batch_sizer is not None:
+            self._batch_sizer.apply(packer)
+
+        def send(batch):
+            self._batch_stats.record(batch)
+            if packer.oversized(batch):
+                # too long to share a request
+                results = chapter_helper.deal_new(
+                    batch[0].node, [], self.single_translate
                 )
-
-                try:
-                    # Set chapter context to the translator
-                    self.translator.context_list = self.context_list.copy()
-                    self.translator.context_translated_list = (
-                        self.translated_list.copy()
-                    )
-
-                    # Call translate_list for consistent batch translation logic
-                    result_txt_list = self.translator.translate_list(wait_p_list)
-
-                    # Update chapter context from translator
-                    self.context_list[:] = self.translator.context_list
-                    self.translated_list[:] = self.translator.context_translated_list
-
-                    # Apply translations using the same logic as helper.deal_old
-                    for i in range(len(wait_p_list)):
-                        if i < len(result_txt_list):
-                            p = wait_p_list[i]
-                            from .helper import shorter_result_link
-
-                            self.parent_loader.helper.insert_trans(
-                                p,
-                                shorter_result_link(result_txt_list[i]),
-                                self.parent_loader.translation_style,
-                                single_translate,
-                            )
-
-                finally:
-                    # Restore original context
-                    self.translator.context_list = original_context
-                    self.translator.context_translated_list = original_translated
-
-                wait_p_list.clear()
-
-            def deal_new(self, p, wait_p_list, single_translate):
-                self.deal_old(wait_p_list, single_translate)
-                p_text = p.decode_contents() if p.contents else p.text
-                translation = self.translate_with_context(p_text)
-                self.parent_loader.helper.insert_trans(
-                    p,
-                    translation,
-                    self.parent_loader.translation_style,
-                    single_translate,
+            else:
+                started = time.monotonic()
+                results = chapter_helper.deal_old(
+                    [para.node for para in batch], self.single_translate
                 )
+                self._observe_batch(packer, batch, results, started)
+            with self._progress_lock:
+                self._record_translations([para.key for para in batch], results)
+                self._save_progress()
 
-        chapter_helper = ChapterHelper(
-            self, translator, chapter_context_list, chapter_translated_list
-        )
-
-        for i in range(len(p_list)):
-            p = p_list[i]
-            
-            is_trans, p_text, temp_p = self.parent_loader._is_p_translatable(p)
-            if not is_trans:
-                if i == len(p_list) - 1:
-                    chapter_helper.deal_old(wait_p_list, self.single_translate)
+        for para in paragraphs:
+            if not para.translatable:
                 continue
-
-            length = num_tokens_from_text(p_text)
-            if length > send_num:
-                chapter_helper.deal_new(p, wait_p_list, self.single_translate)
+            t_text = self._resumed_translation(para)
+            if t_text is not None:
+                chapter_helper.insert_trans(
+                    para.node, t_text, self.translation_style, self.single_translate
+                )
                 continue
-
-            if i == len(p_list) - 1:
-                if count + length < send_num:
-                    wait_p_list.append(p)
-                    chapter_helper.deal_old(wait_p_list, self.single_translate)
-                else:
-                    chapter_helper.deal_new(p, wait_p_list, self.single_translate)
-                break
-
-            if count + length < send_num:
-                count += length
-                wait_p_list.append(p)
-            else:
-                chapter_helper.deal_old(wait_p_list, self.single_translate)
-                wait_p_list.append(p)
-                count = length
+            for batch in packer.add(para):
+                send(batch)
+        for batch in packer.flush():
+            send(batch)
 
     def batch_init_then_wait(self):
         name, _ = os.path.splitext(self.epub_name)
@@ -919,37 +1066,43 @@ class EPUBBookLoader(BaseBookLoader):
             self.translation_style,
             self.context_flag,
         )
+        self._batch_packer = BatchPacker(
+            self.accumulated_num, self.batch_max_paragraphs
+        )
+        self._batch_stats = BatchStats(self.accumulated_num)
+        self._batch_sizer = None
+        if self.adaptive_batch and self.accumulated_num > 1:
+            self._batch_sizer = AdaptiveBatchSize(
+                self.accumulated_num,
+                self.batch_max_paragraphs,
+                self._token_model(),
+                path=self.adaptive_batch_path,
+            )
+            self._batch_sizer.apply(self._batch_packer)
+        # chapters waiting for a batch that goes on into the next one
+        self._held_chapters = []
         self.batch_init_then_wait()
         new_book = self._make_new_book(self.origin_book)
         all_items = list(self.origin_book.get_items())
         trans_taglist = self.translate_tags.split(",")
         all_p_length = 0
         for i in all_items:
-            if (
-                (i.get_type() != ITEM_DOCUMENT)
-                or (i.file_name in self.exclude_filelist.split(","))
-                or (
-                    self.only_filelist
-                    and i.file_name not in self.only_filelist.split(",")
-                )
-            ):
+            if i.get_type() != ITEM_DOCUMENT or self._is_excluded_item(i):
                 continue
             
-            soup = bs(i.content, "html.parser")
-            p_list = soup.findAll(trans_taglist)
-            p_list = self.filter_nest_list(p_list, trans_taglist)
-            
-            for p in p_list:
-                is_trans, _, _ = self._is_p_translatable(p)
-                if is_trans:
-                    all_p_length += 1
-            
-            if self.allow_navigable_strings:
-                all_p_length += len(soup.findAll(text=True))
-        pbar = tqdm(total=self.test_num) if self.is_test else tqdm(total=all_p_length)
+            all_p_length += self.get_chapter(i, trans_taglist).translatable_total
+        self._adopt_positional_resume(
+            list(self.origin_book.get_items_of_type(ITEM_DOCUMENT)), trans_taglist
+        )
+        pbar = tqdm(
+            total=self.test_num if self.is_test else all_p_length,
+            mininterval=console.progress_interval,
+        )
         print()
         index = 0
         p_to_save_len = len(self.p_to_save)
+        self._last_temp_book = time.monotonic()
+        stream = None
         try:
             if self.retranslate:
                 self.retranslate_book(
@@ -960,10 +1113,17 @@ class EPUBBookLoader(BaseBookLoader):
             for item in self.origin_book.get_items():
                 if item.get_type() != ITEM_DOCUMENT:
                     new_book.add_item(item)
+            if self.stream_output and not (self.batch_flag or self.batch_use_flag):
+                stream = self._open_output_stream(new_book)
+                stream.write_pending()
 
             document_items = list(self.origin_book.get_items_of_type(ITEM_DOCUMENT))
 
-            if self.enable_parallel and len(document_items) > 1:
+            if (
+                self.enable_parallel
+                and len(document_items) > 1
+                and not self._use_paragraph_scheduler()
+            ):
                 # Optimize worker count: no point having more workers than chapters
                 effective_workers = min(self.parallel_workers, len(document_items))
 
@@ -991,11 +1151,14 @@ class EPUBBookLoader(BaseBookLoader):
                 # Create a simpler progress bar for parallel processing
                 pbar.close()  # Close the original progress bar
                 chapter_pbar = tqdm(
-                    total=len(document_items), desc="Chapters", unit="ch"
+                    total=len(document_items),
+                    desc="Chapters",
+                    unit="ch",
+                    mininterval=console.progress_interval,
                 )
 
                 chapter_data_list = [
-                    (item, trans_taglist, p_to_save_len) for item in document_items
+                    (item, trans_taglist) for item in document_items
                 ]
 
                 with ThreadPoolExecutor(max_workers=effective_workers) as executor:
@@ -1017,6 +1180,10 @@ class EPUBBookLoader(BaseBookLoader):
                             chapter_pbar.set_postfix_str(
                                 f"Latest: {item.file_name[:20]}..."
                             )
+                            if stream is not None:
+                                stream.write_pending()
+                            # the other chapters are still being translated
+                            self._maybe_save_temp_book(include_in_progress=False)
 
                         except Exception as e:
                             print(f"❌ Error processing {item.file_name}: {e}")
@@ -1027,101 +1194,208 @@ class EPUBBookLoader(BaseBookLoader):
                 print(f"✅ Completed all {len(document_items)} chapters")
             else:
                 # Sequential processing (original behavior or single chapter)
-                if len(document_items) == 1 and self.enable_parallel:
+                executor = None
+                if self._use_paragraph_scheduler():
+                    print(
+                        f"🚀 Paragraph-level parallel processing with {self.parallel_workers} workers"
+                    )
+                    executor = ThreadPoolExecutor(max_workers=self.parallel_workers)
+                    self._scheduled_translations = self._schedule_paragraphs(
+                        executor, document_items, trans_taglist
+                    )
+                elif len(document_items) == 1 and self.enable_parallel:
                     print(f"📄 Single chapter detected - using sequential processing")
 
-                for item in document_items:
-                    index = self.process_item(
-                        item, index, p_to_save_len, pbar, new_book, trans_taglist
-                    )
+                try:
+                    for item in document_items:
+                        index = self.process_item(
+                            item, index, p_to_save_len, pbar, new_book, trans_taglist
+                        )
+                        if stream is not None:
+                            stream.write_pending()
+                        self._maybe_save_temp_book()
+                    self._flush_batches(new_book)
+                finally:
+                    if executor is not None:
+                        # do not wait for (or keep paying for) queued paragraphs
+                        # when interrupted
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self._scheduled_translations = {}
 
-                if self.accumulated_num > 1:
+                if self.accumulated_num > 1 and stream is None:
                     name, _ = os.path.splitext(self.epub_name)
-                    epub.write_epub(f"{name}_bilingual.epub", new_book, {})
+                    self._write_book(f"{name}_bilingual.epub", new_book)
+            if self._batch_stats.requests:
+                print(f"📦 {self._batch_stats.summary()}")
+                repair_stats = getattr(self.translate_model, "repair_stats", None)
+                if repair_stats is not None and repair_stats.requests:
+                    print(f"🩹 {repair_stats.summary()}")
+            self._save_batch_sizes()
+            self._print_key_summary()
             name, _ = os.path.splitext(self.epub_name)
             if self.batch_flag:
                 self.translate_model.batch()
+            elif stream is not None:
+                self._finish_output_stream(stream)
             else:
-                epub.write_epub(f"{name}_bilingual.epub", new_book, {})
+                self._write_book(f"{name}_bilingual.epub", new_book)
             if self.accumulated_num == 1:
                 pbar.close()
-        except KeyboardInterrupt as e:
+        except (KeyboardInterrupt, NoUsableKeyError, RetriesExhausted) as e:
             print(e)
-            print("\n⚠️ Interrupted by user. Saving progress...")
-            # For batch mode or sequential, we want to save the current state
-            try:
-                name, _ = os.path.splitext(self.epub_name)
-                # Check if we have a new_book object to save
-                if 'new_book' in locals():
-                    epub.write_epub(f"{name}_bilingual.epub", new_book, {})
-                    print(f"✅ Saved bilingual book to {name}_bilingual.epub")
-                
-                self._save_progress()
-                self._save_temp_book()
-            except Exception as save_e:
-                print(f"❌ Error saving progress: {save_e}")
+            if isinstance(e, NoUsableKeyError):
+                self._print_key_summary()
+                print("\n⚠️ No api key left. Saving progress...")
+            elif isinstance(e, RetriesExhausted):
+                print("\n⚠️ Translation keeps failing. Saving progress...")
+            else:
+                print("\n⚠️ Interrupted by user. Saving progress...")
+            self._save_after_stop(stream, locals().get("new_book"))
             sys.exit(0)
         except Exception:
             traceback.print_exc()
-            sys.exit(0)
+            print("\n⚠️ Translation stopped by an error. Saving progress...")
+            self._save_after_stop(stream, locals().get("new_book"))
+            sys.exit(1)
+
+    def _save_after_stop(self, stream, new_book):
+        """Save what is translated so far, so the run can be resumed."""
+        try:
+            name, _ = os.path.splitext(self.epub_name)
+            if stream is not None:
+                # the chapters done so far are already in the archive
+                self._finish_output_stream(stream)
+                print(f"✅ Saved bilingual book to {name}_bilingual.epub")
+            elif new_book is not None:
+                self._write_book(f"{name}_bilingual.epub", new_book)
+                print(f"✅ Saved bilingual book to {name}_bilingual.epub")
+
+            self._save_progress()
+            self._save_temp_book()
+            self._save_batch_sizes()
+        except Exception as save_e:
+            print(f"❌ Error saving progress: {save_e}")
 
     def load_state(self):
         try:
-            with open(self.bin_path, "rb") as f:
-                self.p_to_save = pickle.load(f)
+            records = self.journal.load()
         except Exception:
             raise Exception("can not load resume file")
+        self._p_keys = [key for key, _ in records]
+        self.p_to_save = [t_text for _, t_text in records]
+        self._saved = {key: t_text for key, t_text in records if key is not None}
+        self._journaled_len = len(records)
+
+    def _chapter_snapshot(self, item, trans_taglist, include_in_progress):
+        """The bytes `item` gets in the temp book."""
+        chapter = self.get_chapter(item, trans_taglist)
+        if chapter.released:
+            # finished, item.content already holds the translated chapter
+            return item.content
+        if chapter.touched and include_in_progress:
+            return chapter.encode()
+        content = self._resumed_chapter_bytes.get(item.file_name)
+        if content is None:
+            content = chapter.source
+            if any(para.key in self._saved for para in chapter.translatable):
+                # insert into a tree of its own, `chapter.soup` is yet to be
+                # translated
+                resumed = self._parse_chapter(
+                    item, trans_taglist, parse_html(chapter.source, self.html_parser)
+                )
+                for para in resumed.translatable:
+                    t_text = self._saved.get(para.key)
+                    if t_text is not None:
+                        self.helper.insert_trans(
+                            para.node,
+                            t_text,
+                            self.translation_style,
+                            self.single_translate,
+                        )
+                content = resumed.encode()
+            self._resumed_chapter_bytes[item.file_name] = content
+        return content
 
-    def _save_temp_book(self):
-        # TODO refactor this logic
-        origin_book_temp = epub.read_epub(self.epub_name)
-        new_temp_book = self._make_new_book(origin_book_temp)
-        p_to_save_len = len(self.p_to_save)
+    def _save_temp_book(self, include_in_progress=True):
+        """
+        Write `_bilingual_temp.epub` from the chapters as they are now.
+
+        Finished chapters are written from their serialised bytes and the
+        others from the original document (with resumed translations, worked
+        out once), so a snapshot only serialises the chapters in progress.
+        `include_in_progress=False` is for snapshots taken while workers are
+        still changing those chapters. The file is replaced atomically, a
+        crash while writing keeps the previous snapshot.
+        """
+        new_temp_book = self._make_new_book(self.origin_book)
         trans_taglist = self.translate_tags.split(",")
-        index = 0
         try:
-            for item in origin_book_temp.get_items():
-                if item.get_type() == ITEM_DOCUMENT:
-                    content = item.content
-                    soup = bs(content, "html.parser")
-                    p_list = soup.findAll(trans_taglist)
-                    if self.exclude_translate_selectors:
-                        excluded_elements = soup.select(self.exclude_translate_selectors)
-                        p_list = [p for p in p_list if p not in excluded_elements]
-
-                    if self.allow_navigable_strings:
-                        p_list.extend(soup.findAll(text=True))
-                    for p in p_list:
-                        is_trans, p_text, new_p = self._is_p_translatable(p)
-                        if not is_trans:
-                            continue
-
-                        # TODO banch of p to translate then combine
-                        # PR welcome here
-                        if index < p_to_save_len:
-                            t_text = self.p_to_save[index]
-                            self.helper.insert_trans(
-                                p,
-                                t_text,
-                                self.translation_style,
-                                self.single_translate,
-                            )
-                            index += 1
-                        else:
-                            break
-                    # for save temp book
-                    if soup:
-                        item.content = soup.encode()
+            for item in self.origin_book.get_items():
+                if item.get_type() == ITEM_DOCUMENT and not self._is_excluded_item(
+                    item
+                ):
+                    content = self._chapter_snapshot(
+                        item, trans_taglist, include_in_progress
+                    )
+                    if content is not item.content:
+                        item = copy.copy(item)
+                        item.content = content
                 new_temp_book.add_item(item)
             name, _ = os.path.splitext(self.epub_name)
-            epub.write_epub(f"{name}_bilingual_temp.epub", new_temp_book, {})
+            temp_path = f"{name}_bilingual_temp.epub"
+            self._write_book(f"{temp_path}.part", new_temp_book)
+            os.replace(f"{temp_path}.part", temp_path)
         except Exception as e:
             # TODO handle it
             print(e)
 
+    def _maybe_save_temp_book(self, include_in_progress=True):
+        """Refresh the temp book once `temp_book_interval` seconds have passed."""
+        if self.temp_book_interval <= 0:
+            return
+        if time.monotonic() - self._last_temp_book < self.temp_book_interval:
+            return
+        self._save_temp_book(include_in_progress)
+        self._last_temp_book = time.monotonic()
+
+    def _print_key_summary(self):
+        keys = getattr(self.translate_model, "keys", None)
+        if hasattr(keys, "has_problems") and keys.has_problems():
+            print(f"🔑 api keys:\n{keys.summary()}")
+
+    def _save_batch_sizes(self):
+        if self._batch_sizer is not None:
+            print(f"📐 {self._batch_sizer.summary()}")
+            self._batch_sizer.save()
+
+    def _write_book(self, file_name, book):
+        """Write `book`, copying the media of the source book straight from its zip."""
+        EpubStreamWriter(file_name, book, self.epub_name, self._media_dir).write()
+
+    def _open_output_stream(self, new_book):
+        name, _ = os.path.splitext(self.epub_name)
+        stream = EpubStreamWriter(
+            f"{name}_bilingual.epub.part", new_book, self.epub_name, self._media_dir
+        )
+        stream.open()
+        return stream
+
+    def _finish_output_stream(self, stream):
+        stream.close()
+        os.replace(stream.file_name, stream.file_name[: -len(".part")])
+
     def _save_progress(self):
         try:
-            with open(self.bin_path, "wb") as f:
-                pickle.dump(self.p_to_save, f)
+            # only what was translated since the last save is written
+            new_len = len(self.p_to_save)
+            self.journal.append(
+                list(
+                    zip(
+                        self._p_keys[self._journaled_len : new_len],
+                        self.p_to_save[self._journaled_len : new_len],
+                    )
+                )
+            )
+            self._journaled_len = new_len
         except Exception:
             raise Exception("can not save resume file")
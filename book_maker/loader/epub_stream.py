@@ -0,0 +1,150 @@
+import mimetypes
+import posixpath
+import shutil
+import zipfile
+
+from ebooklib import epub
+
+from book_maker.profiling import span
+
+# media the loader never looks into, they stay in the source zip until written
+DEFERRED_MEDIA_PREFIXES = ("image/", "audio/", "video/", "font/")
+
+
+def is_deferred_media(zip_name):
+    media_type, _ = mimetypes.guess_type(zip_name)
+    return media_type is not None and media_type.startswith(DEFERRED_MEDIA_PREFIXES)
+
+
+class MediaDeferringReader(epub.EpubReader):
+    """
+    EpubReader that does not load images, audio, video and fonts.
+
+    Their items get empty content, `EpubStreamWriter` copies them from the
+    source zip (`opf_dir` is where their file names are relative to), so an
+    image-heavy book does not sit in memory for the whole translation.
+    """
+
+    def read_file(self, name):
+        if isinstance(self.zf, zipfile.ZipFile) and is_deferred_media(name):
+            # still raise KeyError for missing files like the eager reader
+            self.zf.getinfo(posixpath.normpath(name))
+            return b""
+        return super().read_file(name)
+
+    @property
+    def defers_media(self):
+        return isinstance(self.zf, zipfile.ZipFile)
+
+
+def read_epub_deferring_media(name):
+    """Return (book, opf dir) with media left in the zip, see MediaDeferringReader."""
+    with span("epub read"):
+        reader = MediaDeferringReader(name)
+        book = reader.load()
+        reader.process()
+    # a directory "epub" has nothing to copy from later, it was read eagerly
+    return book, reader.opf_dir if reader.defers_media else None
+
+
+class EpubStreamWriter(epub.EpubWriter):
+    """
+    EpubWriter that can write the items of a book one at a time.
+
+    `open` starts the archive, `write_pending` appends the items added to the
+    book since the last call, and `close` writes what is left together with
+    the manifest, spine and navigation, which need every item. Items read by
+    `read_epub_deferring_media` (empty content) are copied from `source`
+    without being loaded into memory. `write` does it all at once.
+    """
+
+    def __init__(self, name, book, source=None, source_dir=None, options=None):
+        super().__init__(name, book, options)
+        self.source = source if source_dir is not None else None
+        self.source_dir = source_dir
+        self.out = None
+        self._source_zip = None
+        self._written = set()
+
+    def open(self):
+        with span("write_epub"):
+            self._open()
+
+    def _open(self):
+        self.out = zipfile.ZipFile(
+            self.file_name,
+            "w",
+            zipfile.ZIP_DEFLATED,
+            compresslevel=self.options["compresslevel"],
+        )
+        self.out.writestr(
+            "mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED
+        )
+        self._write_container()
+        if self.source is not None:
+            self._source_zip = zipfile.ZipFile(self.source)
+
+    def write_pending(self):
+        with span("write_epub"):
+            self._write_pending()
+
+    def _write_pending(self):
+        for item in self.book.get_items():
+            if id(item) in self._written:
+                continue
+            # navigation is generated from the finished book in `close`
+            if isinstance(item, (epub.EpubNcx, epub.EpubNav)):
+                continue
+            self._write_item(item)
+            self._written.add(id(item))
+
+    def close(self):
+        with span("write_epub"):
+            self._close()
+
+    def _close(self):
+        try:
+            self._write_pending()
+            for item in self.book.get_items():
+                if isinstance(item, epub.EpubNcx):
+                    self.out.writestr(self._zip_name(item), self._get_ncx())
+                elif isinstance(item, epub.EpubNav):
+                    self.out.writestr(self._zip_name(item), self._get_nav(item))
+            self._write_opf()
+        finally:
+            self.out.close()
+            if self._source_zip is not None:
+                self._source_zip.close()
+
+    def write(self):
+        self.open()
+        self.close()
+
+    def _zip_name(self, item):
+        if item.manifest:
+            return f"{self.book.FOLDER_NAME}/{item.file_name}"
+        return item.file_name
+
+    def _write_item(self, item):
+        name = self._zip_name(item)
+        if not item.content and self._source_zip is not None:
+            source_name = posixpath.normpath(
+                posixpath.join(self.source_dir, item.file_name)
+            )
+            try:
+                info = self._source_zip.getinfo(source_name)
+            except KeyError:
+                info = None
+            if info is not None:
+                target = zipfile.ZipInfo(name, date_time=info.date_time)
+                # images are usually stored, do not deflate them again
+                target.compress_type = info.compress_type
+                with (
+                    self._source_zip.open(info) as src,
+                    self.out.open(
+                        target, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT
+                    ) as dst,
+                ):
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                return
+        self.out.writestr(name, item.content)
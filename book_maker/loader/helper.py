@@ -1,11 +1,41 @@
 import re
-import backoff
 import logging
 from copy import copy
 
-logging.basicConfig(level=logging.WARNING)
+from bs4 import BeautifulSoup as bs
+from bs4 import Comment
+from bs4.element import ProcessingInstruction
+
+from book_maker.profiling import span
+
 logger = logging.getLogger(__name__)
 
+HTML_PARSERS = ["lxml", "html.parser", "html5lib"]
+
+
+def default_html_parser():
+    """lxml is several times faster than the pure-Python parser, use it when installed."""
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return "html.parser"
+    return "lxml"
+
+
+def parse_html(markup, parser="html.parser"):
+    soup = bs(markup, parser)
+    if parser == "lxml":
+        # lxml's HTML parser turns the <?xml ...?> declaration of an xhtml
+        # document into a comment, put it back as a processing instruction
+        first = next(iter(soup.contents), None)
+        if (
+            isinstance(first, Comment)
+            and first.startswith("?xml")
+            and first.endswith("?")
+        ):
+            first.replace_with(ProcessingInstruction(first[1:]))
+    return soup
+
 
 class EPUBBookLoaderHelper:
     def __init__(
@@ -17,6 +47,10 @@ class EPUBBookLoaderHelper:
         self.context_flag = context_flag
 
     def insert_trans(self, p, text, translation_style="", single_translate=False):
+        with span("insert_trans"):
+            self._insert_trans(p, text, translation_style, single_translate)
+
+    def _insert_trans(self, p, text, translation_style, single_translate):
         if text is None:
             text = ""
         if (
@@ -118,20 +152,14 @@ class EPUBBookLoaderHelper:
         if single_translate:
             p.extract()
 
-    @backoff.on_exception(
-        backoff.expo,
-        Exception,
-        on_backoff=lambda details: logger.warning(f"retry backoff: {details}"),
-        on_giveup=lambda details: logger.warning(f"retry abort: {details}"),
-        jitter=None,
-    )
-    def translate_with_backoff(self, text, context_flag=False):
+    def translate_one(self, text, context_flag=False):
+        # the translators retry by their `retry_policy`, what gets here is final
         return self.translate_model.translate(text, context_flag)
 
     def deal_new(self, p, wait_p_list, single_translate=False):
         self.deal_old(wait_p_list, single_translate, self.context_flag)
         p_text = p.decode_contents() if hasattr(p, "contents") and p.contents else p.text
-        translation = shorter_result_link(self.translate_with_backoff(p_text, self.context_flag))
+        translation = shorter_result_link(self.translate_one(p_text, self.context_flag))
         self.insert_trans(
             p,
             translation,
@@ -144,14 +172,18 @@ class EPUBBookLoaderHelper:
         if not wait_p_list:
             return []
 
-        result_txt_list = self.translate_model.translate_list(wait_p_list)
+        # what gets inserted, so a resumed run inserts the same
+        result_txt_list = [
+            shorter_result_link(text)
+            for text in self.translate_model.translate_list(wait_p_list)
+        ]
 
         for i in range(len(wait_p_list)):
             if i < len(result_txt_list):
                 p = wait_p_list[i]
                 self.insert_trans(
                     p,
-                    shorter_result_link(result_txt_list[i]),
+                    result_txt_list[i],
                     self.translation_style,
                     single_translate,
                 )
@@ -161,16 +193,18 @@ class EPUBBookLoaderHelper:
 
 
 url_pattern = r"(http[s]?://|www\.)+(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+url_re = re.compile(url_pattern)
+tail_link_re = re.compile(r".*" + url_pattern + r"$")
 
 
 def is_text_link(text):
-    return bool(re.compile(url_pattern).match(text.strip()))
+    return bool(url_re.match(text.strip()))
 
 
 def is_text_tail_link(text, num=80):
     text = text.strip()
-    pattern = r".*" + url_pattern + r"$"
-    return bool(re.compile(pattern).match(text)) and len(text) < num
+    # length first, the regex backtracks over the whole text
+    return len(text) < num and bool(tail_link_re.match(text))
 
 
 def shorter_result_link(text, num=20):
@@ -179,7 +213,7 @@ def shorter_result_link(text, num=20):
     if not match or len(match.group()) < num:
         return text
 
-    return re.compile(url_pattern).sub("...", text)
+    return url_re.sub("...", text)
 
 
 def is_text_source(text):
@@ -188,12 +222,12 @@ def is_text_source(text):
 
 def is_text_list(text, num=80):
     text = text.strip()
-    return re.match(r"^Listing\s*\d+", text) and len(text) < num
+    return len(text) < num and re.match(r"^Listing\s*\d+", text)
 
 
 def is_text_figure(text, num=80):
     text = text.strip()
-    return re.match(r"^Figure\s*\d+", text) and len(text) < num
+    return len(text) < num and re.match(r"^Figure\s*\d+", text)
 
 
 def is_text_digit_and_space(s):
@@ -0,0 +1,83 @@
+import json
+import os
+import pickle
+
+
+class ResumeJournal:
+    """
+    Append-only record of finished translations used by `--resume`.
+
+    Every translation is written once as a JSON line together with the key of
+    its paragraph (see `epub_chapter.paragraph_key`), and the file is fsynced
+    per `append` call, so saving progress costs O(new paragraphs) instead of
+    re-pickling the whole list. A run killed mid-write leaves at most one torn
+    line at the end, which `load` drops (and the next append cuts off).
+    Resume files written by older versions (a pickled list) are still read,
+    their entries have no key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # byte offset new records are appended at, None until load/first append
+        self._end = None
+        self._legacy = None
+
+    def load(self):
+        """Return the saved (key, translation) pairs in the order they were recorded."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if data.startswith(b"\x80"):
+            # pickle protocol >= 2, the old `_save_progress` format
+            self._legacy = [(None, t) for t in pickle.loads(data)]
+            self._end = None
+            return list(self._legacy)
+
+        records = []
+        end = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+                key = record.get("k")
+                records.append((tuple(key) if key else None, record["t"]))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                break
+            end += len(line)
+        self._end = end
+        return records
+
+    def append(self, records):
+        """Record (key, translation) pairs after everything already saved and fsync."""
+        if self._legacy is not None:
+            self._rewrite(self._legacy)
+            self._legacy = None
+        if self._end is None:
+            # fresh run: drop whatever an earlier run left behind
+            self._rewrite([])
+        if not records:
+            return
+        lines = b"".join(self._encode(key, t) for key, t in records)
+        with open(self.path, "r+b") as f:
+            f.truncate(self._end)
+            f.seek(self._end)
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._end += len(lines)
+
+    @staticmethod
+    def _encode(key, translation):
+        record = {"t": translation} if key is None else {"k": key, "t": translation}
+        return json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def _rewrite(self, records):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for key, t in records:
+                f.write(self._encode(key, t))
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        os.replace(tmp_path, self.path)
+        self._end = end
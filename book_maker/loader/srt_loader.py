@@ -138,7 +138,28 @@ class SRTBookLoader(BaseBookLoader):
 
         return True
 
+    def _batches_natively(self):
+        """The translator's api takes many subtitles in one request."""
+        return getattr(self.translate_model, "max_batch_segments", 1) > 1
+
+    def _translate_blocks(self, blocks):
+        """Translate the text of each block, as many in a request as the api takes."""
+        t_texts = self.translate_model.translate_list(
+            [block["text"] for block in blocks]
+        )
+        return [
+            {"number": block["number"], "text": t_text or ""}
+            for block, t_text in zip(blocks, t_texts)
+        ]
+
     def _get_sliced_list(self):
+        if self._batches_natively():
+            # `translate_list` sizes the requests, the slices only pace saving
+            step = self.translate_model.max_batch_segments
+            return [
+                (begin, min(begin + step, len(self.blocks)), None)
+                for begin in range(0, len(self.blocks), step)
+            ]
         sliced_list = []
         sliced_text = ""
         begin_index = 0
@@ -182,15 +203,24 @@ class SRTBookLoader(BaseBookLoader):
                     if index < p_to_save_len:
                         self.p_to_save = self.p_to_save[:index]
 
-                    try:
-                        temp = self.translate_model.translate(text)
-                    except Exception as e:
-                        print(e)
-                        raise Exception("Something is wrong when translate") from e
-
-                    translated_blocks = self._get_blocks_from(temp)
-
-                    if self.accumulated_num > 1:
+                    if self._batches_natively():
+                        try:
+                            translated_blocks = self._translate_blocks(
+                                self.blocks[begin:end]
+                            )
+                        except Exception as e:
+                            print(e)
+                            raise Exception("Something is wrong when translate") from e
+                    else:
+                        try:
+                            temp = self.translate_model.translate(text)
+                        except Exception as e:
+                            print(e)
+                            raise Exception("Something is wrong when translate") from e
+
+                        translated_blocks = self._get_blocks_from(temp)
+
+                    if self.accumulated_num > 1 and not self._batches_natively():
                         if not self._check_blocks(
                             translated_blocks, self.blocks[begin:end]
                         ):
@@ -71,14 +71,24 @@ class TXTBookLoader(BaseBookLoader):
                 self.origin_book[i : i + self.batch_size]
                 for i in range(0, len(self.origin_book), self.batch_size)
             ]
+            batches = []
             for i in sliced_list:
                 # fix the format thanks https://github.com/tudoujunha
                 batch_text = "\n".join(i)
                 if self._is_special_text(batch_text):
                     continue
-                if not self.resume or index >= p_to_save_len:
+                batches.append((batch_text, not self.resume or index >= p_to_save_len))
+                index += self.batch_size
+                if self.is_test and index > self.test_num:
+                    break
+
+            translations = self._translations(
+                [batch_text for batch_text, todo in batches if todo]
+            )
+            for batch_text, todo in batches:
+                if todo:
                     try:
-                        temp = self.translate_model.translate(batch_text)
+                        temp = next(translations)
                     except Exception as e:
                         print(e)
                         raise Exception("Something is wrong when translate") from e
@@ -86,9 +96,6 @@ class TXTBookLoader(BaseBookLoader):
                     if not self.single_translate:
                         self.bilingual_result.append(batch_text)
                     self.bilingual_result.append(temp)
-                index += self.batch_size
-                if self.is_test and index > self.test_num:
-                    break
 
             self.save_file(
                 f"{Path(self.txt_name).parent}/{Path(self.txt_name).stem}_bilingual.txt",
@@ -102,6 +109,19 @@ class TXTBookLoader(BaseBookLoader):
             self._save_temp_book()
             sys.exit(0)
 
+    def _translations(self, texts):
+        """
+        Translate `texts` in order, lazily, many in one request when the
+        translator's api takes that (see `Base.translate_list`).
+        """
+        step = getattr(self.translate_model, "max_batch_segments", 1)
+        if step <= 1:
+            for text in texts:
+                yield self.translate_model.translate(text)
+            return
+        for start in range(0, len(texts), step):
+            yield from self.translate_model.translate_list(texts[start : start + step])
+
     def _save_temp_book(self):
         index = 0
         sliced_list = [
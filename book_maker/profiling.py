@@ -0,0 +1,192 @@
+import atexit
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+
+# the pipeline stages, in the order the report lists them
+STAGES = (
+    "epub read",
+    "chapter parse",
+    "filtering",
+    "token counting",
+    "network",
+    "insert_trans",
+    "serialisation",
+    "write_epub",
+)
+
+_profile = None
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("profile", "name", "frame")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+        self.frame = None
+
+    def __enter__(self):
+        stack = self.profile.stack()
+        # a stage entered again inside itself is timed by the outer span only
+        if not (stack and stack[-1][0] == self.name):
+            now = time.perf_counter()
+            self.frame = [self.name, now, time.thread_time(), 0.0, 0.0]
+            stack.append(self.frame)
+        return self
+
+    def __exit__(self, *exc):
+        if self.frame is not None:
+            wall = time.perf_counter() - self.frame[1]
+            cpu = time.thread_time() - self.frame[2]
+            stack = self.profile.stack()
+            stack.pop()
+            if stack:
+                stack[-1][3] += wall
+                stack[-1][4] += cpu
+            self.profile.add(self.name, wall - self.frame[3], cpu - self.frame[4])
+        return False
+
+
+class Profile:
+    """
+    Wall and cpu time per pipeline stage, summed over all threads. A stage
+    nested in another (a request sent while a chapter is parsed) is counted
+    in the inner stage only, so the stages add up to the time spent in them.
+    The wall time a thread did not spend on its cpu is waiting: for the
+    network, the rate limiter and the back off between retries.
+    """
+
+    def __init__(self, path, cpu=False, memory=False):
+        self.path = path
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.cprofile = None
+        if cpu:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.memory = memory
+        if memory:
+            tracemalloc.start()
+
+    def stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add(self, name, wall, cpu):
+        with self._lock:
+            stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += wall
+            stage[2] += cpu
+
+    def report(self):
+        wall = time.perf_counter() - self.started
+        cpu = time.process_time() - self.cpu_started
+        lines = [
+            f"run: {wall:.2f}s wall, {cpu:.2f}s cpu",
+            "",
+            f"{'stage':<16}{'calls':>8}{'wall s':>10}{'cpu s':>10}"
+            f"{'wait s':>10}{'wait':>7}",
+        ]
+        with self._lock:
+            stages = dict(self.stages)
+        names = [n for n in STAGES if n in stages]
+        names += sorted(n for n in stages if n not in STAGES)
+        for name in names:
+            calls, stage_wall, stage_cpu = stages[name]
+            wait = max(0.0, stage_wall - stage_cpu)
+            share = wait / stage_wall if stage_wall else 0.0
+            lines.append(
+                f"{name:<16}{calls:>8}{stage_wall:>10.2f}{stage_cpu:>10.2f}"
+                f"{wait:>10.2f}{share:>7.0%}"
+            )
+        lines.append("")
+        lines.append(
+            "stage times are summed over the worker threads and can add up to "
+            "more than the run"
+        )
+        if names:
+            busiest = max(names, key=lambda n: stages[n][1])
+            calls, stage_wall, stage_cpu = stages[busiest]
+            if stage_wall - stage_cpu > stage_cpu:
+                hint = "mostly waiting, more --parallel-workers should help"
+            else:
+                hint = "mostly cpu, more workers will not help"
+            lines.append(f"most time: {busiest}, {hint}")
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(self.cprofile, stream=out)
+            stats.sort_stats("cumulative").print_stats(30)
+            lines += ["", "cProfile of the main thread, by cumulative time:"]
+            lines.append(out.getvalue().strip())
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines += [
+                "",
+                f"memory: {current / 2**20:.1f} MiB now, {peak / 2**20:.1f} MiB peak,"
+                " largest allocations still alive:",
+            ]
+            lines += [str(s) for s in snapshot.statistics("lineno")[:15]]
+        return "\n".join(lines) + "\n"
+
+
+def span(name):
+    """Time the block as pipeline stage `name` when `--profile` is on."""
+    if _profile is None:
+        return _NO_SPAN
+    return _Span(_profile, name)
+
+
+def add_wait(name, seconds):
+    """
+    Count `seconds` of waiting as one call of stage `name`, for awaited
+    requests: coroutines interleave on one thread, a span cannot time them.
+    """
+    if _profile is not None:
+        _profile.add(name, seconds, 0.0)
+
+
+def start_profiling(path, cpu=False, memory=False):
+    """
+    Time the stages until `stop_profiling`, which writes the report to
+    `path`. `cpu` adds a cProfile of the main thread, `memory` the peak and
+    largest allocations traced by tracemalloc; both slow the run down.
+    """
+    global _profile
+    stop_profiling()
+    _profile = Profile(path, cpu=cpu, memory=memory)
+    atexit.register(stop_profiling)
+
+
+def stop_profiling():
+    """Write the report, return its path, or None when not profiling."""
+    global _profile
+    if _profile is None:
+        return None
+    profile, _profile = _profile, None
+    with open(profile.path, "w", encoding="utf-8") as f:
+        f.write(profile.report())
+    return profile.path
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from openai import AsyncOpenAI
+
+from book_maker.profiling import add_wait
+
+
+class AsyncStrategy:
+    """
+    Mixin for translators backed by an OpenAI-compatible chat endpoint.
+
+    `translate_concurrently` keeps up to `async_concurrency` requests in flight
+    on one event loop instead of translating paragraph after paragraph, and
+    returns the translations in the order of the input list. Failed requests
+    are retried by the same policy and circuit breaker as `translate`.
+    Subclasses must define the coroutine `async_get_translation(client, text)`,
+    which sends one request with `client` and returns the translation, and
+    may override `create_async_client`.
+    """
+
+    async_concurrency = 0
+
+    def set_async_concurrency(self, concurrency):
+        self.async_concurrency = max(0, concurrency)
+
+    def create_async_client(self, key):
+        return AsyncOpenAI(api_key=key, base_url=self.api_base)
+
+    def translate_concurrently(self, text_list):
+        if not text_list:
+            return []
+        return asyncio.run(self._async_translate_all(list(text_list)))
+
+    async def _async_translate_all(self, text_list):
+        # one client per key, every attempt goes out with the next healthy key
+        clients = {key: self.create_async_client(key) for key in self.keys.usable()}
+        semaphore = asyncio.Semaphore(max(1, self.async_concurrency))
+        try:
+            return await asyncio.gather(
+                *(self._async_translate(clients, text, semaphore) for text in text_list)
+            )
+        finally:
+            for client in clients.values():
+                await client.close()
+
+    async def _async_translate(self, clients, text, semaphore):
+        async with semaphore:
+            sent_with = {}
+
+            async def attempt():
+                # every attempt goes out with the next healthy key
+                key = sent_with["key"] = next(self.keys)
+                self.telemetry.attempt()
+                self.telemetry.note(key=key)
+                await self.rate_limiter.wait_async(
+                    key, self.estimate_request_tokens(text)
+                )
+                started = time.monotonic()
+                try:
+                    t_text = await self.async_get_translation(clients[key], text)
+                except Exception:
+                    self.keys.record(key, error=True)
+                    raise
+                self.keys.record(key, time.monotonic() - started)
+                return t_text
+
+            provider = type(self).__name__
+            started = time.perf_counter()
+            with self.telemetry.request(provider, self.model_name()) as entry:
+                t_text = await self.retry_policy.call_async(
+                    attempt,
+                    breaker=self.circuit_breaker,
+                    on_error=lambda e: self.key_error_verdict(e, sent_with["key"]),
+                )
+                entry["ok"] = t_text is not None
+            add_wait("network", time.perf_counter() - started)
+            # given up on, the paragraph stays untranslated like in `translate`
+            return text if t_text is None else t_text
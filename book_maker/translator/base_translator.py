@@ -1,11 +1,33 @@
-import itertools
 from abc import ABC, abstractmethod
+from copy import copy
+
+from book_maker.console import echo, echo_translation
+from book_maker.profiling import span
+from book_maker.utils import estimate_tokens
+
+from .http_session import PooledSession
+from .key_pool import KeyPool, is_key_rejected
+from .rate_limiter import RateLimiter, retry_after
+from .retry_policy import NEXT_KEY, RETRY_NOW, CircuitBreaker, RetryPolicy
+from .telemetry import Telemetry
 
 
 class Base(ABC):
+    # translators whose api takes many segments in one request set how many
+    # and how many characters in total, `translate_list` packs paragraphs
+    # into requests that fit and `translate_segments` sends one of them
+    max_batch_segments = 1
+    max_batch_chars = 0
+
     def __init__(self, key, language) -> None:
-        self.keys = itertools.cycle(key.split(","))
+        self.keys = KeyPool(key.split(","))
         self.language = language
+        # shared with the worker clones, see `clone_for_worker`
+        self.rate_limiter = RateLimiter()
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
+        self.session = PooledSession()
+        self.telemetry = Telemetry()
 
     @abstractmethod
     def rotate_key(self):
@@ -16,7 +38,160 @@ class Base(ABC):
         pass
 
     def translate_list(self, text_list):
-        return [self.translate(text) for text in text_list]
+        if self.max_batch_segments <= 1:
+            return [self.translate(text) for text in text_list]
+        results = []
+        for start, stop in self.segment_batches(text_list):
+            texts = text_list[start:stop]
+            t_texts = None
+            if len(texts) > 1:
+                with self.telemetry.batch(len(texts)):
+                    t_texts = self.translate_segments(texts)
+            if t_texts is None or len(t_texts) != len(texts):
+                # a single paragraph, or the answer does not line up with the
+                # request, translate them one by one
+                t_texts = [self.translate(text) for text in texts]
+            results.extend(t_texts)
+        return results
+
+    def segment_batches(self, text_list):
+        """
+        Split `text_list` into runs of consecutive texts that fit one request,
+        as (start, stop). A text that is too long, or that `can_share_request`
+        refuses, is a run of its own.
+        """
+        batches = []
+        start = chars = 0
+        for i, text in enumerate(text_list):
+            alone = not self.can_share_request(text) or (
+                self.max_batch_chars and len(text) > self.max_batch_chars
+            )
+            if i > start and (
+                alone
+                or i - start >= self.max_batch_segments
+                or (self.max_batch_chars and chars + len(text) > self.max_batch_chars)
+            ):
+                batches.append((start, i))
+                start, chars = i, 0
+            chars += len(text)
+            if alone:
+                batches.append((start, i + 1))
+                start, chars = i + 1, 0
+        if start < len(text_list):
+            batches.append((start, len(text_list)))
+        return batches
+
+    def can_share_request(self, text):
+        return True
+
+    def translate_segments(self, texts):
+        """
+        The translations of `texts`, in order, from a single request; None to
+        send them one by one instead.
+        """
+        return None
+
+    def print_segments(self, texts, t_texts):
+        for text, t_text in zip(texts, t_texts):
+            echo(text)
+            echo_translation(t_text)
 
     def set_deployment_id(self, deployment_id):
         pass
+
+    def set_rate_limits(self, rpm=None, tpm=None):
+        self.rate_limiter.configure(rpm=rpm, tpm=tpm)
+
+    def set_http_pool_size(self, size):
+        """Keep a pooled connection for each of `size` workers."""
+        self.session.resize(size)
+
+    def set_http_timeout(self, seconds):
+        """Wait at most `seconds` for an answer of the REST api."""
+        connect = self.session.timeout
+        if isinstance(connect, tuple):
+            connect = connect[0]
+        self.session.timeout = (min(connect, seconds), seconds)
+
+    def estimate_request_tokens(self, text):
+        # the prompt around the text and an answer about as long as the text
+        prompt = getattr(self, "prompt_template", None) or getattr(self, "prompt", "")
+        return 2 * estimate_tokens(text) + estimate_tokens(prompt or "")
+
+    def set_retry_policy(self, max_attempts=None, max_delay=None):
+        if max_attempts is not None:
+            self.retry_policy.max_attempts = max(1, max_attempts)
+        if max_delay is not None:
+            self.retry_policy.max_delay = max_delay
+
+    def with_retry(self, request, *args, on_error=None):
+        """
+        Return `request(*args)`, retried by the shared policy and breaker, and
+        add it to the telemetry of the run.
+        """
+
+        def attempt(*args):
+            self.telemetry.attempt()
+            return request(*args)
+
+        provider = type(self).__name__
+        with (
+            span("network"),
+            self.telemetry.request(provider, self.model_name()) as entry,
+        ):
+            result = self.retry_policy.call(
+                attempt, *args, breaker=self.circuit_breaker, on_error=on_error
+            )
+            entry["ok"] = result is not None
+        return result
+
+    def model_name(self):
+        model = getattr(self, "model", None)
+        return model if isinstance(model, str) else None
+
+    def key_error_verdict(self, error, key):
+        """
+        `on_error` for requests sent with `key`: a rejected key is retired and
+        a rate limited one held back, either way another key is tried at once.
+        """
+        if is_key_rejected(error):
+            if error.status_code == 429:
+                reason = "insufficient_quota"
+            else:
+                reason = f"{error.status_code} {type(error).__name__}"
+            self.keys.retire(key, reason)
+            return NEXT_KEY
+        if getattr(error, "status_code", None) == 429:
+            hold_time = retry_after(error, int(60 / len(self.keys.keys)))
+            print(error, f"will not use this key for {hold_time} seconds")
+            self.hold_key(key, hold_time)
+            return RETRY_NOW
+        return None
+
+    def hold_key(self, key, seconds):
+        """`key` was rate limited, hand out the other keys for `seconds`."""
+        self.keys.bench(key, seconds)
+        self.rate_limiter.penalize(key, seconds)
+
+    def wait_for_rate_limit(self, text, key=""):
+        """Block until `key` has the budget for a request translating `text`."""
+        self.rate_limiter.wait(key, self.estimate_request_tokens(text))
+
+    def clone_for_worker(self):
+        """
+        A copy of the translator for one worker thread, with its own context
+        and prompt state and its own api client. Key rotation (`self.keys`),
+        model rotation, the rate limiter, retry policy, circuit breaker, the
+        pooled http session, telemetry, batch repair counts and locks stay
+        shared with the original.
+        """
+        worker = copy(self)
+        for name in ("context_list", "context_translated_list"):
+            if hasattr(self, name):
+                setattr(worker, name, [])
+        worker.renew_client()
+        return worker
+
+    def renew_client(self):
+        """Replace api clients that must not be shared between worker threads."""
+        pass
@@ -1,118 +1,260 @@
+import json
 import re
 from copy import copy
+from threading import Lock, local
+
+from book_maker.console import echo
+
+from .telemetry import Telemetry
+
+# the markers the prompt asks for, "TRANSLATION OF PARAGRAPH 12:"
+MARKER_RE = re.compile(r"TRANSLATION OF PARAGRAPH\s*(\d+)\s*:")
+# what models write instead, "PARAGRAPH 12:", "TRANSLATION 12:", "PARA (12):"...
+LOOSE_MARKER_RE = re.compile(
+    r"(?:TRANSLATION|PARAGRAPH|PARA)[^\d\n:]{0,30}?(\d+)[^\n:]{0,10}:"
+)
+
+
+def _numbered_segments(marker_re, text, count):
+    """paragraph number -> text up to the next marker, first occurrence wins."""
+    segments = {}
+    matches = list(marker_re.finditer(text))
+    for match, following in zip(matches, matches[1:] + [None]):
+        num = int(match.group(1))
+        if 1 <= num <= count and num not in segments:
+            end = following.start() if following is not None else len(text)
+            segments[num] = text[match.end() : end].strip()
+    return segments
+
+
+def split_numbered_translations(text, count):
+    """
+    Return the translations of paragraphs 1..count of a numbered response,
+    "" for the ones that cannot be found.
+
+    The markers are found in one pass over the response and the text between
+    two markers belongs to the first, when some of the requested markers are
+    missing a second pass with looser markers is tried.
+    """
+    found = _numbered_segments(MARKER_RE, text, count)
+    if len(found) < count:
+        loose = _numbered_segments(LOOSE_MARKER_RE, text, count)
+        if len(loose) > len(found):
+            found = loose
+    return [found.get(i, "") for i in range(1, count + 1)]
+
+
+def parse_json_translations(text, count):
+    """
+    Return the translations of a `[{"id": n, "translation": ...}]` response,
+    None when the response holds no such array.
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        items = json.loads(text[start : end + 1])
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+    found = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        num, translation = item.get("id"), item.get("translation")
+        if isinstance(num, int) and 1 <= num <= count and isinstance(translation, str):
+            found.setdefault(num, translation.strip())
+    return [found.get(i, "") for i in range(1, count + 1)]
+
+
+class RepairStats:
+    """Paragraphs `BatchStrategy` had to request again, thread safe."""
+
+    def __init__(self):
+        self.requests = 0
+        self.repaired = 0
+        self.unrepaired = 0
+        self._lock = Lock()
+
+    def record(self, requests, repaired, unrepaired):
+        with self._lock:
+            self.requests += requests
+            self.repaired += repaired
+            self.unrepaired += unrepaired
+
+    def summary(self):
+        return (
+            f"{self.repaired} paragraphs missing from batch answers repaired "
+            f"with {self.requests} more requests, {self.unrepaired} left untranslated"
+        )
+
 
 class BatchStrategy:
+    # ask for a JSON array of {"id", "translation"} instead of numbered markers
+    batch_json_output = False
+    # re-request the paragraphs a batch answer left out, see `_repair_missing`
+    batch_repair = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # shared with the worker clones, see `clone_for_worker`
+        self.repair_stats = RepairStats()
+        self._last_batch = local()
+
+    def set_batch_json_output(self, enabled=True):
+        self.batch_json_output = enabled
+
+    def set_batch_repair(self, enabled=True):
+        self.batch_repair = enabled
+
+    def take_batch_repairs(self):
+        """Return (and forget) how many paragraphs this thread's last batch had to repair."""
+        repaired = getattr(self._last_batch, "repaired", 0)
+        self._last_batch.repaired = 0
+        return repaired
+
     def translate_list(self, plist):
-        plist_len = len(plist)
-        
-        # Create a list of original texts and add clear numbering markers to each paragraph
-        formatted_text = ""
-        for i, p in enumerate(plist, 1):
-            temp_p = copy(p)
-            for sup in temp_p.find_all("sup"):
-                sup.extract()
-            para_text = temp_p.decode_contents() if hasattr(temp_p, "contents") and temp_p.contents else temp_p.get_text().strip()
-            # Using special delimiters and clear numbering
-            formatted_text += f"PARAGRAPH {i}:\n{para_text}\n\n"
+        # Create a list of original texts
+        para_texts = []
+        for p in plist:
+            temp_p = p
+            # only pay for a copy of the subtree when there is something to strip
+            if hasattr(p, "find") and p.find("sup") is not None:
+                temp_p = copy(p)
+                for sup in temp_p.find_all("sup"):
+                    sup.extract()
+            para_texts.append(
+                temp_p.decode_contents()
+                if hasattr(temp_p, "contents") and temp_p.contents
+                else temp_p.get_text().strip()
+            )
+
+        echo(f"plist len = {len(plist)}")
+
+        translated_paragraphs = self._translate_texts(para_texts)
+        if self.batch_repair:
+            self._repair_missing(para_texts, translated_paragraphs)
 
-        print(f"plist len = {plist_len}")
+        missing = [
+            str(i)
+            for i, (text, t) in enumerate(zip(para_texts, translated_paragraphs), 1)
+            if text.strip() and not t
+        ]
+        if missing:
+            echo(
+                f"Warning: Could not find translation for paragraph {', '.join(missing)}"
+            )
+
+        return translated_paragraphs
+
+    def _repair_missing(self, para_texts, translated_paragraphs):
+        """
+        Fill in the paragraphs the answer left out, in place.
+
+        They are sent again as a smaller batch, whatever is still missing after
+        that is sent on its own with the normal prompt.
+        """
+        missing = [
+            i
+            for i, (text, t) in enumerate(zip(para_texts, translated_paragraphs))
+            if text.strip() and not t
+        ]
+        self._last_batch.repaired = len(missing)
+        if not missing:
+            return
+        echo(f"Repairing {len(missing)} paragraphs missing from the batch answer")
+        requests = 0
+        if 1 < len(missing) < len(para_texts):
+            requests += 1
+            retried = self._translate_texts([para_texts[i] for i in missing])
+            for i, t in zip(missing, retried):
+                translated_paragraphs[i] = t
+            missing = [i for i in missing if not translated_paragraphs[i]]
+        for i in missing:
+            requests += 1
+            translated_paragraphs[i] = (self.translate(para_texts[i]) or "").strip()
+        unrepaired = sum(1 for i in missing if not translated_paragraphs[i])
+        self.repair_stats.record(
+            requests, self._last_batch.repaired - unrepaired, unrepaired
+        )
+
+    def _translate_texts(self, para_texts):
+        """Send `para_texts` as one request, return a translation (maybe "") for each."""
+        plist_len = len(para_texts)
 
         # Save original prompt template
-        original_prompt_template = self.prompt_template if hasattr(self, "prompt_template") else self.prompt
-
-        structured_prompt = (
-            f"Translate the following {plist_len} paragraphs to {{language}}. "
-            f"CRUCIAL INSTRUCTION: Format your response using EXACTLY this structure:\n\n"
-            f"TRANSLATION OF PARAGRAPH 1:\n[Your translation of paragraph 1 here]\n\n"
-            f"TRANSLATION OF PARAGRAPH 2:\n[Your translation of paragraph 2 here]\n\n"
-            f"... and so on for all {plist_len} paragraphs.\n\n"
-            f"You MUST provide EXACTLY {plist_len} translated paragraphs. "
-            f"Do not merge, split, or rearrange paragraphs. "
-            f"Translate each paragraph independently but consistently. "
-            f"Preserve all HTML tags (e.g. <b>, <i>, <a>, <span>) exactly as they appear in the original text. "
-            f"Do NOT convert HTML tags to Markdown formatting (e.g. do NOT use **bold** or *italics*). "
-            f"Each original paragraph must correspond to exactly one translated paragraph."
+        original_prompt_template = (
+            self.prompt_template if hasattr(self, "prompt_template") else self.prompt
         )
 
+        if self.batch_json_output:
+            formatted_text = json.dumps(
+                [{"id": i, "text": t} for i, t in enumerate(para_texts, 1)],
+                ensure_ascii=False,
+            )
+            # braces are doubled for the .format the translators apply
+            structured_prompt = (
+                f"Translate the following {plist_len} paragraphs to {{language}}. "
+                f'They are given as a JSON array of objects with an "id" and a "text". '
+                f"CRUCIAL INSTRUCTION: Answer with ONLY a JSON array of exactly {plist_len} objects, "
+                f'{{{{"id": <the same id>, "translation": "<the translation of its text>"}}}}, '
+                f"in the same order and without any other text. "
+                f"Do not merge, split, or rearrange paragraphs. "
+                f"Preserve all HTML tags (e.g. <b>, <i>, <a>, <span>) exactly as they appear in the original text. "
+                f"Do NOT convert HTML tags to Markdown formatting (e.g. do NOT use **bold** or *italics*)."
+            )
+        else:
+            # Using special delimiters and clear numbering
+            formatted_text = "".join(
+                f"PARAGRAPH {i}:\n{t}\n\n" for i, t in enumerate(para_texts, 1)
+            )
+            structured_prompt = (
+                f"Translate the following {plist_len} paragraphs to {{language}}. "
+                f"CRUCIAL INSTRUCTION: Format your response using EXACTLY this structure:\n\n"
+                f"TRANSLATION OF PARAGRAPH 1:\n[Your translation of paragraph 1 here]\n\n"
+                f"TRANSLATION OF PARAGRAPH 2:\n[Your translation of paragraph 2 here]\n\n"
+                f"... and so on for all {plist_len} paragraphs.\n\n"
+                f"You MUST provide EXACTLY {plist_len} translated paragraphs. "
+                f"Do not merge, split, or rearrange paragraphs. "
+                f"Translate each paragraph independently but consistently. "
+                f"Preserve all HTML tags (e.g. <b>, <i>, <a>, <span>) exactly as they appear in the original text. "
+                f"Do NOT convert HTML tags to Markdown formatting (e.g. do NOT use **bold** or *italics*). "
+                f"Each original paragraph must correspond to exactly one translated paragraph."
+            )
+
         # Update prompt template temporarily
         # Check if it is Gemini (using self.prompt) or others (using self.prompt_template)
         if hasattr(self, "prompt_template"):
-             self.prompt_template = structured_prompt + " ```{text}```"
+            self.prompt_template = structured_prompt + " ```{text}```"
         else:
-             self.prompt = structured_prompt + " \n\n{text}"
+            self.prompt = structured_prompt + " \n\n{text}"
 
         try:
             # Call the main translate function of the class
-            translated_text = self.translate(formatted_text)
+            with Telemetry.batch(plist_len):
+                translated_text = self.translate(formatted_text)
         finally:
             # Restore original prompt template
-             if hasattr(self, "prompt_template"):
-                 self.prompt_template = original_prompt_template
-             else:
-                 self.prompt = original_prompt_template
-
-        # Extract translations from structured output
-        translated_paragraphs = []
-        for i in range(1, plist_len + 1):
-            pattern = (
-                r"TRANSLATION OF PARAGRAPH "
-                + str(i)
-                + r":(.*?)(?=TRANSLATION OF.*?\d+:|\Z)"
-            )
-            matches = re.findall(pattern, translated_text, re.DOTALL)
-
-            if matches:
-                translated_paragraph = matches[0].strip()
-                translated_paragraphs.append(translated_paragraph)
+            if hasattr(self, "prompt_template"):
+                self.prompt_template = original_prompt_template
             else:
-                print(f"Warning: Could not find translation for paragraph {i}")
-                loose_pattern = (
-                    r"(?:TRANSLATION|PARAGRAPH|PARA).*?"
-                    + str(i)
-                    + r".*?:(.*?)(?=(?:TRANSLATION|PARAGRAPH|PARA).*?\d+.*?:|\Z)"
-                )
-                loose_matches = re.findall(loose_pattern, translated_text, re.DOTALL)
-                if loose_matches:
-                    translated_paragraphs.append(loose_matches[0].strip())
-                else:
-                    translated_paragraphs.append("")
-
-        # If the number of extracted paragraphs is incorrect, try the alternative extraction method.
-        if len(translated_paragraphs) != plist_len:
-            print(
-                f"Warning: Extracted {len(translated_paragraphs)}/{plist_len} paragraphs. Using fallback extraction."
-            )
+                self.prompt = original_prompt_template
+        if translated_text is None or translated_text == formatted_text:
+            # the request was given up on (see RetryPolicy), leave the
+            # paragraphs to the repair stage
+            translated_text = ""
 
-            all_para_pattern = r"(?:TRANSLATION|PARAGRAPH|PARA).*?(\d+).*?:(.*?)(?=(?:TRANSLATION|PARAGRAPH|PARA).*?\d+.*?:|\Z)"
-            all_matches = re.findall(all_para_pattern, translated_text, re.DOTALL)
-
-            if all_matches:
-                # Create a dictionary to map translation content based on paragraph numbers
-                para_dict = {}
-                for num_str, content in all_matches:
-                    try:
-                        num = int(num_str)
-                        if 1 <= num <= plist_len:
-                            para_dict[num] = content.strip()
-                    except ValueError:
-                        continue
-
-                # Rebuild the translation list in the original order
-                new_translated_paragraphs = []
-                for i in range(1, plist_len + 1):
-                    if i in para_dict:
-                        new_translated_paragraphs.append(para_dict[i])
-                    else:
-                        new_translated_paragraphs.append("")
-
-                if len(new_translated_paragraphs) == plist_len:
-                    translated_paragraphs = new_translated_paragraphs
-
-        if len(translated_paragraphs) < plist_len:
-            translated_paragraphs.extend(
-                [""] * (plist_len - len(translated_paragraphs))
+        translated_paragraphs = None
+        if self.batch_json_output:
+            translated_paragraphs = parse_json_translations(translated_text, plist_len)
+            if translated_paragraphs is None and translated_text:
+                echo(
+                    "Warning: the response is not a JSON array, reading numbered paragraphs instead"
+                )
+        if translated_paragraphs is None:
+            translated_paragraphs = split_numbered_translations(
+                translated_text, plist_len
             )
-        elif len(translated_paragraphs) > plist_len:
-            translated_paragraphs = translated_paragraphs[:plist_len]
 
         return translated_paragraphs
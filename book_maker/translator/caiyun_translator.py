@@ -1,11 +1,11 @@
 import json
-import re
-import time
 
-import requests
 from rich import print
 
+from book_maker.console import echo, echo_translation
+
 from .base_translator import Base
+from .retry_policy import TransientError
 
 
 class Caiyun(Base):
@@ -13,6 +13,10 @@ class Caiyun(Base):
     caiyun translator
     """
 
+    # `source` may be a list, answered by a list in `target`
+    max_batch_segments = 50
+    max_batch_chars = 5000
+
     def __init__(self, key, language, **kwargs) -> None:
         super().__init__(key, language)
         self.api_url = "https://api.interpreter.caiyunai.com/v1/translator"
@@ -30,43 +34,54 @@ class Caiyun(Base):
     def rotate_key(self):
         pass
 
-    def translate(self, text):
-        print(text)
-        # for caiyun translate src issue #279
-        text_list = text.splitlines()
-        num = None
-        if len(text_list) > 1:
-            if text_list[0].isdigit():
-                num = text_list[0]
-        payload = {
-            "source": text,
-            "trans_type": self.translate_type,
-            "request_id": "demo",
-            "detect": True,
-        }
-        response = requests.request(
-            "POST",
+    def _request_translation(self, text, payload):
+        self.wait_for_rate_limit(text)
+        response = self.session.post(
             self.api_url,
             data=json.dumps(payload),
             headers=self.headers,
         )
         try:
-            t_text = response.json()["target"]
+            return response.json()["target"]
         except Exception as e:
-            print(str(e), response.text, "will sleep 60s for the time limit")
-            if "limit" in response.json()["message"]:
+            if "limit" in response.text:
                 print("will sleep 60s for the time limit")
-            time.sleep(60)
-            response = requests.request(
-                "POST",
-                self.api_url,
-                data=json.dumps(payload),
-                headers=self.headers,
-            )
-            t_text = response.json()["target"]
+                self.rate_limiter.penalize("", 60)
+                raise TransientError(response.text) from e
+            raise
 
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
-        # for issue #279
-        if num:
-            t_text = str(num) + "\n" + t_text
+    @staticmethod
+    def _keep_number(text, t_text):
+        # for caiyun translate src issue #279
+        text_list = text.splitlines()
+        if len(text_list) > 1 and text_list[0].isdigit():
+            return text_list[0] + "\n" + t_text
         return t_text
+
+    def translate_segments(self, texts):
+        payload = {
+            "source": texts,
+            "trans_type": self.translate_type,
+            "request_id": "demo",
+            "detect": True,
+        }
+        t_texts = self.with_retry(self._request_translation, "\n".join(texts), payload)
+        if not isinstance(t_texts, list):
+            return None
+        self.print_segments(texts, t_texts)
+        return [self._keep_number(text, t_text) for text, t_text in zip(texts, t_texts)]
+
+    def translate(self, text):
+        echo(text)
+        payload = {
+            "source": text,
+            "trans_type": self.translate_type,
+            "request_id": "demo",
+            "detect": True,
+        }
+        t_text = self.with_retry(self._request_translation, text, payload)
+        if t_text is None:
+            return text
+
+        echo_translation(t_text)
+        return self._keep_number(text, t_text)
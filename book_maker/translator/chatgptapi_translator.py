@@ -8,9 +8,16 @@ from itertools import cycle
 import json
 from threading import Lock
 
-from openai import AzureOpenAI, OpenAI, RateLimitError
+from openai import (
+    AsyncAzureOpenAI,
+    AsyncOpenAI,
+    AzureOpenAI,
+    OpenAI,
+)
 from rich import print
 
+from book_maker.console import echo, echo_translation
+
 from .base_translator import Base
 from ..config import config
 
@@ -66,9 +73,10 @@ O3MINI_MODEL_LIST = [
 ]
 
 
+from .async_strategy import AsyncStrategy
 from .batch_strategy import BatchStrategy
 
-class ChatGPTAPI(BatchStrategy, Base):
+class ChatGPTAPI(AsyncStrategy, BatchStrategy, Base):
     DEFAULT_PROMPT = """Please help me to translate the following text to {language}. 
 If there are HTML tags in the text (such as <a>, <b>, <span>, etc.), please keep the tags and their attributes EXACTLY as they are in the original text, and only translate the visible text content. 
 Return only the translated content and do not include the original text or any explanations.
@@ -128,6 +136,10 @@ Text:
         with self._api_lock:
             self.openai_client.api_key = next(self.keys)
 
+    def renew_client(self):
+        # keeps the connection pool, but api_key is now ours to rotate
+        self.openai_client = self.openai_client.copy()
+
     def rotate_model(self):
         with self._api_lock:
             if self.model_list:
@@ -173,8 +185,17 @@ Text:
     def get_translation(self, text):
         self.rotate_key()
         self.rotate_model()  # rotate all the model to avoid the limit
-
-        completion = self.create_chat_completion(text)
+        key = self.openai_client.api_key
+        self.wait_for_rate_limit(text, key)
+
+        started = time.monotonic()
+        try:
+            completion = self.create_chat_completion(text)
+        except Exception:
+            self.keys.record(key, error=True)
+            raise
+        self.keys.record(key, time.monotonic() - started)
+        self.telemetry.note(key=key, response=completion, model=self.model)
 
         # TODO work well or exception finish by length limit
         # Check if content is not None before encoding
@@ -188,6 +209,33 @@ Text:
 
         return t_text
 
+    def create_async_client(self, key):
+        if self.deployment_id:
+            return AsyncAzureOpenAI(
+                api_key=key,
+                azure_endpoint=self.api_base,
+                api_version="2023-07-01-preview",
+                azure_deployment=self.deployment_id,
+            )
+        return AsyncOpenAI(api_key=key, base_url=self.api_base)
+
+    async def async_create_chat_completion(self, client, text):
+        # no await before the request is built, so the rotated model is ours
+        self.rotate_model()
+        messages = self.create_messages(text, self.create_context_messages())
+        return await client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+        )
+
+    async def async_get_translation(self, client, text):
+        completion = await self.async_create_chat_completion(client, text)
+        self.telemetry.note(response=completion, model=self.model)
+        if completion.choices[0].message.content is not None:
+            return completion.choices[0].message.content.encode("utf8").decode() or ""
+        return ""
+
     def save_context(self, text, t_text):
         if self.context_paragraph_limit > 0:
             self.context_list.append(text)
@@ -198,41 +246,23 @@ Text:
                 self.context_translated_list.pop(0)
 
     def translate(self, text, needprint=True):
-        start_time = time.time()
         # todo: Determine whether to print according to the cli option
         if needprint:
-            print(re.sub("\n{3,}", "\n\n", text))
-
-        attempt_count = 0
-        max_attempts = 3
-        t_text = ""
-
-        while attempt_count < max_attempts:
-            try:
-                t_text = self.get_translation(text)
-                break
-            except RateLimitError as e:
-                # todo: better sleep time? why sleep alawys about key_len
-                # 1. openai server error or own network interruption, sleep for a fixed time
-                # 2. an apikey has no money or reach limit, don`t sleep, just replace it with another apikey
-                # 3. all apikey reach limit, then use current sleep
-                sleep_time = int(60 / self.key_len)
-                print(e, f"will sleep {sleep_time} seconds")
-                time.sleep(sleep_time)
-                attempt_count += 1
-                if attempt_count == max_attempts:
-                    print(f"Get {attempt_count} consecutive exceptions")
-                    raise
-            except Exception as e:
-                print(str(e))
-                return
+            echo(re.sub("\n{3,}", "\n\n", text))
+
+        # a rate limited or rejected key is swapped for the next one right
+        # away, the next attempt waits only when that one is held back too
+        t_text = self.with_retry(
+            self.get_translation,
+            text,
+            on_error=lambda e: self.key_error_verdict(e, self.openai_client.api_key),
+        )
+        if t_text is None:
+            return text
 
         # todo: Determine whether to print according to the cli option
         if needprint:
-            print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
-
-        time.time() - start_time
-        # print(f"translation time: {elapsed_time:.1f}s")
+            echo_translation(t_text)
 
         return t_text
 
@@ -1,10 +1,8 @@
-import re
-from rich import print
 from anthropic import Anthropic
 
-from .base_translator import Base
-
+from book_maker.console import echo, echo_translation
 
+from .base_translator import Base
 from .batch_strategy import BatchStrategy
 
 class Claude(BatchStrategy, Base):
@@ -39,6 +37,9 @@ class Claude(BatchStrategy, Base):
     def rotate_key(self):
         pass
 
+    def renew_client(self):
+        self.client = self.client.copy()
+
     def set_claude_model(self, model_name):
         self.model = model_name
 
@@ -89,13 +90,8 @@ class Claude(BatchStrategy, Base):
             self.context_list.pop(0)
             self.context_translated_list.pop(0)
 
-    def translate(self, text):
-        print(text)
-        self.rotate_key()
-
-        # Create messages with context
-        messages = self.create_messages(text, self.create_context_messages())
-
+    def _request_translation(self, text, messages):
+        self.wait_for_rate_limit(text, self.client.api_key)
         r = self.client.messages.create(
             max_tokens=4096,
             messages=messages,
@@ -103,10 +99,21 @@ class Claude(BatchStrategy, Base):
             temperature=self.temperature,
             model=self.model,
         )
-        t_text = r.content[0].text
+        self.telemetry.note(key=self.client.api_key, response=r, model=self.model)
+        return r.content[0].text
+
+    def translate(self, text):
+        echo(text)
+        self.rotate_key()
+
+        # Create messages with context
+        messages = self.create_messages(text, self.create_context_messages())
+        t_text = self.with_retry(self._request_translation, text, messages)
+        if t_text is None:
+            return text
 
         if self.context_flag:
             self.save_context(text, t_text)
 
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
+        echo_translation(t_text)
         return t_text
@@ -1,9 +1,8 @@
-from .base_translator import Base
-import re
 import json
-import requests
-import time
-from rich import print
+
+from book_maker.console import echo, echo_translation
+
+from .base_translator import Base
 
 
 class CustomAPI(Base):
@@ -15,17 +14,24 @@ class CustomAPI(Base):
         super().__init__(custom_api, language)
         self.language = language
         self.custom_api = custom_api
+        # one request every 5 seconds unless --rpm says otherwise
+        self.set_rate_limits(rpm=12)
+        self.session.timeout = 10
 
     def rotate_key(self):
         pass
 
+    def _request_translation(self, text, post_data):
+        self.wait_for_rate_limit(text)
+        r = self.session.post(url=self.custom_api, data=post_data)
+        r.raise_for_status()
+        return json.loads(r.text)["data"]
+
     def translate(self, text):
-        print(text)
-        custom_api = self.custom_api
+        echo(text)
         data = {"text": text, "source_lang": "auto", "target_lang": self.language}
-        post_data = json.dumps(data)
-        r = requests.post(url=custom_api, data=post_data, timeout=10).text
-        t_text = json.loads(r)["data"]
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
-        time.sleep(5)
+        t_text = self.with_retry(self._request_translation, text, json.dumps(data))
+        if t_text is None:
+            return text
+        echo_translation(t_text)
         return t_text
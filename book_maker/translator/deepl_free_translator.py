@@ -1,11 +1,10 @@
 import time
 import random
-import re
 
 from book_maker.utils import LANGUAGES, TO_LANGUAGE_CODE
+from book_maker.console import echo, echo_translation
 
 from .base_translator import Base
-from rich import print
 from PyDeepLX import PyDeepLX
 
 
@@ -14,6 +13,9 @@ class DeepLFree(Base):
     DeepL free translator
     """
 
+    max_batch_segments = 30
+    max_batch_chars = 3000
+
     def __init__(self, key, language, **kwargs) -> None:
         super().__init__(key, language)
         l = language if language in LANGUAGES else TO_LANGUAGE_CODE.get(language)
@@ -57,10 +59,32 @@ class DeepLFree(Base):
     def rotate_key(self):
         pass
 
+    def _request_translation(self, text):
+        self.wait_for_rate_limit(text)
+        return str(PyDeepLX.translate(text, "EN", self.language))
+
+    def can_share_request(self, text):
+        # paragraphs share a request one per line
+        return "\n" not in text
+
+    def translate_segments(self, texts):
+        t_text = self.with_retry(self._request_translation, "\n".join(texts))
+        if t_text is None:
+            return None
+        # spider rule
+        time.sleep(random.choice(self.time_random))
+        t_texts = t_text.strip("\n").split("\n")
+        if len(t_texts) != len(texts):
+            return None
+        self.print_segments(texts, t_texts)
+        return t_texts
+
     def translate(self, text):
-        print(text)
-        t_text = str(PyDeepLX.translate(text, "EN", self.language))
+        echo(text)
+        t_text = self.with_retry(self._request_translation, text)
+        if t_text is None:
+            return text
         # spider rule
         time.sleep(random.choice(self.time_random))
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
+        echo_translation(t_text)
         return t_text
@@ -1,13 +1,9 @@
 import json
-import time
-
-import requests
-import re
 
 from book_maker.utils import LANGUAGES, TO_LANGUAGE_CODE
+from book_maker.console import echo, echo_translation
 
 from .base_translator import Base
-from rich import print
 
 
 class DeepL(Base):
@@ -15,6 +11,9 @@ class DeepL(Base):
     DeepL translator
     """
 
+    max_batch_segments = 50
+    max_batch_chars = 5000
+
     def __init__(self, key, language, **kwargs) -> None:
         super().__init__(key, language)
         self.api_url = "https://dpl-translator.p.rapidapi.com/translate"
@@ -63,26 +62,39 @@ class DeepL(Base):
     def rotate_key(self):
         self.headers["X-RapidAPI-Key"] = f"{next(self.keys)}"
 
+    def _request_translation(self, text, payload):
+        self.wait_for_rate_limit(text, self.headers["X-RapidAPI-Key"])
+        response = self.session.post(
+            self.api_url,
+            data=json.dumps(payload),
+            headers=self.headers,
+        )
+        response.raise_for_status()
+        return response.json().get("text", "")
+
+    def can_share_request(self, text):
+        # paragraphs share a request one per line
+        return "\n" not in text
+
+    def translate_segments(self, texts):
+        self.rotate_key()
+        text = "\n".join(texts)
+        payload = {"text": text, "source": "EN", "target": self.language}
+        t_text = self.with_retry(self._request_translation, text, payload)
+        if t_text is None:
+            return None
+        t_texts = t_text.strip("\n").split("\n")
+        if len(t_texts) != len(texts):
+            return None
+        self.print_segments(texts, t_texts)
+        return t_texts
+
     def translate(self, text):
         self.rotate_key()
-        print(text)
+        echo(text)
         payload = {"text": text, "source": "EN", "target": self.language}
-        try:
-            response = requests.request(
-                "POST",
-                self.api_url,
-                data=json.dumps(payload),
-                headers=self.headers,
-            )
-        except Exception as e:
-            print(e)
-            time.sleep(30)
-            response = requests.request(
-                "POST",
-                self.api_url,
-                data=json.dumps(payload),
-                headers=self.headers,
-            )
-        t_text = response.json().get("text", "")
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
+        t_text = self.with_retry(self._request_translation, text, payload)
+        if t_text is None:
+            return text
+        echo_translation(t_text)
         return t_text
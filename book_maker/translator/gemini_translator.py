@@ -1,5 +1,4 @@
 import re
-import time
 from os import environ
 from itertools import cycle
 
@@ -10,7 +9,10 @@ from google.generativeai.types.generation_types import (
 )
 from rich import print
 
+from book_maker.console import echo, echo_translation
+
 from .base_translator import Base
+from .retry_policy import GIVE_UP
 
 generation_config = {
     "temperature": 1.0,
@@ -85,8 +87,9 @@ TEXT TO TRANSLATE:
             or environ.get(PROMPT_ENV_MAP["system"])
             or None  # Allow None, but not empty string
         )
-        self.interval = 3
-        genai.configure(api_key=next(self.keys))
+        self.api_key = next(self.keys)
+        genai.configure(api_key=self.api_key)
+        self.set_interval(3)
         generation_config["temperature"] = temperature
 
     def create_convo(self):
@@ -99,23 +102,38 @@ TEXT TO TRANSLATE:
         self.convo = model.start_chat()
         # print(model)  # Uncomment to debug and inspect the model details.
 
+    def renew_client(self):
+        # the chat session holds the conversation history
+        if hasattr(self, "model"):
+            self.create_convo()
+
     def rotate_model(self):
         self.model = next(self.model_list)
         self.create_convo()
         print(f"Using model {self.model}")
 
     def rotate_key(self):
-        genai.configure(api_key=next(self.keys))
+        self.api_key = next(self.keys)
+        genai.configure(api_key=self.api_key)
         self.create_convo()
 
-    def translate(self, text):
-        delay = 1
-        exponential_base = 2
-        attempt_count = 0
-        max_attempts = 7
+    def _send_message(self, text):
+        self.wait_for_rate_limit(text, self.api_key)
+        response = self.convo.send_message(
+            self.prompt.format(text=text, language=self.language)
+        )
+        self.telemetry.note(key=self.api_key, response=response, model=self.model)
+        t_text = self.convo.last.text.strip()
+        # 检查是否包含特定标签,如果有则只返回标签内的内容
+        tag_pattern = r"<step3_refined_translation>(.*?)</step3_refined_translation>"
+        tag_match = re.search(tag_pattern, t_text, re.DOTALL)
+        if tag_match:
+            echo_translation(t_text)
+            t_text = tag_match.group(1).strip()
+        return t_text
 
-        t_text = ""
-        print(text)
+    def translate(self, text):
+        echo(text)
         # same for caiyun translate src issue #279 gemini for #374
         text_list = text.splitlines()
         num = None
@@ -123,52 +141,22 @@ TEXT TO TRANSLATE:
             if text_list[0].isdigit():
                 num = text_list[0]
 
-        while attempt_count < max_attempts:
-            try:
-                self.convo.send_message(
-                    self.prompt.format(text=text, language=self.language)
-                )
-                t_text = self.convo.last.text.strip()
-                # 检查是否包含特定标签,如果有则只返回标签内的内容
-                tag_pattern = (
-                    r"<step3_refined_translation>(.*?)</step3_refined_translation>"
-                )
-                tag_match = re.search(tag_pattern, t_text, re.DOTALL)
-                if tag_match:
-                    print(
-                        "[bold green]"
-                        + re.sub("\n{3,}", "\n\n", t_text)
-                        + "[/bold green]"
-                    )
-                    t_text = tag_match.group(1).strip()
-                    # print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
-                break
-            except StopCandidateException as e:
-                print(
-                    f"Translation failed due to StopCandidateException: {e} Attempting to switch model..."
-                )
-                self.rotate_model()
-            except BlockedPromptException as e:
-                print(
-                    f"Translation failed due to BlockedPromptException: {e} Attempting to switch model..."
-                )
-                self.rotate_model()
-            except Exception as e:
-                print(
-                    f"Translation failed due to {type(e).__name__}: {e} Will sleep {delay} seconds"
-                )
-                time.sleep(delay)
-                delay *= exponential_base
+        failures = []
 
-                self.rotate_key()
-                if attempt_count >= 1:
-                    self.rotate_model()
-
-            attempt_count += 1
+        def switch_after_error(error):
+            failures.append(error)
+            if isinstance(error, (StopCandidateException, BlockedPromptException)):
+                # the paragraph itself is blocked, sending it again cannot help
+                return GIVE_UP
+            # anything else: another key, from the second failure on another model
+            self.rotate_key()
+            if len(failures) > 1:
+                self.rotate_model()
+            return None
 
-        if attempt_count == max_attempts:
-            print(f"Translation failed after {max_attempts} attempts.")
-            return
+        t_text = self.with_retry(self._send_message, text, on_error=switch_after_error)
+        if t_text is None:
+            return text
 
         if self.context_flag:
             if len(self.convo.history) > 10:
@@ -176,15 +164,16 @@ TEXT TO TRANSLATE:
         else:
             self.convo.history = []
 
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
-        # for rate limit(RPM)
-        time.sleep(self.interval)
+        echo_translation(t_text)
         if num:
             t_text = str(num) + "\n" + t_text
         return t_text
 
     def set_interval(self, interval):
+        # for rate limit(RPM), shared by all workers instead of a sleep in each
         self.interval = interval
+        if interval > 0:
+            self.set_rate_limits(rpm=60 / interval)
 
     def set_geminipro_models(self):
         self.set_models(GEMINIPRO_MODEL_LIST)
@@ -1,8 +1,8 @@
-import re
 import requests
-from rich import print
 
 from book_maker.utils import TO_LANGUAGE_CODE
+from book_maker.console import echo, echo_translation
+
 from .base_translator import Base
 
 
@@ -11,6 +11,9 @@ class Google(Base):
     google translate
     """
 
+    max_batch_segments = 50
+    max_batch_chars = 5000
+
     def __init__(self, key, language, **kwargs) -> None:
         super().__init__(key, language)
 
@@ -21,19 +24,21 @@ class Google(Base):
             language_code = language
 
         self.api_url = f"https://translate.google.com/translate_a/single?client=it&dt=qca&dt=t&dt=rmt&dt=bd&dt=rms&dt=sos&dt=md&dt=gt&dt=ld&dt=ss&dt=ex&otf=2&dj=1&hl=en&ie=UTF-8&oe=UTF-8&sl=auto&tl={language_code}"
+        # takes one `q` for each paragraph, see `translate_segments`
+        self.batch_api_url = f"https://translate.googleapis.com/translate_a/t?client=gtx&dt=t&sl=auto&tl={language_code}"
         self.headers = {
             "Content-Type": "application/x-www-form-urlencoded",
             "User-Agent": "GoogleTranslate/6.29.59279 (iPhone; iOS 15.4; en; iPhone14,2)",
         }
         # TODO support more models here
-        self.session = requests.session()
+        self.session.timeout = 3
         self.language = language
 
     def rotate_key(self):
         pass
 
     def translate(self, text):
-        print(text)
+        echo(text)
         """r = self.session.post(
             self.api_url,
             headers=self.headers,
@@ -45,22 +50,43 @@ class Google(Base):
             [sentence.get("trans", "") for sentence in r.json()["sentences"]],
         )"""
         t_text = self._retry_translate(text)
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
+        if t_text is None:
+            return text
+        echo_translation(t_text)
         return t_text
 
-    def _retry_translate(self, text, timeout=3):
-        time = 0
-        while time <= timeout:
-            time += 1
-            r = self.session.post(
-                self.api_url,
-                headers=self.headers,
-                data=f"q={requests.utils.quote(text)}",
-                timeout=3,
-            )
-            if r.ok:
-                t_text = "".join(
-                    [sentence.get("trans", "") for sentence in r.json()["sentences"]],
-                )
-                return t_text
-        return text
+    def translate_segments(self, texts):
+        answer = self.with_retry(self._request_segments, texts)
+        if answer is None:
+            return None
+        # with sl=auto each entry is [translation, detected language]
+        t_texts = [item[0] if isinstance(item, list) else item for item in answer]
+        if not all(isinstance(t_text, str) for t_text in t_texts):
+            return None
+        self.print_segments(texts, t_texts)
+        return t_texts
+
+    def _request_segments(self, texts):
+        self.wait_for_rate_limit("\n".join(texts))
+        r = self.session.post(
+            self.batch_api_url,
+            headers=self.headers,
+            data={"q": texts},
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def _retry_translate(self, text):
+        return self.with_retry(self._request_translation, text)
+
+    def _request_translation(self, text):
+        self.wait_for_rate_limit(text)
+        r = self.session.post(
+            self.api_url,
+            headers=self.headers,
+            data=f"q={requests.utils.quote(text)}",
+        )
+        r.raise_for_status()
+        return "".join(
+            [sentence.get("trans", "") for sentence in r.json()["sentences"]],
+        )
@@ -1,4 +1,4 @@
-from groq import Groq
+from groq import AsyncGroq, Groq
 from .chatgptapi_translator import ChatGPTAPI
 from os import linesep
 from itertools import cycle
@@ -13,6 +13,18 @@ GROQ_MODEL_LIST = [
 
 
 class GroqClient(ChatGPTAPI):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # one client, and so one connection pool, per key for the whole run,
+        # shared with the worker clones
+        self.groq_clients = {}
+
+    def groq_client_for(self, key):
+        client = self.groq_clients.get(key)
+        if client is None:
+            client = self.groq_clients.setdefault(key, Groq(api_key=key))
+        return client
+
     def rotate_model(self):
         if not self.model_list:
             model_list = list(set(GROQ_MODEL_LIST))
@@ -20,17 +32,20 @@ class GroqClient(ChatGPTAPI):
             self.model_list = cycle(model_list)
         self.model = next(self.model_list)
 
-    def create_chat_completion(self, text):
-        self.groq_client = Groq(api_key=next(self.keys))
-
+    def create_groq_messages(self, text):
         content = f"{self.prompt_template.format(text=text, language=self.language, crlf=linesep)}"
         sys_content = self.system_content or self.prompt_sys_msg.format(crlf="\n")
 
-        messages = [
+        return [
             {"role": "system", "content": sys_content},
             {"role": "user", "content": content},
         ]
 
+    def create_chat_completion(self, text):
+        self.groq_client = self.groq_client_for(self.openai_client.api_key)
+
+        messages = self.create_groq_messages(text)
+
         if self.deployment_id:
             return self.groq_client.chat.completions.create(
                 engine=self.deployment_id,
@@ -43,3 +58,14 @@ class GroqClient(ChatGPTAPI):
             messages=messages,
             temperature=self.temperature,
         )
+
+    def create_async_client(self, key):
+        return AsyncGroq(api_key=key)
+
+    async def async_create_chat_completion(self, client, text):
+        self.rotate_model()
+        return await client.chat.completions.create(
+            model=self.model,
+            messages=self.create_groq_messages(text),
+            temperature=self.temperature,
+        )
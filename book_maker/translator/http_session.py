@@ -0,0 +1,38 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+# seconds to connect and to wait for the answer
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class PooledSession(requests.Session):
+    """
+    A keep-alive `requests.Session` for the translators calling a REST api.
+
+    One session is shared by a translator and its worker clones, so requests
+    reuse warm connections instead of a new connection and TLS handshake per
+    paragraph. `resize` keeps `pool_size` connections per host, one for each
+    worker, more would be opened and thrown away again. Requests sent without
+    a `timeout` get `self.timeout`.
+    """
+
+    def __init__(self, pool_size=1, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self.pool_size = 0
+        self.resize(pool_size)
+
+    def resize(self, pool_size):
+        pool_size = max(1, pool_size)
+        if pool_size == self.pool_size:
+            return
+        self.pool_size = pool_size
+        for prefix in ("https://", "http://"):
+            if prefix in self.adapters:
+                self.adapters[prefix].close()
+            self.mount(prefix, HTTPAdapter(pool_maxsize=pool_size))
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
@@ -0,0 +1,133 @@
+import time
+from threading import Lock
+
+from rich import print
+
+
+class NoUsableKeyError(RuntimeError):
+    """Every api key was rejected by the provider."""
+
+
+def is_key_rejected(error):
+    """True for auth and quota errors, the key will not work again this run."""
+    status = getattr(error, "status_code", None)
+    if status in (401, 402, 403):
+        return True
+    return status == 429 and getattr(error, "code", None) == "insufficient_quota"
+
+
+class KeyPool:
+    """
+    The api keys of a translator, in place of the `itertools.cycle` it had.
+
+    `next(pool)` hands out the keys round robin like the cycle did, but skips
+    keys benched after a rate limit (until their retry-after is over) and keys
+    retired after an auth or quota error. When every key left is benched, the
+    one that is free soonest is handed out and the rate limiter makes its
+    request wait. Requests, errors, 429s and latency are kept per key for
+    `summary`. Thread safe, one pool is shared by a translator and its worker
+    clones.
+    """
+
+    smoothing = 0.2
+
+    def __init__(self, keys):
+        self.keys = [key.strip() for key in keys] or [""]
+        self.stats = {
+            key: {"requests": 0, "errors": 0, "rate_limited": 0, "latency": None}
+            for key in self.keys
+        }
+        self.retired = {}
+        self._benched_until = {}
+        self._next = 0
+        self._lock = Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            if set(self.keys) <= set(self.retired):
+                raise NoUsableKeyError(
+                    f"all {len(self.retired)} api keys were rejected: "
+                    + "; ".join(sorted(set(self.retired.values())))
+                )
+            now = time.monotonic()
+            soonest = None
+            for _ in range(len(self.keys)):
+                key = self.keys[self._next % len(self.keys)]
+                self._next += 1
+                if key in self.retired:
+                    continue
+                free_at = self._benched_until.get(key, 0.0)
+                if free_at <= now:
+                    return key
+                if soonest is None or free_at < self._benched_until[soonest]:
+                    soonest = key
+            return soonest
+
+    def usable(self):
+        """The keys not retired, each once."""
+        with self._lock:
+            return [key for key in dict.fromkeys(self.keys) if key not in self.retired]
+
+    def __len__(self):
+        return len(self.keys) - sum(1 for key in self.keys if key in self.retired)
+
+    def bench(self, key, seconds):
+        """Hand out `key` again only after `seconds`, it was rate limited."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._benched_until[key] = max(self._benched_until.get(key, 0.0), until)
+            self._stats(key)["rate_limited"] += 1
+
+    def retire(self, key, reason):
+        """Never hand out `key` again, the provider rejected it."""
+        with self._lock:
+            if key in self.retired:
+                return
+            self.retired[key] = reason
+            self._stats(key)["errors"] += 1
+            left = len(set(self.keys) - set(self.retired))
+        print(f"[red]api key {mask_key(key)} rejected ({reason}), {left} left[/red]")
+
+    def record(self, key, seconds=None, error=False):
+        """Count one request with `key`, how long it took or that it failed."""
+        with self._lock:
+            stats = self._stats(key)
+            stats["requests"] += 1
+            if error:
+                stats["errors"] += 1
+            if seconds is not None:
+                if stats["latency"] is None:
+                    stats["latency"] = seconds
+                else:
+                    stats["latency"] += self.smoothing * (seconds - stats["latency"])
+
+    def has_problems(self):
+        return bool(self.retired) or any(
+            stats["rate_limited"] for stats in self.stats.values()
+        )
+
+    def summary(self):
+        lines = []
+        for key in dict.fromkeys(self.keys):
+            stats = self.stats[key]
+            latency = "n/a" if stats["latency"] is None else f"{stats['latency']:.1f}s"
+            state = f"retired: {self.retired[key]}" if key in self.retired else "ok"
+            lines.append(
+                f"{mask_key(key)}: {stats['requests']} requests, "
+                f"{stats['errors']} errors, {stats['rate_limited']} rate limited, "
+                f"latency {latency}, {state}"
+            )
+        return "\n".join(lines)
+
+    def _stats(self, key):
+        # keys the pool did not hand out (e.g. set on a client directly)
+        return self.stats.setdefault(
+            key, {"requests": 0, "errors": 0, "rate_limited": 0, "latency": None}
+        )
+
+
+def mask_key(key):
+    return f"...{key[-4:]}" if len(key) > 8 else "***"
@@ -1,12 +1,15 @@
 import re
 import time
 from rich import print
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from .async_strategy import AsyncStrategy
+from book_maker.console import echo, echo_translation
 
 from .base_translator import Base
 
 
-class QwenTranslator(Base):
+class QwenTranslator(AsyncStrategy, Base):
     """
     Qwen-MT translator using Alibaba Cloud's DashScope API
     Specialized translation model supporting 92 languages with advanced features
@@ -77,6 +80,7 @@ class QwenTranslator(Base):
         **kwargs,
     ) -> None:
         super().__init__(key, language)
+        self.key_len = len(key.split(","))
 
         # API configuration
         self.api_base = api_base or "https://dashscope.aliyuncs.com/compatible-mode/v1"
@@ -113,6 +117,9 @@ class QwenTranslator(Base):
         except StopIteration:
             pass
 
+    def renew_client(self):
+        self.client = self.client.copy()
+
     def _map_language(self, language):
         """Map language name to Qwen language format"""
         language_lower = language.lower().strip()
@@ -151,6 +158,30 @@ class QwenTranslator(Base):
 
         return options
 
+    def _create_completion_kwargs(self, text):
+        """Build the chat completion request for one paragraph"""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": text}],
+            "extra_body": {"translation_options": self._create_translation_options()},
+        }
+
+    @staticmethod
+    def _extract_translation(completion):
+        if completion.choices[0].message.content:
+            return completion.choices[0].message.content.strip()
+        return ""
+
+    def create_async_client(self, key):
+        return AsyncOpenAI(api_key=key, base_url=self.api_base, timeout=60)
+
+    async def async_get_translation(self, client, text):
+        completion = await client.chat.completions.create(
+            **self._create_completion_kwargs(text)
+        )
+        self.telemetry.note(response=completion, model=self.model)
+        return self._extract_translation(completion)
+
     def save_context(self, text, t_text):
         """Save the current translation pair to context for translation memory"""
         if not self.context_flag:
@@ -164,65 +195,41 @@ class QwenTranslator(Base):
             self.context_list.pop(0)
             self.context_translated_list.pop(0)
 
+    def _request_translation(self, text):
+        self.rotate_key()
+        self.wait_for_rate_limit(text, self.client.api_key)
+        completion = self.client.chat.completions.create(
+            **self._create_completion_kwargs(text)
+        )
+        self.telemetry.note(
+            key=self.client.api_key, response=completion, model=self.model
+        )
+        return self._extract_translation(completion)
+
     def translate(self, text, needprint=True):
         """Main translation method"""
         start_time = time.time()
 
         if needprint:
-            print(re.sub(r"\n{3,}", "\n\n", text))
-
-        attempt_count = 0
-        max_attempts = 3
-        t_text = ""
-
-        while attempt_count < max_attempts:
-            try:
-                self.rotate_key()
-
-                # Prepare messages
-                messages = [{"role": "user", "content": text}]
-
-                # Create translation options
-                translation_options = self._create_translation_options()
-
-                # Make API request
-                completion = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    extra_body={"translation_options": translation_options},
-                )
-
-                # Extract translated text
-                if completion.choices[0].message.content:
-                    t_text = completion.choices[0].message.content.strip()
-                else:
-                    t_text = ""
-
-                # Save to context for translation memory
-                if self.context_flag and t_text:
-                    self.save_context(text, t_text)
-
-                break
-
-            except Exception as e:
-                attempt_count += 1
-                print(
-                    f"[red]Translation attempt {attempt_count} failed: {str(e)}[/red]"
-                )
-
-                if attempt_count >= max_attempts:
-                    print(
-                        f"[red]Translation failed after {max_attempts} attempts[/red]"
-                    )
-                    t_text = text  # Fallback to original text
-                else:
-                    time.sleep(1)  # Wait before retry
+            echo(re.sub(r"\n{3,}", "\n\n", text))
+
+        t_text = self.with_retry(
+            self._request_translation,
+            text,
+            on_error=lambda e: self.key_error_verdict(e, self.client.api_key),
+        )
+        if t_text is None:
+            return text
+
+        # Save to context for translation memory
+        if self.context_flag and t_text:
+            self.save_context(text, t_text)
 
         if needprint:
-            print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
+            echo_translation(t_text)
 
         end_time = time.time()
-        print(f"[dim]Translation time: {end_time - start_time:.2f}s[/dim]")
+        echo(f"[dim]Translation time: {end_time - start_time:.2f}s[/dim]")
 
         return t_text
 
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from threading import Lock
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute` units a minute and holds at most `burst` of them.
+
+    `reserve` takes what a request costs right away, going into debt when the
+    bucket does not hold enough, and returns how long the caller has to wait
+    for the debt to be refilled before it may send.
+    """
+
+    def __init__(self, per_minute, burst=None, now=None):
+        self.rate = per_minute / 60.0
+        # one second worth by default, so requests are spread out evenly
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.level = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def reserve(self, amount, now):
+        elapsed = max(0.0, now - self.updated)
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+        self.updated = max(self.updated, now)
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets for each api key.
+
+    Every request waits in `wait` (or `wait_async`) until the key it is sent
+    with has budget left, token costs are estimated before sending. A key the
+    provider rate limited is held back for the time given to `penalize`, the
+    other keys go on. One limiter is shared by a translator and its worker
+    clones, so threads and async tasks draw from the same budgets. Without
+    limits `wait` returns at once unless the key was penalized.
+    """
+
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._buckets = {}
+        self._held_until = {}
+        self._lock = Lock()
+
+    def configure(self, rpm=None, tpm=None):
+        with self._lock:
+            if rpm is not None:
+                self.rpm = rpm
+            if tpm is not None:
+                self.tpm = tpm
+            self._buckets = {}
+
+    def reserve(self, key, tokens=0):
+        """Take the budget of one request with `key` and return how long to wait before sending it."""
+        now = time.monotonic()
+        with self._lock:
+            delay = max(0.0, self._held_until.get(key, now) - now)
+            if self.rpm > 0 or self.tpm > 0:
+                rpm_bucket, tpm_bucket = self._buckets.get(key) or self._new_buckets(
+                    key, now
+                )
+                if rpm_bucket is not None:
+                    delay = max(delay, rpm_bucket.reserve(1, now))
+                if tpm_bucket is not None and tokens:
+                    delay = max(delay, tpm_bucket.reserve(tokens, now))
+        return delay
+
+    def _new_buckets(self, key, now):
+        buckets = (
+            # requests are spaced 60 / rpm seconds apart, tokens may come in bursts
+            TokenBucket(self.rpm, burst=1, now=now) if self.rpm > 0 else None,
+            TokenBucket(self.tpm, now=now) if self.tpm > 0 else None,
+        )
+        self._buckets[key] = buckets
+        return buckets
+
+    def wait(self, key, tokens=0):
+        delay = self.reserve(key, tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, key, tokens=0):
+        delay = self.reserve(key, tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, key, seconds):
+        """Send nothing more with `key` for `seconds`, after the provider rate limited it."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._held_until[key] = max(self._held_until.get(key, 0.0), until)
+
+
+def retry_after(error, default):
+    """Seconds an api error asks to wait (its Retry-After header), else `default`."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", default)))
+    except (TypeError, ValueError):
+        return default
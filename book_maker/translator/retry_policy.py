@@ -0,0 +1,298 @@
+import asyncio
+import http.client
+import json
+import random
+import time
+from threading import Condition, Lock
+
+import requests
+from rich import print
+
+from .key_pool import NoUsableKeyError
+from .rate_limiter import retry_after
+
+# what to do about a failed request, see `classify_error`
+RETRY = "retry"  # again after a back off
+RETRY_NOW = "retry_now"  # again right away, it still counts as an attempt
+NEXT_KEY = "next_key"  # again right away with another key, not an attempt
+OUTAGE = "outage"  # the provider is down or unreachable, retry and tell the breaker
+GIVE_UP = "give_up"  # this request will never work, leave the paragraph
+FATAL = "fatal"  # stop the run
+
+CONNECTION_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+# the openai, anthropic and groq sdks name their transport errors alike
+CONNECTION_ERROR_NAMES = {"APIConnectionError", "APITimeoutError"}
+
+
+class RetriesExhausted(RuntimeError):
+    """A request kept failing after every attempt of the retry policy."""
+
+
+class TransientError(Exception):
+    """An answer worth asking for again, like a rate limit told in its body."""
+
+
+# failures without an http status that another try can fix
+TRANSIENT_ERRORS = (
+    TransientError,
+    requests.exceptions.RequestException,
+    http.client.HTTPException,
+    json.JSONDecodeError,
+)
+# the same for libraries only some translators import: httpx (under
+# PyDeepLX) and the rate limit of PyDeepLX
+TRANSIENT_ERROR_NAMES = {"TransportError", "TooManyRequestsException"}
+
+
+def http_status(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        # google.api_core errors (gemini) carry it as `code`
+        status = getattr(error, "code", None)
+    if isinstance(status, int) and 100 <= status < 600:
+        return status
+    return None
+
+
+def classify_error(error):
+    if isinstance(error, (NoUsableKeyError, RetriesExhausted)):
+        return FATAL
+    if isinstance(error, CONNECTION_ERRORS) or (
+        type(error).__name__ in CONNECTION_ERROR_NAMES
+    ):
+        return OUTAGE
+    status = http_status(error)
+    if status is None:
+        if isinstance(error, TRANSIENT_ERRORS) or any(
+            cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__
+        ):
+            return RETRY
+        # a bug (AttributeError, TypeError...) or an answer we cannot read,
+        # sending it again would only fail the same way
+        return FATAL
+    if status >= 500:
+        return OUTAGE
+    if status in (408, 409, 429):
+        return RETRY
+    if 400 <= status < 500:
+        return GIVE_UP
+    return RETRY
+
+
+class CircuitBreaker:
+    """
+    Pauses every worker while the provider is down.
+
+    `threshold` outage errors in a row (connection errors, timeouts, 5xx, from
+    any worker) open the breaker. While it is open, `wait` blocks every caller
+    for `cooldown` seconds. After that a single request is let through as a
+    probe. If the probe succeeds the breaker closes, if it fails the breaker
+    opens again with twice the cooldown, up to `max_cooldown`.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=300.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = 0
+        self._open_until = None
+        self._probing = False
+        self._condition = Condition()
+
+    @property
+    def is_open(self):
+        return self._open_until is not None
+
+    def _admit(self):
+        """None when the caller may send now, else how long to wait before asking again."""
+        with self._condition:
+            if self._open_until is None:
+                return None
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probing:
+                return 0.5
+            self._probing = True
+            return None
+
+    def wait(self):
+        while True:
+            delay = self._admit()
+            if delay is None:
+                return
+            time.sleep(delay)
+
+    async def wait_async(self):
+        while True:
+            delay = self._admit()
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        with self._condition:
+            self.failures = 0
+            if self._open_until is not None:
+                print("[green]provider is back, resuming all workers[/green]")
+            self._open_until = None
+            self._probing = False
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self):
+        with self._condition:
+            self.failures += 1
+            if self._probing:
+                # the probe failed, stay open for longer
+                self._probing = False
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self._open_until is not None or self.failures < self.threshold:
+                return
+            self._open_until = time.monotonic() + self.cooldown
+            self.opened += 1
+        print(
+            f"[red]provider looks down ({self.failures} failures in a row), "
+            f"pausing all workers for {self.cooldown:.0f} seconds[/red]"
+        )
+
+    def record_other(self):
+        """A failure that is not an outage still shows the provider answers."""
+        with self._condition:
+            if self._open_until is None:
+                self.failures = 0
+            elif self._probing:
+                self.record_success()
+
+
+class RetryPolicy:
+    """
+    How often and how long to retry a failed translation request.
+
+    Attempt n waits base_delay * 2 ** (n - 1) seconds, at most `max_delay`
+    (or the Retry-After of the error when that is longer), with `jitter` of it
+    randomised so workers do not retry in lockstep. `on_error` lets a
+    translator decide about an error first, e.g. retry a rate limit at once
+    with another key. Errors that retrying cannot fix (4xx) leave the
+    paragraph untranslated with a warning, running out of attempts raises
+    `RetriesExhausted`, which stops the run.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0, jitter=0.5):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retries = 0
+        self.given_up = 0
+        self._lock = Lock()
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def _decide(self, error, attempt, breaker, on_error):
+        """Return (verdict, seconds to wait) for a failed attempt."""
+        verdict = on_error(error) if on_error is not None else None
+        if verdict is None:
+            verdict = classify_error(error)
+        if breaker is not None:
+            if verdict == OUTAGE:
+                breaker.record_failure()
+            elif verdict != FATAL:
+                breaker.record_other()
+        if verdict in (FATAL, GIVE_UP, NEXT_KEY):
+            return verdict, 0
+        if attempt >= self.max_attempts:
+            raise RetriesExhausted(
+                f"{type(error).__name__}: {error} (after {attempt} attempts)"
+            ) from error
+        with self._lock:
+            self.retries += 1
+        if verdict == RETRY_NOW:
+            return verdict, 0
+        delay = max(self.delay(attempt), retry_after(error, 0))
+        print(f"{type(error).__name__}: {error}, will retry in {delay:.1f} seconds")
+        return verdict, delay
+
+    def _after_failure(self, error, attempt, breaker, on_error, default):
+        """
+        Return (attempts used, seconds to wait) before the next try, or raise
+        when there is none. GIVE_UP raises `_GiveUp` carrying `default`.
+        """
+        if isinstance(error, (NoUsableKeyError, RetriesExhausted)):
+            raise error
+        verdict, delay = self._decide(error, attempt + 1, breaker, on_error)
+        if verdict == FATAL:
+            raise error
+        if verdict == GIVE_UP:
+            with self._lock:
+                self.given_up += 1
+            print(
+                f"[red]{type(error).__name__}: {error}, "
+                "leaving the paragraph untranslated[/red]"
+            )
+            raise _GiveUp(default)
+        if verdict == NEXT_KEY:
+            return attempt, 0
+        return attempt + 1, delay
+
+    def call(self, request, *args, breaker=None, on_error=None, default=None):
+        """Return `request(*args)`, retried as the policy says."""
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.wait()
+            try:
+                result = request(*args)
+            except Exception as e:
+                try:
+                    attempt, delay = self._after_failure(
+                        e, attempt, breaker, on_error, default
+                    )
+                except _GiveUp as give_up:
+                    return give_up.default
+                if delay:
+                    time.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    async def call_async(
+        self, request, *args, breaker=None, on_error=None, default=None
+    ):
+        """`call` for a coroutine function, waiting without blocking the event loop."""
+        attempt = 0
+        while True:
+            if breaker is not None:
+                await breaker.wait_async()
+            try:
+                result = await request(*args)
+            except Exception as e:
+                try:
+                    attempt, delay = self._after_failure(
+                        e, attempt, breaker, on_error, default
+                    )
+                except _GiveUp as give_up:
+                    return give_up.default
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+class _GiveUp(Exception):
+    def __init__(self, default):
+        super().__init__()
+        self.default = default
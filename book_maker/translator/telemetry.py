@@ -0,0 +1,247 @@
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from .key_pool import mask_key
+
+# USD per million input and output tokens, matched by model name prefix
+# (longest first); --token-price overrides it
+TOKEN_PRICES = {
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "o1-mini": (3.0, 12.0),
+    "o1": (15.0, 60.0),
+    "o3-mini": (1.1, 4.4),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-opus": (15.0, 75.0),
+    "gemini-1.5-flash": (0.075, 0.3),
+    "gemini-1.5-pro": (1.25, 5.0),
+}
+
+# the request being sent by this thread or asyncio task, see `Telemetry.request`
+_current = ContextVar("telemetry_request", default=None)
+# how many paragraphs the requests sent now carry, see `Telemetry.batch`
+_batch_size = ContextVar("telemetry_batch_size", default=1)
+
+
+def usage_tokens(response):
+    """(input, output) tokens of an openai, anthropic or gemini response, or Nones."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        if getattr(usage, "prompt_tokens", None) is not None:
+            return usage.prompt_tokens, usage.completion_tokens
+        if getattr(usage, "input_tokens", None) is not None:
+            return usage.input_tokens, usage.output_tokens
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        return usage.prompt_token_count, usage.candidates_token_count
+    return None, None
+
+
+def token_price(model, prices=None):
+    prices = prices or TOKEN_PRICES
+    if not isinstance(model, str):
+        return None
+    for prefix in sorted(prices, key=len, reverse=True):
+        if model.startswith(prefix):
+            return prices[prefix]
+    return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Telemetry:
+    """
+    One record per translation request of a run: provider, model, key, input
+    and output tokens, latency, retries, how many paragraphs it carried and
+    whether the cache answered it. Records are appended to a JSONL file as
+    they come when `open` was called, `summary` and `prometheus` sum them up
+    at the end. Thread and asyncio safe, one is shared by a translator and
+    its worker clones.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started = time.monotonic()
+        self.token_prices = None
+        self._file = None
+        self._lock = Lock()
+
+    def open(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    @contextmanager
+    def batch(size):
+        """Requests sent inside the block carry `size` paragraphs."""
+        token = _batch_size.set(size)
+        try:
+            yield
+        finally:
+            _batch_size.reset(token)
+
+    @contextmanager
+    def request(self, provider, model=None):
+        """
+        Time the request sent inside the block, retries included. The code
+        sending it adds what only it knows with `note`.
+        """
+        entry = {
+            "provider": provider,
+            "model": model,
+            "key": None,
+            "input_tokens": None,
+            "output_tokens": None,
+            "retries": -1,
+            "batch_size": _batch_size.get(),
+            "cache_hit": False,
+            "ok": False,
+        }
+        token = _current.set(entry)
+        started = time.monotonic()
+        try:
+            yield entry
+        finally:
+            _current.reset(token)
+            entry["latency"] = round(time.monotonic() - started, 4)
+            entry["retries"] = max(0, entry["retries"])
+            self._add(entry)
+
+    def note(self, key=None, response=None, **fields):
+        """Add to the record of the request being sent, if any."""
+        entry = _current.get()
+        if entry is None:
+            return
+        if key is not None:
+            entry["key"] = mask_key(key)
+        if response is not None:
+            input_tokens, output_tokens = usage_tokens(response)
+            if input_tokens is not None:
+                entry["input_tokens"] = (entry["input_tokens"] or 0) + input_tokens
+                entry["output_tokens"] = (entry["output_tokens"] or 0) + (
+                    output_tokens or 0
+                )
+        entry.update(fields)
+
+    def attempt(self):
+        """Count one try of the current request, the first is not a retry."""
+        entry = _current.get()
+        if entry is not None:
+            entry["retries"] += 1
+
+    def cache_hits(self, provider, model, count):
+        if count:
+            self._add(
+                {
+                    "provider": provider,
+                    "model": model,
+                    "batch_size": count,
+                    "cache_hit": True,
+                    "ok": True,
+                    "latency": 0.0,
+                }
+            )
+
+    def _add(self, entry):
+        entry["time"] = round(time.time(), 3)
+        with self._lock:
+            self.records.append(entry)
+            if self._file is not None:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def _totals(self):
+        with self._lock:
+            records = list(self.records)
+        sent = [r for r in records if not r["cache_hit"]]
+        totals = {
+            "requests": len(sent),
+            "failed": sum(1 for r in sent if not r["ok"]),
+            "retries": sum(r["retries"] for r in sent),
+            "paragraphs": sum(r["batch_size"] for r in records if r["ok"]),
+            "cache_hits": sum(r["batch_size"] for r in records if r["cache_hit"]),
+            "input_tokens": sum(r["input_tokens"] or 0 for r in sent),
+            "output_tokens": sum(r["output_tokens"] or 0 for r in sent),
+            "latencies": [r["latency"] for r in sent if r["ok"]],
+            "seconds": max(time.monotonic() - self.started, 1e-9),
+            "cost": None,
+        }
+        for r in sent:
+            price = token_price(r["model"], self.token_prices)
+            if price is not None and r["input_tokens"] is not None:
+                cost = (
+                    r["input_tokens"] * price[0] + (r["output_tokens"] or 0) * price[1]
+                ) / 1e6
+                totals["cost"] = (totals["cost"] or 0) + cost
+        return totals
+
+    def summary(self):
+        t = self._totals()
+        p50, p95 = percentile(t["latencies"], 0.5), percentile(t["latencies"], 0.95)
+        latency = "n/a" if p50 is None else f"p50 {p50:.2f}s, p95 {p95:.2f}s"
+        cost = "n/a" if t["cost"] is None else f"~${t['cost']:.4f}"
+        return (
+            f"{t['requests']} requests ({t['failed']} failed, {t['retries']} retries), "
+            f"{t['cache_hits']} cache hits, latency {latency}, "
+            f"{t['paragraphs'] / t['seconds']:.2f} paragraphs/s, "
+            f"{t['input_tokens']} input + {t['output_tokens']} output tokens "
+            f"({t['output_tokens'] / t['seconds']:.1f} output tokens/s), "
+            f"estimated cost {cost}"
+        )
+
+    def prometheus(self):
+        """The totals in the Prometheus text format."""
+        t = self._totals()
+        lines = []
+
+        def metric(name, kind, help_text, value, labels=""):
+            lines.append(f"# HELP bbook_{name} {help_text}")
+            lines.append(f"# TYPE bbook_{name} {kind}")
+            lines.append(f"bbook_{name}{labels} {value}")
+
+        metric("requests_total", "counter", "Translation requests sent.", t["requests"])
+        metric("request_failures_total", "counter", "Failed requests.", t["failed"])
+        metric("request_retries_total", "counter", "Retries of requests.", t["retries"])
+        metric("paragraphs_total", "counter", "Paragraphs translated.", t["paragraphs"])
+        metric(
+            "cache_hits_total", "counter", "Paragraphs from the cache.", t["cache_hits"]
+        )
+        lines.append("# HELP bbook_tokens_total Tokens reported by the provider.")
+        lines.append("# TYPE bbook_tokens_total counter")
+        lines.append(f'bbook_tokens_total{{direction="input"}} {t["input_tokens"]}')
+        lines.append(f'bbook_tokens_total{{direction="output"}} {t["output_tokens"]}')
+        lines.append(
+            "# HELP bbook_request_latency_seconds Latency of successful requests."
+        )
+        lines.append("# TYPE bbook_request_latency_seconds summary")
+        for fraction in (0.5, 0.95):
+            value = percentile(t["latencies"], fraction)
+            lines.append(
+                f'bbook_request_latency_seconds{{quantile="{fraction}"}} '
+                f"{'NaN' if value is None else value}"
+            )
+        lines.append(f"bbook_request_latency_seconds_sum {sum(t['latencies'])}")
+        lines.append(f"bbook_request_latency_seconds_count {len(t['latencies'])}")
+        metric("run_seconds", "gauge", "Seconds since the run started.", t["seconds"])
+        if t["cost"] is not None:
+            metric(
+                "estimated_cost_usd", "gauge", "Estimated cost of tokens.", t["cost"]
+            )
+        return "\n".join(lines) + "\n"
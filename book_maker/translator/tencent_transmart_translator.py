@@ -1,18 +1,26 @@
 import re
 import time
 import uuid
-import requests
 
-from rich import print
+from book_maker.console import echo, echo_translation
+from book_maker.utils import LANGUAGES, TO_LANGUAGE_CODE
+
 from .base_translator import Base
 
+# the end of a sentence, where `text_analysis` would split the text
+SENTENCE_END_RE = re.compile(r"(?<=[.!?;。！？；…])(\s+)")
+
 
 class TencentTranSmart(Base):
     """
     Tencent TranSmart translator
     """
 
-    def __init__(self, key, language, **kwargs) -> None:
+    # each entry of `text_list` is translated on its own
+    max_batch_segments = 50
+    max_batch_chars = 2000
+
+    def __init__(self, key, language, source_lang="auto", **kwargs) -> None:
         super().__init__(key, language)
         self.api_url = "https://transmart.qq.com/api/imt"
         self.header = {
@@ -23,7 +31,21 @@ class TencentTranSmart(Base):
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
         }
         self.uuid = str(uuid.uuid4())
-        self.session = requests.Session()
+        # one client key for the run, sent as the cookie of the session
+        self.client_key = self.get_client_key()
+        self.session.cookies.set(
+            "TSMT_CLIENT_KEY", self.client_key, domain="transmart.qq.com"
+        )
+        self.session.timeout = 3
+        # the language of the book, from --source_lang or detected by
+        # `text_analysis` of the first paragraph, shared with worker clones
+        self.source = {}
+        if source_lang and source_lang != "auto":
+            self.source["lang"] = (
+                source_lang
+                if source_lang in LANGUAGES
+                else TO_LANGUAGE_CODE.get(source_lang.lower(), source_lang)
+            )
         self.translate_type = "zh"
         if self.language == "english":
             self.translate_type = "en"
@@ -31,14 +53,19 @@ class TencentTranSmart(Base):
     def rotate_key(self):
         pass
 
-    def translate(self, text):
-        print(text)
-        source_language, text_list = self.text_analysis(text)
-        client_key = self.get_client_key()
-        api_form_data = {
+    def _request_translation(self, text, api_form_data):
+        self.wait_for_rate_limit(text)
+        response = self.session.post(
+            self.api_url, json=api_form_data, headers=self.header
+        )
+        response.raise_for_status()
+        return response.json()["auto_translation"]
+
+    def _form_data(self, source_language, text_list):
+        return {
             "header": {
                 "fn": "auto_translation",
-                "client_key": client_key,
+                "client_key": self.client_key,
             },
             "type": "plain",
             "model_category": "normal",
@@ -49,21 +76,73 @@ class TencentTranSmart(Base):
             "target": {"lang": self.translate_type},
         }
 
-        response = self.session.post(
-            self.api_url, json=api_form_data, headers=self.header, timeout=3
+    def translate_segments(self, texts):
+        api_form_data = self._form_data(self.source_language(texts[0]), texts)
+        t_texts = self.with_retry(
+            self._request_translation, "\n".join(texts), api_form_data
         )
-        t_text = "".join(response.json()["auto_translation"])
-        print("[bold green]" + re.sub("\n{3,}", "\n\n", t_text) + "[/bold green]")
+        if t_texts is None:
+            return None
+        # the empty entries around the text come back as well
+        if len(t_texts) == len(texts) + 2:
+            t_texts = t_texts[1:-1]
+        if len(t_texts) != len(texts):
+            return None
+        self.print_segments(texts, t_texts)
+        return t_texts
+
+    def translate(self, text):
+        echo(text)
+        text_list, breaks = self.split_sentences(text)
+        api_form_data = self._form_data(self.source_language(text), text_list)
+        t_texts = self.with_retry(self._request_translation, text, api_form_data)
+        if t_texts is None:
+            return text
+        t_text = self._join_sentences(t_texts, breaks)
+        echo_translation(t_text)
         return t_text
 
+    @staticmethod
+    def split_sentences(text):
+        """
+        Split `text` into sentences like `text_analysis` does, without asking
+        the server; also returns the whitespace after each but the last.
+        """
+        parts = SENTENCE_END_RE.split(text)
+        return parts[::2], parts[1::2]
+
+    def _join_sentences(self, t_texts, breaks):
+        # the empty entries around the text come back as well
+        if len(t_texts) == len(breaks) + 3:
+            t_texts = t_texts[1:-1]
+        else:
+            # the server split the sentences its own way, keep the line
+            # breaks as far as they go
+            t_texts = [t_text for t_text in t_texts if t_text.strip()] or [""]
+        space = " " if self.translate_type == "en" else ""
+        joined = [t_texts[0]]
+        for i, t_text in enumerate(t_texts[1:]):
+            gap = breaks[i] if i < len(breaks) else ""
+            joined.append("\n" * gap.count("\n") or space)
+            joined.append(t_text)
+        return "".join(joined)
+
+    def source_language(self, text):
+        """The language of the book, detected from the first `text` asked about."""
+        language = self.source.get("lang")
+        if language is None:
+            language = self.text_analysis(text)[0]
+            if language is not None:
+                self.source["lang"] = language
+        return language or "en"
+
     def text_analysis(self, text):
-        client_key = self.get_client_key()
-        self.header.update({"Cookie": "TSMT_CLIENT_KEY={}".format(client_key)})
+        """(language, sentences) of `text` from the server, (None, [text]) if it fails."""
         analysis_request_data = {
             "header": {
                 "fn": "text_analysis",
                 "session": "",
-                "client_key": client_key,
+                "client_key": self.client_key,
                 "user": "",
             },
             "text": text,
@@ -74,7 +153,7 @@ class TencentTranSmart(Base):
             self.api_url, json=analysis_request_data, headers=self.header
         )
         if not r.ok:
-            return text
+            return None, [text]
         response_json_data = r.json()
         text_list = [item["tgt_str"] for item in response_json_data["sentence_list"]]
         language = response_json_data["language"]
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "bbook_maker", "translations.sqlite3"
+)
+
+# run the eviction pass every this many writes instead of on every insert
+EVICT_EVERY = 500
+
+
+def source_text_of(p):
+    """Return the text a translator would see for `p` (a str or a bs4 node)."""
+    if isinstance(p, str):
+        return p
+    if hasattr(p, "decode_contents") and p.contents:
+        return p.decode_contents()
+    return p.get_text() if hasattr(p, "get_text") else str(p)
+
+
+class TranslationCache:
+    """
+    Content-addressed on-disk store of finished translations.
+
+    One sqlite file is shared by every book and every translator; entries are
+    keyed by a hash of everything that changes the output (see `make_key`).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=0, max_age_days=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._writes_since_evict = 0
+        self._lock = Lock()
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        # one connection shared by all worker threads, serialised by self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed ON translations(accessed_at)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(text, model, language, prompt_template, system_message):
+        payload = json.dumps(
+            [text, model, language, prompt_template, system_message],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            # sqlite limits the number of bound parameters per statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, translation, created_at FROM translations WHERE key IN ({marks})",
+                    chunk,
+                ).fetchall()
+                for key, translation, created_at in rows:
+                    if self.max_age and now - created_at > self.max_age:
+                        continue
+                    found[key] = translation
+            if found:
+                self._conn.executemany(
+                    "UPDATE translations SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, translation):
+        self.set_many({key: translation})
+
+    def set_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                [(key, value, now, now) for key, value in items.items()],
+            )
+            self._conn.commit()
+            self.stores += len(items)
+            self._writes_since_evict += len(items)
+            need_evict = self._writes_since_evict >= EVICT_EVERY
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop entries older than `max_age` and the least recently used beyond `max_entries`."""
+        with self._lock:
+            self._writes_since_evict = 0
+            if self.max_age:
+                self._conn.execute(
+                    "DELETE FROM translations WHERE created_at < ?",
+                    (time.time() - self.max_age,),
+                )
+            if self.max_entries:
+                self._conn.execute(
+                    """DELETE FROM translations WHERE key IN (
+                        SELECT key FROM translations
+                        ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"translation cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), {self.stores} stored"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedTranslator:
+    """
+    Wrap a translator so `translate`/`translate_list` consult a `TranslationCache`
+    before any network call. Every other attribute is forwarded to the wrapped
+    translator, so loaders and the cli can keep treating it as the translator.
+    """
+
+    def __init__(self, translator, cache, model_name=None):
+        self.__dict__["_translator"] = translator
+        self.__dict__["_cache"] = cache
+        self.__dict__["_model_name"] = model_name or type(translator).__name__
+
+    def __getattr__(self, name):
+        return getattr(self._translator, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._translator, name, value)
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def _key(self, text):
+        t = self._translator
+        return self._cache.make_key(
+            text,
+            self._model_name,
+            t.language,
+            getattr(t, "prompt_template", None) or getattr(t, "prompt", None),
+            getattr(t, "system_content", None) or getattr(t, "prompt_sys_msg", None),
+        )
+
+    @staticmethod
+    def _cacheable(text, translation):
+        # several translators fall back to returning the source on failure,
+        # never pin such a result in the cache
+        return bool(translation) and translation.strip() != text.strip()
+
+    def _remember_context(self, text, translation):
+        t = self._translator
+        if getattr(t, "context_flag", False) and hasattr(t, "save_context"):
+            t.save_context(text, translation)
+
+    def _count_hits(self, count):
+        t = self._translator
+        t.telemetry.cache_hits(type(t).__name__, t.model_name(), count)
+
+    def translate(self, text, *args, **kwargs):
+        key = self._key(text)
+        translation = self._cache.get(key)
+        if translation is not None:
+            self._remember_context(text, translation)
+            self._count_hits(1)
+            return translation
+        translation = self._translator.translate(text, *args, **kwargs)
+        if translation is not None and self._cacheable(text, translation):
+            self._cache.set(key, translation)
+        return translation
+
+    def clone_for_worker(self):
+        return CachedTranslator(
+            self._translator.clone_for_worker(), self._cache, self._model_name
+        )
+
+    def translate_list(self, text_list):
+        return self._translate_missing(text_list, self._translator.translate_list)
+
+    def translate_concurrently(self, text_list):
+        return self._translate_missing(
+            text_list, self._translator.translate_concurrently
+        )
+
+    def _translate_missing(self, text_list, translate_many):
+        texts = [source_text_of(p) for p in text_list]
+        keys = [self._key(text) for text in texts]
+        found = self._cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        self._count_hits(len(keys) - len(missing))
+        if missing:
+            results = translate_many([text_list[i] for i in missing])
+            new_items = {}
+            for i, translation in zip(missing, results):
+                if translation is None:
+                    continue
+                found.setdefault(keys[i], translation)
+                if self._cacheable(texts[i], translation):
+                    new_items[keys[i]] = translation
+            self._cache.set_many(new_items)
+        return [found.get(key, "") for key in keys]
@@ -1,4 +1,4 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from .chatgptapi_translator import ChatGPTAPI
 
 
@@ -16,3 +16,6 @@ class XAIClient(ChatGPTAPI):
 
     def rotate_model(self):
         self.model = self.model_list[0]
+
+    def create_async_client(self, key):
+        return AsyncOpenAI(api_key=key, base_url=self.api_url)
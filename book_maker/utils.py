@@ -1,3 +1,5 @@
+import functools
+
 import tiktoken
 
 # Borrowed from : https://github.com/openai/whisper
@@ -131,34 +133,68 @@ def prompt_config_to_kwargs(prompt_config):
     )
 
 
-# ref: https://platform.openai.com/docs/guides/chat/introduction
-def num_tokens_from_text(text, model="gpt-3.5-turbo-0301"):
-    messages = (
-        {
-            "role": "user",
-            "content": text,
-        },
-    )
+DEFAULT_TOKENIZER_MODEL = "gpt-3.5-turbo-0301"
+
+# model name prefix -> tiktoken encoding, None when the model's tokenizer is
+# not public and tokens are estimated from the text instead
+TOKENIZER_REGISTRY = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-5", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-", "cl100k_base"),
+    ("claude", None),
+    ("gemini", None),
+    ("qwen", None),
+)
 
-    """Returns the number of tokens used by a list of messages."""
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_TOKENIZER_MODEL):
+    """Return the (cached) tiktoken encoding of `model`, None if it is estimated."""
+    for prefix, encoding_name in TOKENIZER_REGISTRY:
+        if model.startswith(prefix):
+            return encoding_name and tiktoken.get_encoding(encoding_name)
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model == "gpt-3.5-turbo-0301":  # note: future models may deviate from this
-        num_tokens = 0
-        for message in messages:
-            num_tokens += (
-                4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-            )
-            for key, value in message.items():
-                num_tokens += len(encoding.encode(value))
-                if key == "name":  # if there's a name, the role is omitted
-                    num_tokens += -1  # role is always required and always 1 token
-        num_tokens += 2  # every reply is primed with <im_start>assistant
-        return num_tokens
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(text):
+    # about 4 characters per token for latin scripts, one per CJK character
+    wide = sum(1 for char in text if ord(char) > 0x2E7F)
+    return wide + (len(text) - wide + 3) // 4
+
+
+# ref: https://platform.openai.com/docs/guides/chat/introduction
+def count_tokens(texts, model=DEFAULT_TOKENIZER_MODEL, num_threads=8):
+    """
+    Return the number of tokens a user message of each text costs.
+
+    Texts are encoded together with `encode_batch`, which spreads them over
+    `num_threads` threads.
+    """
+    texts = list(texts)
+    encoding = get_encoding(model)
+    if encoding is None:
+        counts = [estimate_tokens(text) for text in texts]
+        role_tokens = 1
     else:
-        raise NotImplementedError(
-            f"""num_tokens_from_messages() is not presently implemented for model {model}.
-  See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens."""
-        )
+        if len(texts) > 1:
+            tokens = encoding.encode_batch(texts, num_threads=num_threads)
+        else:
+            tokens = [encoding.encode(text) for text in texts]
+        counts = [len(t) for t in tokens]
+        role_tokens = len(encoding.encode("user"))
+    # every message follows <im_start>{role/name}\n{content}<im_end>\n and
+    # every reply is primed with <im_start>assistant
+    overhead = 4 + role_tokens + 2
+    return [count + overhead for count in counts]
+
+
+def num_tokens_from_text(text, model=DEFAULT_TOKENIZER_MODEL):
+    """Returns the number of tokens used by `text` sent as a user message."""
+    return count_tokens([text], model)[0]
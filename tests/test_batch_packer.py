@@ -0,0 +1,89 @@
+from book_maker.loader.batch_packer import AdaptiveBatchSize, BatchPacker, BatchStats
+
+
+class Para:
+    def __init__(self, token_count):
+        self.token_count = token_count
+
+    def __repr__(self):
+        return f"Para({self.token_count})"
+
+
+def pack(packer, sizes):
+    batches = []
+    for size in sizes:
+        batches.extend(packer.add(Para(size)))
+    batches.extend(packer.flush())
+    return [[p.token_count for p in batch] for batch in batches]
+
+
+def test_batches_are_filled_up_to_the_budget():
+    assert pack(BatchPacker(100), [40, 60, 30, 30, 50, 20]) == [
+        [40, 60],
+        [30, 30],
+        [50, 20],
+    ]
+
+
+def test_oversized_paragraph_goes_alone_and_does_not_count_against_the_next():
+    packer = BatchPacker(100)
+    assert pack(packer, [30, 150, 90, 10]) == [[30], [150], [90, 10]]
+    assert packer.oversized([Para(150)])
+    assert not packer.oversized([Para(90)])
+
+
+def test_paragraph_cap():
+    assert pack(BatchPacker(1000, max_paragraphs=2), [1, 1, 1, 1, 1]) == [
+        [1, 1],
+        [1, 1],
+        [1],
+    ]
+
+
+def test_fill_ratio():
+    stats = BatchStats(100)
+    stats.record([Para(50), Para(40)])
+    stats.record([Para(250)])
+    assert stats.requests == 2
+    assert stats.paragraphs == 3
+    assert stats.fill_ratio == (0.9 + 1.0) / 2
+
+
+def test_adaptive_size_shrinks_on_missing_paragraphs_and_grows_back():
+    sizer = AdaptiveBatchSize(1000, 20, "gpt-test")
+    packer = BatchPacker(1000, 20)
+    batch = [Para(50)] * 10
+
+    sizer.observe(batch, ["ok"] * 9 + [""], seconds=1)
+    sizer.apply(packer)
+    assert (packer.token_budget, packer.max_paragraphs) == (700, 7)
+    assert sizer.mismatch_rate > 0
+
+    for _ in range(AdaptiveBatchSize.grow_after):
+        sizer.observe(batch[:7], ["ok"] * 7, seconds=1)
+    assert (sizer.token_budget, sizer.max_paragraphs) == (800, 8)
+
+    for _ in range(100):
+        sizer.observe(batch[:7], ["ok"] * 7, seconds=1)
+    # never above what was configured
+    assert (sizer.token_budget, sizer.max_paragraphs) == (1000, 20)
+
+
+def test_adaptive_size_shrinks_on_slow_answers():
+    sizer = AdaptiveBatchSize(1000, 20, "gpt-test", max_latency=30)
+    sizer.observe([Para(50)] * 4, ["ok"] * 4, seconds=45)
+    assert sizer.token_budget == 700
+
+
+def test_adaptive_size_is_remembered_per_model(tmp_path):
+    path = str(tmp_path / "batch_sizes.json")
+    sizer = AdaptiveBatchSize(1000, 20, "gpt-test", path=path)
+    sizer.observe([Para(50)] * 10, [""] * 10, seconds=1)
+    sizer.save()
+    AdaptiveBatchSize(500, 20, "other-model", path=path).save()
+
+    again = AdaptiveBatchSize(1000, 20, "gpt-test", path=path)
+    assert (again.token_budget, again.max_paragraphs) == (700, 7)
+    # a lower --accumulated_num still wins
+    assert AdaptiveBatchSize(600, 5, "gpt-test", path=path).token_budget == 600
+    assert AdaptiveBatchSize(1000, 20, "other-model", path=path).token_budget == 500
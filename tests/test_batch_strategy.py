@@ -0,0 +1,154 @@
+import json
+import re
+
+from bs4 import BeautifulSoup
+
+from book_maker.translator.batch_strategy import (
+    BatchStrategy,
+    parse_json_translations,
+    split_numbered_translations,
+)
+from book_maker.translator.chatgptapi_translator import ChatGPTAPI
+
+
+class EchoBatchTranslator(BatchStrategy):
+    """Answers the way a model would, from the prompt `translate_list` builds."""
+
+    def __init__(self, respond):
+        super().__init__()
+        self.prompt_template = "{text}"
+        self.respond = respond
+        self.prompts = []
+
+    def translate(self, text):
+        prompt = self.prompt_template.format(text=text, language="French")
+        self.prompts.append(prompt)
+        return self.respond(text)
+
+
+def paragraphs(n):
+    soup = BeautifulSoup(
+        "".join(f"<p>line <b>{i}</b><sup>{i}</sup></p>" for i in range(1, n + 1)),
+        "html.parser",
+    )
+    return soup.find_all("p")
+
+
+def numbered_response(text):
+    return "".join(
+        f"TRANSLATION OF PARAGRAPH {num}:\n{body.strip().upper()}\n\n"
+        for num, body in re.findall(
+            r"PARAGRAPH (\d+):\n(.*?)(?=\n\nPARAGRAPH \d+:|\Z)", text, re.S
+        )
+    )
+
+
+def test_numbered_response_of_200_paragraphs():
+    translator = EchoBatchTranslator(numbered_response)
+    plist = paragraphs(200)
+    assert translator.translate_list(plist) == [
+        f"LINE <B>{i}</B>" for i in range(1, 201)
+    ]
+    # the template is restored and the footnotes were not sent
+    assert translator.prompt_template == "{text}"
+    assert "<sup>" not in translator.prompts[0]
+    assert plist[0].find("sup") is not None
+
+
+def test_missing_and_loose_markers():
+    text = (
+        "TRANSLATION OF PARAGRAPH 1:\nun\n\n"
+        "TRANSLATION OF PARAGRAPH 3:\ntrois, voir PARAGRAPH 2\n\n"
+    )
+    # a marker that is not there does not take the text of another one
+    assert split_numbered_translations(text, 3) == ["un", "", "trois, voir PARAGRAPH 2"]
+
+    text = "PARAGRAPH 1:\nun\nPARA (2):\ndeux\nTRANSLATION 3 :\ntrois"
+    assert split_numbered_translations(text, 3) == ["un", "deux", "trois"]
+
+    # more markers than paragraphs, the first answer for a number wins
+    text = "TRANSLATION OF PARAGRAPH 1: a TRANSLATION OF PARAGRAPH 1: b TRANSLATION OF PARAGRAPH 2: c"
+    assert split_numbered_translations(text, 1) == ["a"]
+
+
+def test_json_output():
+    def respond(text):
+        items = json.loads(text)
+        return "```json\n%s\n```" % json.dumps(
+            [{"id": item["id"], "translation": item["text"].upper()} for item in items]
+        )
+
+    translator = EchoBatchTranslator(respond)
+    translator.set_batch_json_output(True)
+    assert translator.translate_list(paragraphs(3)) == [
+        "LINE <B>1</B>",
+        "LINE <B>2</B>",
+        "LINE <B>3</B>",
+    ]
+    assert '{"id": <the same id>' in translator.prompts[0]
+
+    assert parse_json_translations('[{"id": 2, "translation": "b"}]', 2) == ["", "b"]
+    assert parse_json_translations("TRANSLATION OF PARAGRAPH 1: a", 1) is None
+
+    # an answer that is not JSON is still read by its markers
+    translator = EchoBatchTranslator(lambda text: "TRANSLATION OF PARAGRAPH 1: a")
+    translator.set_batch_json_output(True)
+    assert translator.translate_list(paragraphs(1)) == ["a"]
+
+
+def test_missing_paragraphs_are_repaired():
+    def respond(text):
+        if not text.startswith("PARAGRAPH"):
+            # a paragraph sent on its own
+            return text.upper()
+        answer = numbered_response(text)
+        # the model skips the paragraphs about 2 and 5, and 5 again
+        for num in ("2", "5"):
+            answer = re.sub(
+                r"TRANSLATION OF PARAGRAPH \d+:\nLINE <B>%s</B>\n\n" % num, "", answer
+            )
+        return answer
+
+    translator = EchoBatchTranslator(respond)
+    assert translator.translate_list(paragraphs(6)) == [
+        f"LINE <B>{i}</B>" for i in range(1, 7)
+    ]
+    # the whole batch, 2 and 5 as a batch, then each alone
+    sent = [
+        len(re.findall(r"(?<!OF )PARAGRAPH \d+:", prompt))
+        for prompt in translator.prompts
+    ]
+    assert sent == [6, 2, 0, 0]
+    assert translator.take_batch_repairs() == 2
+    assert translator.take_batch_repairs() == 0
+    stats = translator.repair_stats
+    assert (stats.requests, stats.repaired, stats.unrepaired) == (3, 2, 0)
+
+    translator = EchoBatchTranslator(respond)
+    translator.set_batch_repair(False)
+    assert translator.translate_list(paragraphs(3))[1] == ""
+    assert len(translator.prompts) == 1
+    # each translator counts its own repairs
+    assert translator.repair_stats.requests == 0
+
+
+def test_worker_clones_share_the_repair_stats():
+    translator = ChatGPTAPI("key", "french")
+    worker = translator.clone_for_worker()
+    assert worker.repair_stats is translator.repair_stats
+    assert worker._last_batch is translator._last_batch
+    assert ChatGPTAPI("key", "french").repair_stats is not translator.repair_stats
+
+
+def test_a_batch_given_up_on_is_repaired_paragraph_by_paragraph():
+    def respond(text):
+        if text.startswith("PARAGRAPH"):
+            # the whole batch was rejected, the translator returns the source
+            return text
+        return text.upper()
+
+    translator = EchoBatchTranslator(respond)
+    assert translator.translate_list(paragraphs(3)) == [
+        f"LINE <B>{i}</B>" for i in range(1, 4)
+    ]
+    assert len(translator.prompts) == 4
@@ -0,0 +1,35 @@
+import logging
+
+import pytest
+
+from book_maker import console
+from book_maker.console import echo, echo_translation, setup_console, stop_console
+
+
+@pytest.fixture
+def restore_console():
+    yield
+    stop_console()
+
+
+def test_echo_prints_right_away_without_setup(capsys):
+    echo("Hello")
+    echo_translation("Bonjour\n\n\n\nmonde")
+    assert capsys.readouterr().out == "Hello\nBonjour\n\nmonde\n"
+
+
+def test_quiet_drops_paragraph_output(capsys, restore_console):
+    setup_console("warning")
+    echo("Hello")
+    assert console.progress_interval == 1.0
+    assert not console.logger.isEnabledFor(logging.INFO)
+    stop_console()
+    assert capsys.readouterr().out == ""
+
+
+def test_paragraph_output_is_written_by_the_listener(capsys, restore_console):
+    setup_console("info")
+    for i in range(3):
+        echo(f"paragraph {i}")
+    stop_console()
+    assert capsys.readouterr().out == "paragraph 0\nparagraph 1\nparagraph 2\n"
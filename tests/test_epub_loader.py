@@ -0,0 +1,583 @@
+import asyncio
+import random
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from ebooklib import ITEM_DOCUMENT, epub
+from openai import BadRequestError
+
+from book_maker.loader import epub_loader
+from book_maker.loader.epub_loader import EPUBBookLoader
+from book_maker.translator.async_strategy import AsyncStrategy
+from book_maker.translator.base_translator import Base
+from book_maker.translator.chatgptapi_translator import ChatGPTAPI
+
+
+class EchoTranslator(Base):
+    def __init__(self, key, language, **kwargs):
+        super().__init__(key, language)
+        self.context_flag = False
+
+    def rotate_key(self):
+        pass
+
+    def translate(self, text, *args, **kwargs):
+        return f"TRANSLATED {text}"
+
+
+class FakeAsyncClient:
+    async def close(self):
+        pass
+
+
+class AsyncEchoTranslator(AsyncStrategy, EchoTranslator):
+    def __init__(self, key, language, **kwargs):
+        super().__init__(key, language)
+        self.key_len = len(key.split(","))
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def translate(self, text, *args, **kwargs):
+        raise AssertionError("every paragraph should have been prefetched")
+
+    def create_async_client(self, key):
+        return FakeAsyncClient()
+
+    async def async_get_translation(self, client, text):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # finish out of order on purpose
+        await asyncio.sleep(random.random() / 1000)
+        self.in_flight -= 1
+        return f"TRANSLATED {text}"
+
+
+@pytest.fixture()
+def animal_farm(tmp_path):
+    book = tmp_path / "animal_farm.epub"
+    shutil.copyfile(
+        Path(__file__).parent.parent / "test_books" / "animal_farm.epub", book
+    )
+    return str(book)
+
+
+def bilingual_texts(book_path):
+    book = epub.read_epub(book_path.replace(".epub", "_bilingual.epub"))
+    return b"".join(item.content for item in book.get_items_of_type(ITEM_DOCUMENT))
+
+
+def test_each_chapter_is_parsed_once(animal_farm, monkeypatch):
+    parsed = []
+    real_parse_html = epub_loader.parse_html
+
+    def counting_parse_html(markup, *args, **kwargs):
+        parsed.append(markup)
+        return real_parse_html(markup, *args, **kwargs)
+
+    monkeypatch.setattr(epub_loader, "parse_html", counting_parse_html)
+    loader = EPUBBookLoader(animal_farm, EchoTranslator, "", False, "fr")
+    loader.make_bilingual_book()
+
+    documents = list(loader.origin_book.get_items_of_type(ITEM_DOCUMENT))
+    assert len(parsed) == len(documents)
+    assert bilingual_texts(animal_farm).count(b"TRANSLATED") == sum(
+        chapter.translatable_total for chapter in loader._chapters.values()
+    )
+
+
+def test_is_p_translatable_strips_excluded_without_touching_tree():
+    loader = EPUBBookLoader.__new__(EPUBBookLoader)
+    loader.exclude_translate_tags = "sup"
+    loader.exclude_translate_selectors = ".skip"
+    html = (
+        '<p>Some <b>bold<sup>1</sup></b> text<span class="skip">no<sup>2</sup></span>'
+        "<sup>3</sup> here</p>"
+    )
+    p = epub_loader.parse_html(html, "html.parser").p
+
+    assert loader._is_p_translatable(p) == (True, "Some <b>bold</b> text here")
+    assert str(p) == html
+    assert p.find_all("sup")[2].next_element == "3"
+
+
+def _element_tree(markup):
+    from lxml import etree
+
+    root = etree.fromstring(markup, etree.XMLParser(resolve_entities=False))
+    return [
+        (
+            el.tag,
+            sorted(el.attrib.items()),
+            (el.text or "").strip(),
+            (el.tail or "").strip(),
+        )
+        for el in root.iter()
+    ]
+
+
+@pytest.mark.parametrize("book_name", ["animal_farm.epub", "Liber_Esther.epub"])
+def test_lxml_round_trip_matches_html_parser(book_name):
+    pytest.importorskip("lxml")
+    book = epub.read_epub(str(Path(__file__).parent.parent / "test_books" / book_name))
+    for item in book.get_items_of_type(ITEM_DOCUMENT):
+        reference = epub_loader.parse_html(item.content, "html.parser").encode()
+        fast = epub_loader.parse_html(item.content, "lxml").encode()
+        assert fast.startswith(b"<?xml") == reference.startswith(b"<?xml")
+        assert _element_tree(fast) == _element_tree(reference), item.file_name
+
+
+def test_async_translation_keeps_document_order(animal_farm, tmp_path):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(animal_farm, reference)
+    EPUBBookLoader(
+        str(reference), EchoTranslator, "", False, "fr"
+    ).make_bilingual_book()
+
+    loader = EPUBBookLoader(animal_farm, AsyncEchoTranslator, "a,b", False, "fr")
+    loader.translate_model.set_async_concurrency(8)
+    loader.make_bilingual_book()
+
+    assert 1 < loader.translate_model.max_in_flight <= 8
+    assert bilingual_texts(animal_farm) == bilingual_texts(str(reference))
+
+
+class SlowEchoTranslator(EchoTranslator):
+    def __init__(self, key, language, **kwargs):
+        super().__init__(key, language)
+        self.threads = set()
+
+    def translate(self, text, *args, **kwargs):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.001)
+        return super().translate(text)
+
+
+@pytest.fixture()
+def one_file_book(tmp_path):
+    book = epub.EpubBook()
+    book.set_identifier("one-file")
+    book.set_title("One file")
+    book.set_language("en")
+    chapter = epub.EpubHtml(title="All", file_name="all.xhtml", lang="en")
+    chapter.content = "<html><body>{}</body></html>".format(
+        "".join(f"<p>Paragraph number {i}.</p>" for i in range(60))
+    )
+    book.add_item(chapter)
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ["nav", chapter]
+    path = tmp_path / "one_file.epub"
+    epub.write_epub(str(path), book)
+    return str(path)
+
+
+def test_paragraph_scheduler_spreads_a_single_chapter(one_file_book, tmp_path):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(one_file_book, reference)
+    EPUBBookLoader(
+        str(reference), EchoTranslator, "", False, "fr"
+    ).make_bilingual_book()
+
+    loader = EPUBBookLoader(
+        one_file_book, SlowEchoTranslator, "", False, "fr", parallel_workers=4
+    )
+    loader.make_bilingual_book()
+
+    assert len(loader.translate_model.threads) > 1
+    assert bilingual_texts(one_file_book) == bilingual_texts(str(reference))
+    assert [t for t in loader.p_to_save if "Paragraph" in t] == [
+        f"TRANSLATED Paragraph number {i}." for i in range(60)
+    ]
+
+
+class SegmentEchoTranslator(EchoTranslator):
+    max_batch_segments = 8
+    max_batch_chars = 2000
+    requests = 0
+
+    def translate(self, text, *args, **kwargs):
+        SegmentEchoTranslator.requests += 1
+        return super().translate(text)
+
+    def translate_segments(self, texts):
+        SegmentEchoTranslator.requests += 1
+        return [f"TRANSLATED {text}" for text in texts]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_native_batching_sends_many_paragraphs_per_request(
+    one_file_book, tmp_path, workers
+):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(one_file_book, reference)
+    EPUBBookLoader(
+        str(reference), EchoTranslator, "", False, "fr"
+    ).make_bilingual_book()
+
+    SegmentEchoTranslator.requests = 0
+    loader = EPUBBookLoader(
+        one_file_book,
+        SegmentEchoTranslator,
+        "",
+        False,
+        "fr",
+        parallel_workers=workers,
+    )
+    loader.make_bilingual_book()
+
+    assert SegmentEchoTranslator.requests <= 60 // 8 + 2
+    assert bilingual_texts(one_file_book) == bilingual_texts(str(reference))
+    assert [t for t in loader.p_to_save if "Paragraph" in t] == [
+        f"TRANSLATED Paragraph number {i}." for i in range(60)
+    ]
+
+
+class ContextEchoTranslator(EchoTranslator):
+    def __init__(self, key, language, **kwargs):
+        super().__init__(key, language)
+        self.context_flag = True
+        self.context_list = []
+        self.context_paragraph_limit = 0
+        self.seen_context = []
+
+    def translate(self, text, *args, **kwargs):
+        # shared between clones on purpose: (translator, context size) pairs
+        self.seen_context.append((self, len(self.context_list)))
+        time.sleep(0.0005)
+        self.context_list.append(text)
+        return super().translate(text)
+
+
+def test_parallel_chapters_get_their_own_translator(animal_farm):
+    loader = EPUBBookLoader(
+        animal_farm,
+        ContextEchoTranslator,
+        "",
+        False,
+        "fr",
+        context_flag=True,
+        parallel_workers=4,
+    )
+    loader.make_bilingual_book()
+
+    translator = loader.translate_model
+    assert translator.context_list == []
+    by_worker = {}
+    for worker, size in translator.seen_context:
+        by_worker.setdefault(worker, []).append(size)
+    assert translator not in by_worker
+    # every chapter saw only its own, uninterrupted context
+    for sizes in by_worker.values():
+        assert sizes == list(range(len(sizes)))
+    assert sum(map(len, by_worker.values())) == bilingual_texts(animal_farm).count(
+        b"TRANSLATED"
+    )
+
+
+class InterruptingTranslator(EchoTranslator):
+    calls = 0
+    limit = None
+    context_paragraph_limit = 0
+
+    def translate(self, text, *args, **kwargs):
+        InterruptingTranslator.calls += 1
+        if self.limit is not None and InterruptingTranslator.calls > self.limit:
+            raise KeyboardInterrupt
+        return super().translate(text)
+
+
+def test_resume_after_interrupt_finishes_the_book(animal_farm, tmp_path, monkeypatch):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(animal_farm, reference)
+    EPUBBookLoader(
+        str(reference), EchoTranslator, "", False, "fr"
+    ).make_bilingual_book()
+
+    monkeypatch.setattr(InterruptingTranslator, "limit", 45)
+    with pytest.raises(SystemExit):
+        EPUBBookLoader(
+            animal_farm, InterruptingTranslator, "", False, "fr"
+        ).make_bilingual_book()
+
+    monkeypatch.setattr(InterruptingTranslator, "limit", None)
+    InterruptingTranslator.calls = 0
+    loader = EPUBBookLoader(animal_farm, InterruptingTranslator, "", True, "fr")
+    assert len(loader.p_to_save) == 45
+    loader.make_bilingual_book()
+
+    total = bilingual_texts(str(reference)).count(b"TRANSLATED")
+    assert InterruptingTranslator.calls == total - 45
+    assert bilingual_texts(animal_farm) == bilingual_texts(str(reference))
+
+
+def test_resume_of_parallel_run_puts_translations_back_in_place(
+    animal_farm, tmp_path, monkeypatch
+):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(animal_farm, reference)
+    EPUBBookLoader(
+        str(reference), EchoTranslator, "", False, "fr"
+    ).make_bilingual_book()
+
+    # context keeps whole chapters on the workers, finishing in any order
+    monkeypatch.setattr(InterruptingTranslator, "limit", 120)
+    InterruptingTranslator.calls = 0
+    with pytest.raises(SystemExit):
+        EPUBBookLoader(
+            animal_farm,
+            InterruptingTranslator,
+            "",
+            False,
+            "fr",
+            context_flag=True,
+            parallel_workers=4,
+        ).make_bilingual_book()
+
+    monkeypatch.setattr(InterruptingTranslator, "limit", None)
+    InterruptingTranslator.calls = 0
+    loader = EPUBBookLoader(animal_farm, InterruptingTranslator, "", True, "fr")
+    saved = len(loader.p_to_save)
+    assert 0 < saved <= 120
+    loader.make_bilingual_book()
+
+    total = bilingual_texts(str(reference)).count(b"TRANSLATED")
+    assert InterruptingTranslator.calls == total - saved
+    assert bilingual_texts(animal_farm) == bilingual_texts(str(reference))
+
+
+def test_a_rejected_paragraph_is_left_untranslated(animal_farm, monkeypatch):
+    requests = []
+
+    def get_translation(self, text):
+        requests.append(text)
+        if len(requests) == 3:
+            raise BadRequestError(
+                "too long",
+                response=httpx.Response(400, request=httpx.Request("POST", "x")),
+                body=None,
+            )
+        return f"TRANSLATED {text}"
+
+    monkeypatch.setattr(ChatGPTAPI, "get_translation", get_translation)
+    loader = EPUBBookLoader(animal_farm, ChatGPTAPI, "sk-test", False, "fr")
+    loader.make_bilingual_book()
+
+    texts = bilingual_texts(animal_farm)
+    assert texts.count(b"TRANSLATED") == len(requests) - 1
+    assert f"TRANSLATED {requests[2]}".encode() not in texts
+    assert loader.translate_model.retry_policy.given_up == 1
+
+
+def temp_book_texts(book_path):
+    book = epub.read_epub(book_path.replace(".epub", "_bilingual_temp.epub"))
+    return b"".join(item.content for item in book.get_items_of_type(ITEM_DOCUMENT))
+
+
+class SnapshotCheckingTranslator(EchoTranslator):
+    book_path = None
+    seen = []
+
+    def translate(self, text, *args, **kwargs):
+        snapshot = self.book_path.replace(".epub", "_bilingual_temp.epub")
+        if Path(snapshot).exists():
+            self.seen.append(temp_book_texts(self.book_path).count(b"TRANSLATED"))
+        return super().translate(text)
+
+
+def test_temp_book_is_refreshed_while_translating(animal_farm, monkeypatch):
+    monkeypatch.setattr(SnapshotCheckingTranslator, "book_path", animal_farm)
+    monkeypatch.setattr(SnapshotCheckingTranslator, "seen", [])
+    loader = EPUBBookLoader(animal_farm, SnapshotCheckingTranslator, "", False, "fr")
+    loader.temp_book_interval = 1e-9
+    loader.make_bilingual_book()
+
+    # a snapshot after every paragraph, holding everything translated so far
+    seen = SnapshotCheckingTranslator.seen
+    assert seen == list(range(1, len(seen) + 1))
+    assert temp_book_texts(animal_farm) == bilingual_texts(animal_farm)
+
+
+def test_temp_book_of_resumed_run_keeps_earlier_translations(
+    animal_farm, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(InterruptingTranslator, "limit", 45)
+    InterruptingTranslator.calls = 0
+    with pytest.raises(SystemExit):
+        EPUBBookLoader(
+            animal_farm, InterruptingTranslator, "", False, "fr"
+        ).make_bilingual_book()
+    assert temp_book_texts(animal_farm).count(b"TRANSLATED") == 45
+
+    InterruptingTranslator.calls = 0
+    monkeypatch.setattr(InterruptingTranslator, "limit", 10)
+    with pytest.raises(SystemExit):
+        EPUBBookLoader(
+            animal_farm, InterruptingTranslator, "", True, "fr"
+        ).make_bilingual_book()
+    assert temp_book_texts(animal_farm).count(b"TRANSLATED") == 55
+
+
+def book_entries(book_path):
+    import zipfile
+
+    with zipfile.ZipFile(book_path) as z:
+        return {name: z.read(name) for name in z.namelist()}
+
+
+def test_streamed_output_matches_the_whole_book_write(animal_farm, tmp_path):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(animal_farm, reference)
+    EPUBBookLoader(
+        str(reference), EchoTranslator, "", False, "fr"
+    ).make_bilingual_book()
+
+    loader = EPUBBookLoader(animal_farm, EchoTranslator, "", False, "fr")
+    loader.stream_output = True
+    loader.make_bilingual_book()
+
+    # media stays in the source zip until it is copied over
+    images = [
+        i for i in loader.origin_book.get_items() if isinstance(i, epub.EpubImage)
+    ]
+    assert images and all(i.content == b"" for i in images)
+    assert not Path(animal_farm.replace(".epub", "_bilingual.epub.part")).exists()
+    streamed = book_entries(animal_farm.replace(".epub", "_bilingual.epub"))
+    written = book_entries(str(reference).replace(".epub", "_bilingual.epub"))
+    assert streamed.keys() == written.keys()
+    # the opf and ncx carry a fresh uuid and timestamp
+    for name in ("EPUB/content.opf", "EPUB/toc.ncx"):
+        del streamed[name], written[name]
+    assert streamed == written
+
+
+def test_streamed_output_is_a_valid_book_when_interrupted(animal_farm, monkeypatch):
+    monkeypatch.setattr(InterruptingTranslator, "limit", 45)
+    InterruptingTranslator.calls = 0
+    loader = EPUBBookLoader(animal_farm, InterruptingTranslator, "", False, "fr")
+    loader.stream_output = True
+    with pytest.raises(SystemExit):
+        loader.make_bilingual_book()
+
+    entries = book_entries(animal_farm.replace(".epub", "_bilingual.epub"))
+    assert b"".join(entries.values()).count(b"TRANSLATED") == 45
+    assert any(name.endswith("cover.jpg") for name in entries)
+
+
+class CountingEchoTranslator(EchoTranslator):
+    requests = 0
+
+    def translate_list(self, text_list):
+        CountingEchoTranslator.requests += 1
+        return super().translate_list(text_list)
+
+
+@pytest.fixture()
+def word_tokens(monkeypatch):
+    import tiktoken
+
+    from book_maker import utils
+
+    class WordEncoding:
+        def encode(self, text):
+            return text.split()
+
+        def encode_batch(self, texts, num_threads=8):
+            return [text.split() for text in texts]
+
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WordEncoding())
+    utils.get_encoding.cache_clear()
+    yield
+    utils.get_encoding.cache_clear()
+
+
+def test_batches_across_chapters_need_fewer_requests(
+    animal_farm, tmp_path, word_tokens
+):
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(animal_farm, reference)
+    CountingEchoTranslator.requests = 0
+    loader = EPUBBookLoader(str(reference), CountingEchoTranslator, "", False, "fr")
+    loader.accumulated_num = 300
+    loader.make_bilingual_book()
+    per_chapter = CountingEchoTranslator.requests
+
+    CountingEchoTranslator.requests = 0
+    loader = EPUBBookLoader(animal_farm, CountingEchoTranslator, "", False, "fr")
+    loader.accumulated_num = 300
+    loader.batch_across_chapters = True
+    loader.make_bilingual_book()
+
+    assert CountingEchoTranslator.requests < per_chapter
+    assert loader._batch_stats.fill_ratio > 0.5
+    assert bilingual_texts(animal_farm) == bilingual_texts(str(reference))
+    # every translation is recorded for resume
+    assert len(loader.p_to_save) == bilingual_texts(animal_farm).count(b"TRANSLATED")
+
+
+def test_resume_of_parallel_accumulated_run_with_other_worker_count(
+    animal_farm, tmp_path, monkeypatch, word_tokens
+):
+    def run(book, resume, workers):
+        loader = EPUBBookLoader(
+            book, InterruptingTranslator, "", resume, "fr", parallel_workers=workers
+        )
+        loader.accumulated_num = 300
+        return loader
+
+    reference = tmp_path / "reference.epub"
+    shutil.copyfile(animal_farm, reference)
+    InterruptingTranslator.calls = 0
+    run(str(reference), False, 4).make_bilingual_book()
+    total = InterruptingTranslator.calls
+
+    monkeypatch.setattr(InterruptingTranslator, "limit", 120)
+    InterruptingTranslator.calls = 0
+    with pytest.raises(SystemExit):
+        run(animal_farm, False, 4).make_bilingual_book()
+
+    monkeypatch.setattr(InterruptingTranslator, "limit", None)
+    InterruptingTranslator.calls = 0
+    loader = run(animal_farm, True, 2)
+    saved = len(loader.p_to_save)
+    assert 0 < saved <= 120
+    loader.make_bilingual_book()
+
+    assert InterruptingTranslator.calls == total - saved
+
+    # parallel workers add the chapters in the order they finish
+    def chapters(book_path):
+        book = epub.read_epub(book_path.replace(".epub", "_bilingual.epub"))
+        return {
+            item.file_name: item.content
+            for item in book.get_items_of_type(ITEM_DOCUMENT)
+        }
+
+    assert chapters(animal_farm) == chapters(str(reference))
+
+
+class DroppingEchoTranslator(EchoTranslator):
+    """Loses the last paragraph of every batch longer than four."""
+
+    def translate_list(self, text_list):
+        results = super().translate_list(text_list)
+        return results[:-1] + [""] if len(results) > 4 else results
+
+
+def test_adaptive_batch_size_stops_losing_paragraphs(animal_farm, word_tokens):
+    loader = EPUBBookLoader(animal_farm, DroppingEchoTranslator, "", False, "fr")
+    loader.accumulated_num = 800
+    loader.make_bilingual_book()
+    lost_fixed = loader.p_to_save.count("")
+
+    loader = EPUBBookLoader(animal_farm, DroppingEchoTranslator, "", False, "fr")
+    loader.accumulated_num = 800
+    loader.adaptive_batch = True
+    loader.make_bilingual_book()
+
+    # it keeps probing one paragraph above the limit now and then
+    assert loader._batch_sizer.max_paragraphs <= 5
+    assert loader.p_to_save.count("") < lost_fixed / 3
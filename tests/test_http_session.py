@@ -0,0 +1,62 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from book_maker.translator.custom_api_translator import CustomAPI
+from book_maker.translator.http_session import PooledSession
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.server.clients.add(self.client_address)
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        body = json.dumps({"data": data["text"].upper()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    server.clients = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_reuse_one_connection(server):
+    translator = CustomAPI(f"http://127.0.0.1:{server.server_port}/", "french")
+    translator.set_rate_limits(rpm=60000)
+    worker = translator.clone_for_worker()
+    assert worker.session is translator.session
+
+    texts = ["one", "two", "three"]
+    assert [translator.translate(text) for text in texts] == ["ONE", "TWO", "THREE"]
+    assert worker.translate("four") == "FOUR"
+    assert len(server.clients) == 1
+
+
+def test_pool_size_and_timeout():
+    session = PooledSession()
+    assert session.get_adapter("https://api.example.com")._pool_maxsize == 1
+    session.resize(8)
+    assert session.get_adapter("https://api.example.com")._pool_maxsize == 8
+    assert session.get_adapter("http://localhost")._pool_maxsize == 8
+
+    translator = CustomAPI("http://localhost:1/", "french")
+    assert translator.session.timeout == 10
+    translator.set_http_timeout(30)
+    assert translator.session.timeout == (10, 30)
+    translator.set_http_timeout(5)
+    assert translator.session.timeout == (5, 5)
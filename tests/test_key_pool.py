@@ -0,0 +1,95 @@
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import AuthenticationError, RateLimitError
+
+from book_maker.translator.chatgptapi_translator import ChatGPTAPI
+from book_maker.translator.key_pool import KeyPool, NoUsableKeyError
+
+
+def api_error(error_class, status, code=None, headers=None):
+    response = httpx.Response(
+        status,
+        headers=headers or {},
+        request=httpx.Request("POST", "https://api.example.com"),
+    )
+    body = {"code": code} if code else None
+    return error_class("error", response=response, body=body)
+
+
+def test_round_robin_skips_benched_and_retired_keys():
+    pool = KeyPool(["a", " b", "c"])
+    assert [next(pool) for _ in range(4)] == ["a", "b", "c", "a"]
+
+    pool.bench("b", 30)
+    assert [next(pool) for _ in range(4)] == ["c", "a", "c", "a"]
+
+    pool.retire("c", "401 AuthenticationError")
+    assert [next(pool) for _ in range(2)] == ["a", "a"]
+    assert pool.usable() == ["a", "b"]
+    assert len(pool) == 2
+
+
+def test_benched_pool_hands_out_the_key_free_soonest():
+    pool = KeyPool(["a", "b"])
+    pool.bench("a", 30)
+    pool.bench("b", 10)
+    assert next(pool) == "b"
+    assert next(pool) == "b"
+
+
+def test_retiring_every_key_stops_the_run():
+    pool = KeyPool(["a", "b"])
+    pool.retire("a", "insufficient_quota")
+    pool.retire("b", "401 AuthenticationError")
+    with pytest.raises(NoUsableKeyError, match="all 2 api keys were rejected"):
+        next(pool)
+
+
+def test_stats():
+    pool = KeyPool(["first-key-1234", "second-key-5678"])
+    pool.record("first-key-1234", 2.0)
+    pool.record("first-key-1234", 4.0)
+    pool.record("second-key-5678", error=True)
+    assert not pool.has_problems()
+    pool.bench("second-key-5678", 1)
+    assert pool.has_problems()
+    assert pool.summary().splitlines() == [
+        "...1234: 2 requests, 0 errors, 0 rate limited, latency 2.4s, ok",
+        "...5678: 1 requests, 1 errors, 1 rate limited, latency n/a, ok",
+    ]
+
+
+def test_dead_and_limited_keys_are_skipped_without_sleeping():
+    translator = ChatGPTAPI("dead,limited,good", "french")
+    translator.model = "gpt-test"
+    used = []
+
+    def create_chat_completion(text):
+        key = translator.openai_client.api_key
+        used.append(key)
+        if key == "dead":
+            raise api_error(AuthenticationError, 401)
+        if key == "limited":
+            raise api_error(RateLimitError, 429, headers={"retry-after": "30"})
+        message = SimpleNamespace(content=f"{text} en français")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    translator.create_chat_completion = create_chat_completion
+    started = time.monotonic()
+    assert translator.translate("one", needprint=False) == "one en français"
+    assert translator.translate("two", needprint=False) == "two en français"
+    assert time.monotonic() - started < 5
+    # each bad key was tried once: the limited one is benched for 30s, the
+    # dead one retired (the first key went to the client made in __init__)
+    assert used == ["limited", "good", "dead", "good"]
+    assert translator.keys.retired == {"dead": "401 AuthenticationError"}
+
+    translator = ChatGPTAPI("broke", "french")
+    translator.create_chat_completion = lambda text: (_ for _ in ()).throw(
+        api_error(RateLimitError, 429, code="insufficient_quota")
+    )
+    with pytest.raises(NoUsableKeyError):
+        translator.translate("one", needprint=False)
@@ -0,0 +1,89 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from book_maker import profiling
+from book_maker.loader.epub_loader import EPUBBookLoader
+from book_maker.translator.base_translator import Base
+
+
+class SlowEchoTranslator(Base):
+    """Waits 5ms for every paragraph as if the answer came over the network."""
+
+    def __init__(self, key, language, **kwargs):
+        super().__init__(key, language)
+        self.context_flag = False
+
+    def rotate_key(self):
+        pass
+
+    def translate(self, text, *args, **kwargs):
+        return self.with_retry(self._request_translation, text)
+
+    @staticmethod
+    def _request_translation(text):
+        time.sleep(0.005)
+        return f"TRANSLATED {text}"
+
+
+@pytest.fixture()
+def profile(tmp_path):
+    path = tmp_path / "profile.txt"
+    profiling.start_profiling(path)
+    yield profiling._profile
+    profiling.stop_profiling()
+
+
+def test_spans_count_nested_stages_in_the_inner_one_only(profile):
+    with profiling.span("chapter parse"):
+        time.sleep(0.02)
+        with profiling.span("network"):
+            time.sleep(0.05)
+            with profiling.span("network"):
+                pass
+
+    threads = [
+        threading.Thread(target=lambda: profiling.add_wait("network", 0.1))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    calls, wall, cpu = profile.stages["chapter parse"]
+    # without the 0.05s spent in the network
+    assert calls == 1 and 0.02 <= wall < 0.07
+    calls, wall, cpu = profile.stages["network"]
+    assert calls == 5 and wall >= 0.45
+    assert cpu < 0.05
+
+
+def test_spans_do_nothing_without_profiling():
+    assert profiling._profile is None
+    with profiling.span("network"):
+        profiling.add_wait("network", 1)
+    assert profiling.stop_profiling() is None
+
+
+def test_report_of_a_run_with_every_stage(tmp_path):
+    book = tmp_path / "animal_farm.epub"
+    shutil.copyfile(
+        Path(__file__).parent.parent / "test_books" / "animal_farm.epub", book
+    )
+    path = tmp_path / "profile.txt"
+    profiling.start_profiling(path, cpu=True, memory=True)
+    loader = EPUBBookLoader(str(book), SlowEchoTranslator, "", False, "fr")
+    loader.make_bilingual_book()
+    assert profiling.stop_profiling() == path
+
+    report = path.read_text()
+    # tokens are only counted to pack --accumulated_num requests
+    for stage in set(profiling.STAGES) - {"token counting"}:
+        assert f"\n{stage} " in report
+    assert "most time: network, mostly waiting" in report
+    assert "cProfile of the main thread" in report
+    assert "MiB peak" in report
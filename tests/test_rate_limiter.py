@@ -0,0 +1,46 @@
+import pytest
+
+from book_maker.translator.custom_api_translator import CustomAPI
+from book_maker.translator.rate_limiter import RateLimiter, TokenBucket
+
+
+def test_token_bucket_spaces_requests_and_goes_into_debt():
+    bucket = TokenBucket(60, burst=1)
+    assert bucket.reserve(1, now=bucket.updated) == 0
+    assert bucket.reserve(1, now=bucket.updated) == pytest.approx(1)
+    assert bucket.reserve(1, now=bucket.updated) == pytest.approx(2)
+    # refilled at one a second
+    assert bucket.reserve(1, now=bucket.updated + 3) == 0
+
+    bucket = TokenBucket(6000)
+    assert bucket.capacity == 100
+    # a request larger than the bucket waits until it is paid for
+    assert bucket.reserve(400, now=bucket.updated) == pytest.approx(3)
+
+
+def test_keys_have_their_own_budget():
+    limiter = RateLimiter(rpm=60)
+    assert limiter.reserve("a") == 0
+    assert limiter.reserve("a") == pytest.approx(1, abs=0.05)
+    assert limiter.reserve("b") == 0
+
+    limiter = RateLimiter(tpm=600)
+    assert limiter.reserve("a", tokens=10) == 0
+    assert limiter.reserve("a", tokens=20) == pytest.approx(2, abs=0.05)
+
+
+def test_penalized_key_is_held_back_alone():
+    limiter = RateLimiter()
+    assert limiter.reserve("a") == 0
+    limiter.penalize("a", 20)
+    assert limiter.reserve("a") == pytest.approx(20, abs=0.05)
+    assert limiter.reserve("b") == 0
+
+
+def test_worker_clones_share_the_limiter():
+    translator = CustomAPI("http://localhost:1/translate", "french")
+    worker = translator.clone_for_worker()
+    assert worker.rate_limiter is translator.rate_limiter
+    # the old fixed sleep of 5 seconds, as a budget
+    assert translator.rate_limiter.reserve("") == 0
+    assert worker.rate_limiter.reserve("") == pytest.approx(5, abs=0.05)
@@ -0,0 +1,60 @@
+import pickle
+
+from book_maker.loader.resume_journal import ResumeJournal
+
+
+def test_append_and_load_round_trip(tmp_path):
+    path = str(tmp_path / ".book.temp.bin")
+    journal = ResumeJournal(path)
+    journal.append(
+        [(("a.xhtml", 0, "1f2e"), "un"), (("a.xhtml", 2, "3c4d"), "deux\nl")]
+    )
+    journal.append([(("b.xhtml", 0, "5a6b"), "trois")])
+
+    assert ResumeJournal(path).load() == [
+        (("a.xhtml", 0, "1f2e"), "un"),
+        (("a.xhtml", 2, "3c4d"), "deux\nl"),
+        (("b.xhtml", 0, "5a6b"), "trois"),
+    ]
+
+
+def test_fresh_run_replaces_old_journal(tmp_path):
+    path = str(tmp_path / ".book.temp.bin")
+    ResumeJournal(path).append([(None, "old")])
+
+    ResumeJournal(path).append([(None, "new")])
+
+    assert ResumeJournal(path).load() == [(None, "new")]
+
+
+def test_torn_tail_is_dropped_and_overwritten(tmp_path):
+    path = tmp_path / ".book.temp.bin"
+    ResumeJournal(str(path)).append([(None, "un"), (None, "deux")])
+    with open(path, "ab") as f:
+        f.write(b'{"t": "tro')
+
+    journal = ResumeJournal(str(path))
+    assert journal.load() == [(None, "un"), (None, "deux")]
+    journal.append([(None, "trois")])
+
+    assert ResumeJournal(str(path)).load() == [
+        (None, "un"),
+        (None, "deux"),
+        (None, "trois"),
+    ]
+
+
+def test_legacy_pickle_is_loaded_and_converted(tmp_path):
+    path = tmp_path / ".book.temp.bin"
+    path.write_bytes(pickle.dumps(["un", "deux"]))
+
+    journal = ResumeJournal(str(path))
+    assert journal.load() == [(None, "un"), (None, "deux")]
+    journal.append([(("a.xhtml", 4, "7e8f"), "trois")])
+
+    assert ResumeJournal(str(path)).load() == [
+        (None, "un"),
+        (None, "deux"),
+        (("a.xhtml", 4, "7e8f"), "trois"),
+    ]
+    assert path.read_bytes().startswith(b"{")
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import requests
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
+from openai import APIConnectionError, BadRequestError, InternalServerError
+from PyDeepLX.PyDeepLX import TooManyRequestsException
+
+from book_maker.translator.google_translator import Google
+from book_maker.translator.retry_policy import (
+    FATAL,
+    GIVE_UP,
+    NEXT_KEY,
+    OUTAGE,
+    RETRY,
+    CircuitBreaker,
+    RetriesExhausted,
+    RetryPolicy,
+    TransientError,
+    classify_error,
+)
+
+REQUEST = httpx.Request("POST", "https://api.example.com")
+
+
+def api_error(error_class, status):
+    return error_class(
+        "error", response=httpx.Response(status, request=REQUEST), body=None
+    )
+
+
+class Flaky:
+    """Fails with the given errors first, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return text.upper()
+
+
+def test_classify_error():
+    assert classify_error(api_error(InternalServerError, 503)) == OUTAGE
+    assert classify_error(APIConnectionError(request=REQUEST)) == OUTAGE
+    assert classify_error(requests.exceptions.ConnectTimeout()) == OUTAGE
+    assert classify_error(api_error(BadRequestError, 400)) == GIVE_UP
+    http_error = requests.HTTPError(response=SimpleNamespace(status_code=404))
+    assert classify_error(http_error) == GIVE_UP
+    assert classify_error(TransientError("limit")) == RETRY
+    assert classify_error(requests.exceptions.ChunkedEncodingError()) == RETRY
+    assert classify_error(TooManyRequestsException()) == RETRY
+    assert classify_error(ResourceExhausted("quota")) == RETRY
+    assert classify_error(InvalidArgument("too long")) == GIVE_UP
+    # bugs are not retried
+    assert classify_error(KeyError("target")) == FATAL
+    assert classify_error(AttributeError("model")) == FATAL
+
+
+def test_retries_then_succeeds_or_gives_up():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    request = Flaky(TransientError("a"), ConnectionError())
+    assert policy.call(request, "hi") == "HI"
+    assert request.calls == 3
+    assert policy.retries == 2
+
+    # a bad request is not retried, the paragraph is left untranslated
+    request = Flaky(api_error(BadRequestError, 400))
+    assert policy.call(request, "hi") is None
+    assert request.calls == 1
+    assert policy.given_up == 1
+
+    request = Flaky(*[TransientError("a")] * 3)
+    with pytest.raises(RetriesExhausted, match="after 3 attempts"):
+        policy.call(request, "hi")
+
+    # switching keys is not an attempt
+    request = Flaky(
+        *[TransientError("key")] * 5, TransientError("a"), TransientError("b")
+    )
+    on_error = lambda e: NEXT_KEY if e.args == ("key",) else None
+    assert policy.call(request, "hi", on_error=on_error) == "HI"
+
+    request = Flaky(AttributeError("model"))
+    with pytest.raises(AttributeError):
+        policy.call(request, "hi")
+    assert request.calls == 1
+
+
+def test_back_off_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0)
+    assert [policy.delay(n) for n in range(1, 6)] == [1, 2, 4, 5, 5]
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0.5)
+    assert all(2 <= policy.delay(3) <= 4 for _ in range(100))
+
+
+def test_breaker_pauses_every_worker_until_a_probe_succeeds():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+    policy = RetryPolicy(max_attempts=10, base_delay=0)
+    request = Flaky(ConnectionError(), ConnectionError(), ConnectionError())
+
+    started = time.monotonic()
+    assert policy.call(request, "hi", breaker=breaker) == "HI"
+    # opened after two failures, the failed probe doubled the pause
+    assert time.monotonic() - started == pytest.approx(0.6, abs=0.15)
+    assert breaker.opened == 2
+    assert not breaker.is_open
+
+    # other callers wait as well while it is open
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open
+    started = time.monotonic()
+    assert policy.call(Flaky(), "hi", breaker=breaker) == "HI"
+    assert time.monotonic() - started >= 0.15
+
+
+def test_call_async():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    request = Flaky(api_error(InternalServerError, 500))
+
+    async def send(text):
+        return request(text)
+
+    assert asyncio.run(policy.call_async(send, "hi", breaker=CircuitBreaker())) == "HI"
+    assert request.calls == 2
+
+
+def test_google_retries_instead_of_returning_the_source_text():
+    translator = Google("", "french")
+    translator.retry_policy.base_delay = 0
+    answers = [
+        requests.exceptions.ReadTimeout(),
+        SimpleNamespace(
+            raise_for_status=lambda: None,
+            json=lambda: {"sentences": [{"trans": "Bonjour"}]},
+        ),
+    ]
+
+    def post(*args, **kwargs):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    translator.session = SimpleNamespace(post=post)
+    assert translator.translate("Hello") == "Bonjour"
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+from book_maker.translator.caiyun_translator import Caiyun
+from book_maker.translator.deepl_translator import DeepL
+from book_maker.translator.google_translator import Google
+from book_maker.translator.tencent_transmart_translator import TencentTranSmart
+
+
+class FakeSession:
+    """Answers each post with the next of `answers`, keeps what was sent."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.sent = []
+
+    def post(self, url, **kwargs):
+        self.sent.append(kwargs)
+        answer = self.answers.pop(0)
+        return SimpleNamespace(
+            json=lambda: answer, raise_for_status=lambda: None, ok=True, text=""
+        )
+
+
+def test_segment_batches_respect_the_limits():
+    translator = DeepL("key", "french")
+    translator.max_batch_segments = 3
+    translator.max_batch_chars = 10
+    texts = ["aaaa", "bbbb", "cccc", "x" * 20, "d", "e\nf", "g", "h", "i", "j"]
+    assert translator.segment_batches(texts) == [
+        (0, 2),
+        (2, 3),
+        (3, 4),  # too long to share
+        (4, 5),
+        (5, 6),  # DeepL answers one paragraph per line
+        (6, 9),
+        (9, 10),
+    ]
+
+
+def test_caiyun_sends_a_list_and_maps_the_answer_back():
+    translator = Caiyun("key", "english")
+    translator.session = FakeSession({"target": ["one", "two", "three"]})
+    texts = ["un", "12\ndeux", "trois"]
+    assert translator.translate_list(texts) == ["one", "12\ntwo", "three"]
+    assert len(translator.session.sent) == 1
+
+
+def test_google_and_tencent_answers_are_unpacked():
+    translator = Google("", "french")
+    translator.session = FakeSession([["un", "en"], ["deux", "en"]])
+    assert translator.translate_list(["one", "two"]) == ["un", "deux"]
+    assert translator.session.sent[0]["data"] == {"q": ["one", "two"]}
+
+    translator = TencentTranSmart("", "chinese")
+    analysis = {"sentence_list": [{"tgt_str": "one"}], "language": "en"}
+    translator.session = FakeSession(
+        analysis, {"auto_translation": ["", "一", "二", ""]}
+    )
+    assert translator.translate_list(["one", "two"]) == ["一", "二"]
+
+
+def test_answers_that_do_not_line_up_are_sent_again_one_by_one():
+    translator = DeepL("key", "french")
+    translator.session = FakeSession(
+        {"text": "un deux"}, {"text": "un"}, {"text": "deux"}
+    )
+    assert translator.translate_list(["one", "two"]) == ["un", "deux"]
+    assert translator.session.sent[0]["data"] == (
+        '{"text": "one\\ntwo", "source": "EN", "target": "fr"}'
+    )
+
+
+def test_tencent_detects_the_language_once_and_splits_sentences_itself():
+    translator = TencentTranSmart("", "chinese")
+    assert translator.session.cookies.get("TSMT_CLIENT_KEY") == translator.client_key
+    analysis = {"sentence_list": [{"tgt_str": "Hi."}], "language": "en"}
+    answers = [{"auto_translation": ["", "你好。", "再见。", ""]}] * 5
+    translator.session = FakeSession(analysis, *answers)
+    for _ in range(5):
+        assert translator.translate("Hi. Bye.") == "你好。再见。"
+    # one request per paragraph, it was two (text_analysis and auto_translation)
+    assert len(translator.session.sent) == 6
+    sent = translator.session.sent[-1]["json"]
+    assert sent["source"] == {"lang": "en", "text_list": ["", "Hi.", "Bye.", ""]}
+    assert sent["header"]["client_key"] == translator.client_key
+
+    translator = TencentTranSmart("", "chinese", source_lang="English")
+    translator.session = FakeSession({"auto_translation": ["", "你好。", ""]})
+    translator.translate("Hi.")
+    assert translator.session.sent[0]["json"]["source"]["lang"] == "en"
+
+
+def test_tencent_keeps_line_breaks_when_the_sentences_do_not_line_up():
+    translator = TencentTranSmart("", "english", source_lang="Chinese")
+    translator.session = FakeSession(
+        {"auto_translation": ["", "Hello.", "Hi.", "See you.", "Bye.", ""]}
+    )
+    text = "你好。\n再见。"
+    assert translator.translate(text) == "Hello.\nHi. See you. Bye."
+
+    translator.session = FakeSession({"auto_translation": ["Hello.", ""]})
+    assert translator.translate(text) == "Hello."
@@ -0,0 +1,103 @@
+import json
+from types import SimpleNamespace
+
+import requests
+
+from book_maker.translator.caiyun_translator import Caiyun
+from book_maker.translator.deepl_translator import DeepL
+from book_maker.translator.telemetry import Telemetry, usage_tokens
+from book_maker.translator.translation_cache import CachedTranslator, TranslationCache
+
+
+class FakeSession:
+    """Drops the first connection, answers the next posts with `answer`."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        if self.posts == 1:
+            raise requests.ConnectionError("connection reset")
+        return SimpleNamespace(
+            ok=True, text="", json=lambda: self.answer, raise_for_status=lambda: None
+        )
+
+
+def test_usage_tokens_of_each_provider():
+    openai = SimpleNamespace(
+        usage=SimpleNamespace(prompt_tokens=3, completion_tokens=4)
+    )
+    claude = SimpleNamespace(usage=SimpleNamespace(input_tokens=5, output_tokens=6))
+    gemini = SimpleNamespace(
+        usage_metadata=SimpleNamespace(prompt_token_count=7, candidates_token_count=8)
+    )
+    assert usage_tokens(openai) == (3, 4)
+    assert usage_tokens(claude) == (5, 6)
+    assert usage_tokens(gemini) == (7, 8)
+    assert usage_tokens("text") == (None, None)
+
+
+def test_requests_are_recorded_with_their_retries(tmp_path):
+    translator = DeepL("secret-key-1234", "french")
+    translator.set_retry_policy(max_delay=0)
+    translator.telemetry.open(tmp_path / "requests.jsonl")
+    translator.session = FakeSession({"text": "un\ndeux"})
+    assert translator.translate_list(["one", "two"]) == ["un", "deux"]
+    translator.telemetry.close()
+
+    (record,) = [
+        json.loads(line)
+        for line in (tmp_path / "requests.jsonl").read_text().splitlines()
+    ]
+    assert record["provider"] == "DeepL"
+    assert record["retries"] == 1
+    assert record["batch_size"] == 2
+    assert record["ok"] and not record["cache_hit"]
+    assert record["latency"] >= 0
+
+
+def test_tokens_cost_and_cache_hits_are_summed_up():
+    telemetry = Telemetry()
+    response = SimpleNamespace(
+        usage=SimpleNamespace(prompt_tokens=1000000, completion_tokens=500000)
+    )
+    for _ in range(2):
+        with telemetry.request("ChatGPTAPI", "gpt-4o-mini") as entry:
+            telemetry.attempt()
+            telemetry.note(key="sk-abcdefghijkl", response=response)
+            entry["ok"] = True
+    telemetry.cache_hits("ChatGPTAPI", "gpt-4o-mini", 3)
+
+    assert telemetry.records[0]["key"] != "sk-abcdefghijkl"
+    summary = telemetry.summary()
+    assert "2 requests (0 failed, 0 retries), 3 cache hits" in summary
+    assert "2000000 input + 1000000 output tokens" in summary
+    # 2 * (0.15 + 0.5 * 0.6) dollars
+    assert "estimated cost ~$0.9000" in summary
+
+    telemetry.token_prices = {"": (1.0, 2.0)}
+    metrics = telemetry.prometheus()
+    assert "bbook_requests_total 2" in metrics
+    assert "bbook_cache_hits_total 3" in metrics
+    assert 'bbook_tokens_total{direction="output"} 1000000' in metrics
+    assert "bbook_request_latency_seconds_count 2" in metrics
+    assert "bbook_estimated_cost_usd 4.0" in metrics
+
+
+def test_cached_paragraphs_are_counted_as_cache_hits(tmp_path):
+    translator = Caiyun("key", "english")
+    cache = TranslationCache(tmp_path / "cache.db")
+    cached = CachedTranslator(translator, cache)
+    translator.session = FakeSession({"target": ["one", "two"]})
+    translator.set_retry_policy(max_delay=0)
+    assert cached.translate_list(["un", "deux"]) == ["one", "two"]
+    assert cached.translate_list(["un", "deux"]) == ["one", "two"]
+    assert cached.translate("un") == "one"
+
+    sent, *hits = translator.telemetry.records
+    assert (sent["batch_size"], sent["retries"]) == (2, 1)
+    assert [r["batch_size"] for r in hits] == [2, 1]
+    assert all(r["cache_hit"] for r in hits)
+    cache.close()
@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from book_maker.translator.base_translator import Base
+from book_maker.translator.translation_cache import CachedTranslator, TranslationCache
+
+
+class EchoTranslator(Base):
+    def __init__(self, key="", language="fr", **kwargs):
+        super().__init__(key, language)
+        self.prompt_template = "Translate {text} to {language}"
+        self.prompt_sys_msg = ""
+        self.calls = []
+
+    def rotate_key(self):
+        pass
+
+    def translate(self, text):
+        self.calls.append(text)
+        return f"<{text}>"
+
+
+def test_translate_hits_cache_on_second_run(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    first = CachedTranslator(EchoTranslator(), cache, "echo")
+    assert first.translate("hello") == "<hello>"
+
+    second_model = EchoTranslator()
+    second = CachedTranslator(second_model, cache, "echo")
+    assert second.translate("hello") == "<hello>"
+    assert second_model.calls == []
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+
+
+def test_key_covers_model_language_and_prompt(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    CachedTranslator(EchoTranslator(), cache, "echo").translate("hello")
+
+    other_model = EchoTranslator()
+    CachedTranslator(other_model, cache, "other").translate("hello")
+    other_language = EchoTranslator(language="de")
+    CachedTranslator(other_language, cache, "echo").translate("hello")
+    other_prompt = EchoTranslator()
+    other_prompt.prompt_template = "Please translate {text}"
+    CachedTranslator(other_prompt, cache, "echo").translate("hello")
+
+    assert other_model.calls == other_language.calls == other_prompt.calls == ["hello"]
+
+
+def test_translate_list_only_sends_misses(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    model = EchoTranslator()
+    translator = CachedTranslator(model, cache, "echo")
+    translator.translate("b")
+    model.calls.clear()
+
+    assert translator.translate_list(["a", "b", "c"]) == ["<a>", "<b>", "<c>"]
+    assert model.calls == ["a", "c"]
+
+
+def test_failed_translation_is_not_cached(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    model = EchoTranslator()
+    model.translate = lambda text: text
+    CachedTranslator(model, cache, "echo").translate("same")
+    assert len(cache) == 0
+
+
+def test_eviction_by_count_and_age(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TranslationCache(path, max_entries=2)
+    for i in range(4):
+        cache.set(str(i), f"t{i}")
+        time.sleep(0.01)
+    cache.evict()
+    assert len(cache) == 2
+    assert cache.get("0") is None and cache.get("3") == "t3"
+    cache.close()
+
+    aged = TranslationCache(path, max_age_days=1e-9)
+    assert len(aged) == 0
+
+
+def test_cache_is_thread_safe(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    translator = CachedTranslator(EchoTranslator(), cache, "echo")
+    texts = [f"p{i % 50}" for i in range(400)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(translator.translate, texts))
+    assert results == [f"<{t}>" for t in texts]
+    assert len(cache) == 50
+
+
+def test_worker_clone_keeps_cache_and_own_context(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    translator = EchoTranslator("a,b", "fr")
+    translator.context_list = ["shared"]
+    cached = CachedTranslator(translator, cache)
+
+    worker = cached.clone_for_worker()
+    worker.translate("hello")
+
+    assert isinstance(worker, CachedTranslator)
+    assert worker.cache is cache
+    assert worker.context_list == []
+    assert translator.context_list == ["shared"]
+    assert worker.keys is translator.keys
+    assert cached.translate("hello") == worker.translate("hello")
+    assert cache.hits == 2
@@ -0,0 +1,50 @@
+import pytest
+import tiktoken
+
+from book_maker import utils
+
+
+class WordEncoding:
+    def __init__(self, name):
+        self.name = name
+
+    def encode(self, text):
+        return text.split()
+
+    def encode_batch(self, texts, num_threads=8):
+        return [text.split() for text in texts]
+
+
+@pytest.fixture()
+def word_encodings(monkeypatch):
+    loaded = []
+
+    def get_encoding(name):
+        loaded.append(name)
+        return WordEncoding(name)
+
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+    utils.get_encoding.cache_clear()
+    yield loaded
+    utils.get_encoding.cache_clear()
+
+
+def test_encoding_is_loaded_once_per_model(word_encodings):
+    texts = ["one two", "three", "four five six"]
+    assert utils.count_tokens(texts) == [2 + 7, 1 + 7, 3 + 7]
+    assert [utils.num_tokens_from_text(t) for t in texts] == utils.count_tokens(texts)
+    assert word_encodings == ["cl100k_base"]
+
+
+def test_models_map_to_their_tokenizer(word_encodings):
+    assert utils.get_encoding("gpt-4o-mini").name == "o200k_base"
+    assert utils.get_encoding("gpt-4").name == "cl100k_base"
+    for model in ("claude-3-5-sonnet-20241022", "gemini-1.5-flash", "qwen-mt-turbo"):
+        assert utils.get_encoding(model) is None
+
+
+def test_estimated_models_count_cjk_per_character(word_encodings):
+    assert utils.count_tokens(["abcdefgh", "你好世界"], "claude-3-haiku") == [
+        2 + 7,
+        4 + 7,
+    ]